@@ -1,11 +1,15 @@
 # -*- coding: utf-8 -*-
+import importlib
 import logging.config
 import os
+import sys
 import yaml
 
-# make all plotting libs use qt5
-import matplotlib as mpl
-mpl.use('Qt5Agg')
+# make all plotting libs use qt5, without importing matplotlib if possible
+if "matplotlib" in sys.modules:
+    sys.modules["matplotlib"].use('Qt5Agg')
+else:
+    os.environ["MPLBACKEND"] = "Qt5Agg"
 os.environ["PYQTGRAPH_QT_LIB"] = "PyQt5"
 
 # enable high dpi scaling
@@ -13,11 +17,9 @@ os.environ["QT_AUTO_SCREEN_SCALE_FACTOR"] = "1"
 
 from .registry import *
 
-from .processing_core import *
-from .processing_gui import *
-from .generic_processing_modules import *
-
-from .simulation_gui import *
+from .simulation_runner import *
+from .simulation_ensemble import *
+from .simulation_parareal import *
 from .simulation_modules import *
 from .generic_simulation_modules import *
 
@@ -25,9 +27,47 @@ from .binding_modules import *
 
 from .tools import *
 from .controltools import *
-from .visualization import *
 from .resources import *
 
+# the graphical parts depend on Qt and matplotlib, they are imported on first
+# access, so that headless simulations do not have to load them
+_gui_modules = ["processing_core", "processing_gui",
+                "generic_processing_modules", "simulation_gui",
+                "visualization"]
+
+
+def _load_gui():
+    """
+    Import the graphical modules and register their generic modules.
+    """
+    for name in _gui_modules:
+        module = importlib.import_module("." + name, __name__)
+        globals().update({key: getattr(module, key)
+                          for key in getattr(module, "__all__", [])})
+
+    if not get_registered_processing_modules(PostProcessingModule):
+        register_processing_module(PostProcessingModule, PlotAll)
+
+
+def __getattr__(name):
+    if name.startswith("__") or "PostProcessingModule" in globals():
+        raise AttributeError("module '{}' has no attribute '{}'"
+                             "".format(__name__, name))
+
+    _load_gui()
+    try:
+        return globals()[name]
+    except KeyError:
+        raise AttributeError("module '{}' has no attribute '{}'"
+                             "".format(__name__, name)) from None
+
+
+def __dir__():
+    if "PostProcessingModule" not in globals():
+        _load_gui()
+    return sorted(globals())
+
+
 __author__ = 'Stefan Ecklebe'
 __email__ = 'stefan.ecklebe@umit-tirol.at'
 __version__ = '0.4.1'
@@ -41,9 +81,16 @@ logging.config.dictConfig(log_conf)
 # register all generic modules
 register_simulation_module(Model, LinearStateSpaceModel)
 register_simulation_module(Solver, ODEInt)
+register_simulation_module(Solver, SolveIVP)
+register_simulation_module(Solver, Euler)
+register_simulation_module(Solver, Heun)
+register_simulation_module(Solver, RungeKutta4)
+register_simulation_module(Solver, DormandPrince)
+register_simulation_module(Solver, ExactDiscretization)
 register_simulation_module(Trajectory, SmoothTransition)
 register_simulation_module(Trajectory, HarmonicTrajectory)
 register_simulation_module(Trajectory, Setpoint)
+register_simulation_module(Trajectory, TabulatedTrajectory)
 register_simulation_module(Feedforward, Feedthrough)
 register_simulation_module(Controller, PIDController)
 register_simulation_module(Controller, LinearStateSpaceController)
@@ -52,5 +99,3 @@ register_simulation_module(ObserverMixer, AdditiveMixer)
 register_simulation_module(Limiter, ModelInputLimiter)
 register_simulation_module(Sensor, DeadTimeSensor)
 register_simulation_module(Disturbance, GaussianNoise)
-
-register_processing_module(PostProcessingModule, PlotAll)
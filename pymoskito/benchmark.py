@@ -0,0 +1,556 @@
+# -*- coding: utf-8 -*-
+"""
+End-to-end simulation benchmarks over the bundled examples.
+
+Every regime of the `default.sreg` files of the examples is simulated
+headlessly in a fresh process, which reports the steps per second, the wall
+time, the peak resident set size (RSS) and the size of the pickled results.
+The measurements can be stored as baseline in a JSON file, tagged with the
+machine they have been taken on, and later runs can be checked against the
+baseline of the same machine to detect speed regressions::
+
+    pymoskito-benchmark --save            # record a baseline
+    pymoskito-benchmark car ballbeam      # check against it
+
+Examples with compiled modules, see :py:data:`COMPILED_EXAMPLES` , build
+their bindings in their source directory when they are imported and are
+therefore only benchmarked when named explicitly or when `--compiled` is
+given.
+
+Furthermore, the evaluation of the model right-hand sides can be timed with
+and without the compilation by :py:func:`.jit` ::
+
+    pymoskito-benchmark --rhs pendulum ballbeam
+"""
+import argparse
+import datetime
+import importlib
+import json
+import logging
+import os
+import pickle
+import platform
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import numpy as np
+import scipy
+
+from .simulation_core import (
+    Simulator, get_module_settings, setup_simulation_modules
+)
+from .simulation_modules import SimulationException
+from .simulation_runner import load_regimes
+from .tools import DISABLE_JIT, jit_available
+
+try:
+    import resource
+except ImportError:
+    # not available on windows
+    resource = None
+
+__all__ = ["EXAMPLES", "COMPILED_EXAMPLES", "machine_info", "machine_tag",
+           "measure_regime", "benchmark_examples", "save_baseline",
+           "load_baseline", "find_regressions", "format_benchmarks",
+           "measure_state_function", "benchmark_state_functions",
+           "format_state_functions"]
+
+EXAMPLES = ["ballbeam", "pendulum", "balltube", "car", "simple_pendulum"]
+""" Examples that are benchmarked by default. """
+
+COMPILED_EXAMPLES = ["tanksystem"]
+""" Examples that compile C++ modules with cmake when they are imported. """
+
+DEFAULT_BASELINE = "benchmark_baselines.json"
+
+
+def machine_info():
+    """
+    Describe the machine and the software stack the benchmarks run on.
+
+    Returns:
+        dict: Host, platform, processor and versions of the core packages.
+    """
+    return OrderedDict([
+        ("node", platform.node()),
+        ("platform", platform.platform()),
+        ("machine", platform.machine()),
+        ("processor", platform.processor()),
+        ("cpu count", os.cpu_count()),
+        ("python", platform.python_version()),
+        ("numpy", np.__version__),
+        ("scipy", scipy.__version__),
+    ])
+
+
+def machine_tag(info=None):
+    """
+    Create the tag under which the baselines of a machine are stored.
+
+    Args:
+        info(dict): Machine description, see :py:func:`machine_info` .
+
+    Returns:
+        str: Tag of the form `<node>-<machine>-py<major>.<minor>` .
+    """
+    if info is None:
+        info = machine_info()
+    return "{}-{}-py{}".format(info["node"], info["machine"],
+                               ".".join(info["python"].split(".")[:2]))
+
+
+def _peak_rss():
+    """ Peak resident set size of the current process in MiB. """
+    if resource is None:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        # reported in bytes instead of KiB
+        peak /= 1024
+    return peak / 1024
+
+
+def measure_regime(module_settings, name=""):
+    """
+    Simulate a regime in the current process and measure its performance.
+
+    Args:
+        module_settings(dict): Complete settings of all modules, see
+            :py:func:`.get_module_settings` .
+        name(str): Name of the regime.
+
+    Returns:
+        dict: The measurements with the entries `regime` , `finished` ,
+        `steps` , `wall time` (in seconds), `steps/s` , `peak rss` (in MiB,
+        `None` if unavailable) and `result size` (in bytes).
+    """
+    sim_settings, sim_modules = setup_simulation_modules(module_settings)
+    start_time = sim_settings.start_time
+    step_size = sim_settings.step_size
+
+    start = time.perf_counter()
+    data = Simulator(sim_settings, sim_modules).run()
+    wall_time = time.perf_counter() - start
+
+    steps = int(round((data["results"]["time"][-1] - start_time)
+                      / step_size))
+    return OrderedDict([
+        ("regime", name),
+        ("finished", bool(data["results"]["finished"])),
+        ("steps", steps),
+        ("wall time", wall_time),
+        ("steps/s", steps / wall_time),
+        ("peak rss", _peak_rss()),
+        ("result size", len(pickle.dumps(data, protocol=4))),
+    ])
+
+
+def _example_dir(example):
+    return os.path.join(os.path.dirname(__file__), "examples", example)
+
+
+def _measure_example_regime(example, name, module_settings):
+    """ Measure a regime of an example, executed in a worker process. """
+    importlib.import_module("pymoskito.examples." + example)
+    # examples load their config files relative to their directory
+    os.chdir(_example_dir(example))
+    return measure_regime(module_settings, name)
+
+
+def benchmark_examples(examples=None, repeat=1, mp_context=None):
+    """
+    Benchmark all regimes of the given examples.
+
+    Every simulation runs in a fresh process, so that the peak RSS refers to
+    a single regime. Regimes that fail to set up or to run are logged and
+    skipped.
+
+    Args:
+        examples(list): Names of the examples, defaults to
+            :py:data:`EXAMPLES` .
+        repeat(int): Number of runs per regime, the fastest one is kept.
+        mp_context: Multiprocessing context for the worker processes,
+            defaults to `spawn` to get clean processes on all platforms.
+
+    Returns:
+        list: Measurements of every regime, see :py:func:`measure_regime` ,
+        with the additional entry `example` .
+    """
+    logger = logging.getLogger(__name__)
+    if examples is None:
+        examples = EXAMPLES
+    if mp_context is None:
+        mp_context = get_context("spawn")
+
+    records = []
+    for example in examples:
+        # the module classes are needed to resolve the regime settings
+        importlib.import_module("pymoskito.examples." + example)
+        regimes = load_regimes(os.path.join(_example_dir(example),
+                                            "default.sreg"))
+        module_settings = None
+        for regime in regimes:
+            name = regime["Name"]
+            try:
+                module_settings = get_module_settings(regime, module_settings)
+            except SimulationException as e:
+                logger.error("Setup of '{}/{}' failed: {}".format(
+                    example, name, e))
+                module_settings = None
+                continue
+
+            runs = []
+            for _ in range(repeat):
+                with ProcessPoolExecutor(max_workers=1,
+                                         mp_context=mp_context) as pool:
+                    try:
+                        runs.append(pool.submit(_measure_example_regime,
+                                                example, name,
+                                                module_settings).result())
+                    except Exception as e:
+                        logger.error("Benchmark of '{}/{}' failed: {}".format(
+                            example, name, e))
+                        break
+            if not runs:
+                continue
+
+            record = OrderedDict(example=example)
+            record.update(max(runs, key=lambda run: run["steps/s"]))
+            logger.info("{}/{}: {:.0f} steps/s".format(example, name,
+                                                       record["steps/s"]))
+            records.append(record)
+
+    return records
+
+
+def measure_state_function(module_settings, calls=10000):
+    """
+    Time the right-hand side of the model of a regime.
+
+    The state function is evaluated at the initial state with zero input,
+    after a first call that triggers a possible compilation.
+
+    Args:
+        module_settings(dict): Complete settings of all modules, see
+            :py:func:`.get_module_settings` .
+        calls(int): Number of timed evaluations.
+
+    Returns:
+        dict: The measurements with the entries `model` , `jit` (whether
+        :py:func:`.jit` compiles) and `calls/s` .
+    """
+    _, sim_modules = setup_simulation_modules(module_settings)
+    model = sim_modules["Model"]
+    function = model.state_function
+    x = np.array(np.atleast_1d(model.initial_state), dtype=float)
+    args = (np.zeros(model.settings["input_count"]),)
+    t = module_settings["Solver"]["start time"]
+
+    function(t, x, args)
+    start = time.perf_counter()
+    for _ in range(calls):
+        function(t, x, args)
+    duration = time.perf_counter() - start
+
+    return OrderedDict([
+        ("model", type(model).__name__),
+        ("jit", jit_available()),
+        ("calls/s", calls / duration),
+    ])
+
+
+def _disable_jit():
+    os.environ[DISABLE_JIT] = "1"
+
+
+def _measure_example_state_function(example, module_settings, calls):
+    """ Time the model of an example, executed in a worker process. """
+    importlib.import_module("pymoskito.examples." + example)
+    os.chdir(_example_dir(example))
+    return measure_state_function(module_settings, calls)
+
+
+def benchmark_state_functions(examples=None, calls=10000, mp_context=None):
+    """
+    Compare the right-hand sides of the example models with and without
+    compilation.
+
+    Every model type that occurs in the regimes of an example is timed
+    twice in fresh processes, once as is and once with
+    :py:func:`.jit` disabled. Without numba, both runs execute the same
+    Python code.
+
+    Args:
+        examples(list): Names of the examples, defaults to
+            :py:data:`EXAMPLES` .
+        calls(int): Number of timed evaluations per run.
+        mp_context: Multiprocessing context for the worker processes,
+            defaults to `spawn` .
+
+    Returns:
+        list: Records with the entries `example` , `model` , `jit` ,
+        `compiled calls/s` , `python calls/s` and `speedup` .
+    """
+    logger = logging.getLogger(__name__)
+    if examples is None:
+        examples = EXAMPLES
+    if mp_context is None:
+        mp_context = get_context("spawn")
+
+    records = []
+    for example in examples:
+        importlib.import_module("pymoskito.examples." + example)
+        regimes = load_regimes(os.path.join(_example_dir(example),
+                                            "default.sreg"))
+        module_settings = None
+        models = set()
+        for regime in regimes:
+            try:
+                module_settings = get_module_settings(regime, module_settings)
+            except SimulationException:
+                module_settings = None
+                continue
+
+            model = module_settings["Model"]["type"]
+            if model in models:
+                continue
+            models.add(model)
+
+            runs = []
+            for initializer in [None, _disable_jit]:
+                with ProcessPoolExecutor(max_workers=1,
+                                         mp_context=mp_context,
+                                         initializer=initializer) as pool:
+                    try:
+                        runs.append(pool.submit(
+                            _measure_example_state_function, example,
+                            module_settings, calls).result())
+                    except Exception as e:
+                        logger.error("Timing of '{}/{}' failed: {}".format(
+                            example, model, e))
+                        break
+            if len(runs) < 2:
+                continue
+
+            records.append(OrderedDict([
+                ("example", example),
+                ("model", model),
+                ("jit", runs[0]["jit"]),
+                ("compiled calls/s", runs[0]["calls/s"]),
+                ("python calls/s", runs[1]["calls/s"]),
+                ("speedup", runs[0]["calls/s"] / runs[1]["calls/s"]),
+            ]))
+
+    return records
+
+
+def format_state_functions(records):
+    """
+    Create a human readable table of right-hand side timings.
+
+    Args:
+        records(list): Timings, see :py:func:`benchmark_state_functions` .
+
+    Returns:
+        str: The formatted table.
+    """
+    width = max([len(rec["example"]) + len(rec["model"]) + 3
+                 for rec in records] + [16])
+    lines = ["{:<{}}{:>6}{:>16}{:>16}{:>10}".format(
+        "Model", width, "JIT", "Compiled [1/s]", "Python [1/s]", "Speedup")]
+    for rec in records:
+        lines.append("{:<{}}{:>6}{:>16.0f}{:>16.0f}{:>10.2f}".format(
+            "{}/{}".format(rec["example"], rec["model"]), width,
+            "yes" if rec["jit"] else "no", rec["compiled calls/s"],
+            rec["python calls/s"], rec["speedup"]))
+
+    return "\n".join(lines)
+
+
+def _key(record):
+    return "{}/{}".format(record["example"], record["regime"])
+
+
+def load_baseline(file_name, tag=None):
+    """
+    Load the baseline of a machine.
+
+    Args:
+        file_name(str): Path of the baseline file.
+        tag(str): Machine tag, defaults to the tag of the current machine.
+
+    Returns:
+        dict: Baseline with the entries `machine` , `created` and `regimes` ,
+        or `None` if no baseline is stored for the machine.
+    """
+    if tag is None:
+        tag = machine_tag()
+    if not os.path.isfile(file_name):
+        return None
+
+    with open(file_name, "r") as f:
+        return json.load(f).get(tag, None)
+
+
+def save_baseline(records, file_name, tag=None):
+    """
+    Store benchmark results as baseline of a machine.
+
+    Baselines of other machines in the same file are kept, a previous
+    baseline of the same machine is replaced.
+
+    Args:
+        records(list): Measurements, see :py:func:`benchmark_examples` .
+        file_name(str): Path of the baseline file.
+        tag(str): Machine tag, defaults to the tag of the current machine.
+
+    Returns:
+        str: The machine tag the baseline has been stored under.
+    """
+    info = machine_info()
+    if tag is None:
+        tag = machine_tag(info)
+
+    baselines = OrderedDict()
+    if os.path.isfile(file_name):
+        with open(file_name, "r") as f:
+            baselines = json.load(f, object_pairs_hook=OrderedDict)
+
+    baselines[tag] = OrderedDict([
+        ("machine", info),
+        ("created", datetime.datetime.now().isoformat(timespec="seconds")),
+        ("regimes", OrderedDict((_key(rec), rec) for rec in records)),
+    ])
+    with open(file_name, "w") as f:
+        json.dump(baselines, f, indent=2)
+
+    return tag
+
+
+def find_regressions(records, baseline, tolerance=0.1):
+    """
+    Compare benchmark results with a baseline.
+
+    Args:
+        records(list): Measurements, see :py:func:`benchmark_examples` .
+        baseline(dict): Baseline, see :py:func:`load_baseline` .
+        tolerance(float): Relative slowdown that is accepted.
+
+    Returns:
+        list: Tuples of the regime key, the baseline and the current steps
+        per second for all regimes that got slower than the tolerance
+        permits. Regimes without baseline are ignored.
+    """
+    regressions = []
+    for rec in records:
+        ref = baseline["regimes"].get(_key(rec), None)
+        if ref is None:
+            continue
+        if rec["steps/s"] < (1 - tolerance) * ref["steps/s"]:
+            regressions.append((_key(rec), ref["steps/s"], rec["steps/s"]))
+
+    return regressions
+
+
+def format_benchmarks(records, baseline=None):
+    """
+    Create a human readable table of benchmark results.
+
+    Args:
+        records(list): Measurements, see :py:func:`benchmark_examples` .
+        baseline(dict): If given, the relative change of the steps per
+            second is added.
+
+    Returns:
+        str: The formatted table.
+    """
+    width = max([len(_key(rec)) + 2 for rec in records] + [16])
+    lines = ["{:<{}}{:>10}{:>12}{:>10}{:>11}{:>12}{:>10}".format(
+        "Regime", width, "Steps", "Steps/s", "Wall [s]", "RSS [MiB]",
+        "Size [kB]", "Change")]
+    for rec in records:
+        change = ""
+        if not rec["finished"]:
+            change = "aborted"
+        elif baseline is not None and _key(rec) in baseline["regimes"]:
+            ref = baseline["regimes"][_key(rec)]["steps/s"]
+            change = "{:+.1%}".format(rec["steps/s"] / ref - 1)
+        rss = "-" if rec["peak rss"] is None else "{:.1f}".format(
+            rec["peak rss"])
+        lines.append("{:<{}}{:>10}{:>12.0f}{:>10.3f}{:>11}{:>12.1f}{:>10}"
+                     "".format(_key(rec), width, rec["steps"],
+                               rec["steps/s"], rec["wall time"], rss,
+                               rec["result size"] / 1e3, change))
+
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    """
+    Entry point of the `pymoskito-benchmark` command.
+    """
+    parser = argparse.ArgumentParser(
+        prog="pymoskito-benchmark",
+        description="Benchmark the regimes of the bundled examples and "
+                    "check them against a stored baseline.")
+    parser.add_argument("examples", nargs="*", metavar="EXAMPLE",
+                        help="Examples to benchmark, defaults to all that "
+                             "need no compilation.")
+    parser.add_argument("-c", "--compiled", action="store_true",
+                        help="Also benchmark the examples that build C++ "
+                             "modules.")
+    parser.add_argument("-b", "--baseline", default=DEFAULT_BASELINE,
+                        help="JSON file that holds the baselines.")
+    parser.add_argument("-s", "--save", action="store_true",
+                        help="Store the results as baseline of this machine.")
+    parser.add_argument("-n", "--repeat", type=int, default=1,
+                        help="Number of runs per regime, the fastest one is "
+                             "kept.")
+    parser.add_argument("-t", "--tolerance", type=float, default=0.1,
+                        help="Accepted relative slowdown compared to the "
+                             "baseline.")
+    parser.add_argument("--rhs", action="store_true",
+                        help="Time the model right-hand sides with and "
+                             "without JIT compilation instead.")
+    args = parser.parse_args(argv)
+    logger = logging.getLogger(__name__)
+    if not args.examples:
+        args.examples = list(EXAMPLES)
+    if args.compiled:
+        args.examples += [name for name in COMPILED_EXAMPLES
+                          if name not in args.examples]
+
+    if args.rhs:
+        print(format_state_functions(
+            benchmark_state_functions(args.examples)))
+        return 0
+
+    records = benchmark_examples(args.examples, args.repeat)
+    baseline = load_baseline(args.baseline)
+    print(format_benchmarks(records, baseline))
+
+    if args.save:
+        tag = save_baseline(records, args.baseline)
+        logger.info("Baseline of '{}' stored in {}".format(tag,
+                                                           args.baseline))
+        return 0
+
+    if baseline is None:
+        logger.info("No baseline for '{}' in {}".format(machine_tag(),
+                                                        args.baseline))
+        return 0
+
+    regressions = find_regressions(records, baseline, args.tolerance)
+    for key, ref, current in regressions:
+        logger.error("Regression in {}: {:.0f} steps/s, baseline {:.0f} "
+                     "steps/s".format(key, current, ref))
+
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
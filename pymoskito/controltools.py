@@ -8,15 +8,20 @@ in this package to keep a small footprint.
 """
 
 import warnings
-import sympy as sp
 import numpy as np
 from numpy.linalg import inv as mat_inv
 
-__all__ = ["char_coefficients", "place_siso", "calc_prefilter",
+__all__ = ["char_coefficients", "place_siso", "place_many", "calc_prefilter",
            "controllability_matrix", "observability_matrix",
            "lie_derivatives"
            ]
 
+_ackermann_cache = {}
+""" Rows of the Ackermann formula per pair of system and input matrix. """
+
+_ackermann_cache_size = 256
+""" Number of systems whose Ackermann rows are kept. """
+
 
 def lie_derivatives(h, f, x, order=1):
     """
@@ -39,50 +44,59 @@ def lie_derivatives(h, f, x, order=1):
     return derivatives
 
 
+def _poly_coefficients(pole_sets):
+    """
+    Coefficients of the monic polynomials with the given roots, lowest power
+    first, for a batch of pole sets of shape `(k, n)` .
+    """
+    pole_sets = np.asarray(pole_sets)
+    coefficients = np.zeros((pole_sets.shape[0], pole_sets.shape[1] + 1),
+                            dtype=np.result_type(pole_sets, float))
+    coefficients[:, 0] = 1
+
+    # multiply the linear factors one after another, like numpy.poly does
+    for idx in range(pole_sets.shape[1]):
+        coefficients[:, 1:idx + 2] -= (pole_sets[:, idx:idx + 1]
+                                       * coefficients[:, :idx + 1])
+
+    return coefficients[:, ::-1]
+
+
+def _real_coefficients(coefficients):
+    """
+    Drop the imaginary parts of coefficients and warn if they are not
+    negligible.
+    """
+    if not np.iscomplexobj(coefficients):
+        return coefficients
+
+    boundary = 1e-12
+    for idx in zip(*np.nonzero(np.abs(coefficients.imag) > boundary)):
+        msg = ("Imaginary Part of the coefficient p[{}] is unequal zero ({}) "
+               "for a given tolerance of {}".format(
+                   idx[-1], coefficients.imag[idx], boundary))
+        warnings.warn(msg)
+    return np.ascontiguousarray(coefficients.real)
+
+
 def char_coefficients(poles):
     """
     Calculate the coefficients of a characteristic polynomial.
-    
+
+    The polynomial is expanded numerically, hence the coefficients are exact
+    up to floating point precision.
+
     Args:
         poles (list or :obj:`numpy.ndarray`): pol configuration
 
     Return:
         :obj:`numpy.ndarray`: coefficients
     """
-
-    poles = np.array(poles)  # convert to numpy array
     poles = np.ravel(poles)  # transform to 1d array
+    coefficients = _poly_coefficients(poles[None])[0, :-1]
 
-    s = sp.symbols("s")
-    poly = 1
-    for s_i in poles:
-        poly = (s - s_i) * poly
-    poly = sp.expand(poly)
-
-    # calculate the coefficient of characteristic polynomial
-    n = len(poles)
-    p = []
-    for i in range(n):
-        p.append(poly.subs([(s, 0)]))
-        poly = poly - p[i]
-        poly = poly / s
-        poly = sp.expand(poly)
-
-    # convert numbers and complex objects from multiplication to a complex
-    # number
-    p = [complex(x) for x in p]
-
-    # if imaginary part is greater than the boundary, set imaginary part to zero
-    boundary = 1e-12
-    for idx, val in enumerate(p):
-        if abs(val.imag) > boundary:
-            msg = "Imaginary Part of the coefficient p[{}] "
-            "is unequal zero ({})) for a given tolerance of {}".format(
-                str(idx), str(boundary), str(val.imag))
-            warnings.warn(msg)
-        p[idx] = val.real
-
-    return np.array(p, dtype=float)  # [a_0, a_1, ... , a_n-1]
+    # [a_0, a_1, ... , a_n-1]
+    return np.array(_real_coefficients(coefficients), dtype=float)
 
 
 def controllability_matrix(a_mat, b_mat):
@@ -115,11 +129,13 @@ def controllability_matrix(a_mat, b_mat):
         raise ValueError("Dimension of A and B does not match")
     n = a_mat.shape[0]
 
-    # calculate controllability matrix
-    qc = b_mat
+    # calculate controllability matrix, block by block
+    m = b_mat.shape[1]
+    qc = np.empty((n, n * m), dtype=np.result_type(a_mat, b_mat, float))
+    qc[:, :m] = b_mat
     for x in range(1, n):
-        qc = np.concatenate((qc, np.linalg.matrix_power(a_mat, x) @ b_mat),
-                            axis=1)
+        np.matmul(a_mat, qc[:, (x - 1) * m:x * m],
+                  out=qc[:, x * m:(x + 1) * m])
 
     # check controllability of the system
     if np.linalg.matrix_rank(qc) != n:
@@ -173,6 +189,51 @@ def observability_matrix(a_mat, c_mat):
     return qo
 
 
+def _ackermann_rows(a_mat, b_mat):
+    """
+    Rows :math:`t^T A^i` for :math:`i = 0, ..., n` of the Ackermann formula,
+    where :math:`t^T` is the last row of the inverse controllability matrix.
+
+    The rows only depend on the system, hence they are kept for further
+    pole configurations.
+    """
+    key = (a_mat.shape, a_mat.tobytes(), b_mat.tobytes())
+    rows = _ackermann_cache.get(key, None)
+    if rows is None:
+        n = a_mat.shape[0]
+        q = controllability_matrix(a_mat, b_mat)
+        e_n = np.zeros(n)
+        e_n[-1] = 1
+
+        rows = np.empty((n + 1, n))
+        rows[0] = np.linalg.solve(q.T, e_n)
+        for i in range(n):
+            np.matmul(rows[i], a_mat, out=rows[i + 1])
+        rows.flags.writeable = False
+
+        if len(_ackermann_cache) >= _ackermann_cache_size:
+            _ackermann_cache.pop(next(iter(_ackermann_cache)))
+        _ackermann_cache[key] = rows
+
+    return rows
+
+
+def _check_siso(a_mat, b_mat, pole_count):
+    """
+    Check the dimensions of a single input system and its poles.
+    """
+    if a_mat.shape[0] != a_mat.shape[1]:
+        raise ValueError("A is not square")
+    n = a_mat.shape[0]
+    if n != b_mat.shape[0]:
+        raise ValueError("Dimension of A and B does not match")
+    m = b_mat.shape[1]
+    if m != 1:
+        raise ValueError("Dimension of B implies that is not a SISO system")
+    if n != pole_count:
+        raise ValueError("Dimension of A and the number of poles doesn't match")
+
+
 def place_siso(a_mat, b_mat, poles):
     """
     Place poles for single input single output (SISO) systems:
@@ -180,6 +241,10 @@ def place_siso(a_mat, b_mat, poles):
         - pol placement for state feedback: :math:`A` and :math:`b`
         - pol placement for observer: :math:`A^T` and :math:`c`
 
+    The gain is computed numerically by the Ackermann formula. The parts that
+    only depend on the system are cached, so placing further poles for the
+    same system is cheap, see :py:func:`place_many` .
+
     Args:
         a_mat (:obj:`numpy.ndarray`): System matrix.:math:`A`
         b_mat (:obj:`numpy.ndarray`): Input vector :math:`b` or Output matrix
@@ -190,35 +255,41 @@ def place_siso(a_mat, b_mat, poles):
         :obj:`numpy.ndarray`: Feedback vector or :math:`k` or observer gain
         :math:`l^T` .
     """
+    return place_many(a_mat, b_mat, [np.ravel(poles)])[0]
 
-    # check consistency
-    if a_mat.shape[0] != a_mat.shape[1]:
-        raise ValueError("A is not square")
-    n = a_mat.shape[0]
-    if n != b_mat.shape[0]:
-        raise ValueError("Dimension of A and B does not match")
-    m = b_mat.shape[1]
-    if m != 1:
-        raise ValueError("Dimension of B implies that is not a SISO system")
-    if n != len(poles):
-        raise ValueError("Dimension of A and the number of poles doesn't match")
 
-    p = char_coefficients(poles)
+def place_many(a_mat, b_mat, pole_sets):
+    """
+    Place several pole configurations for the same SISO system at once.
 
-    # calculate controllability matrix
-    q = controllability_matrix(a_mat, b_mat)
-    q_inv = np.linalg.inv(q)
+    All gains follow from the Ackermann formula
 
-    # last row in the inverse controllability matrix
-    t1_t = np.atleast_2d(q_inv[-1])
+    .. math::
+        k^T = \\sum_{i=0}^{n} a_i t^T A^i
 
-    cm = np.linalg.matrix_power(a_mat, n)
-    for i in range(n):
-        cm = cm + p[i] * np.linalg.matrix_power(a_mat, i)
+    with the coefficients :math:`a_i` of the characteristic polynomials and
+    the last row :math:`t^T` of the inverse controllability matrix, hence
+    a whole pole sweep boils down to a single matrix product.
 
-    k = np.dot(t1_t, cm)
+    Args:
+        a_mat (:obj:`numpy.ndarray`): System matrix :math:`A` .
+        b_mat (:obj:`numpy.ndarray`): Input vector :math:`b` or output matrix
+            :math:`c` .
+        pole_sets (array-like): Desired poles, one configuration per row.
+
+    Return:
+        :obj:`numpy.ndarray`: Gains of shape `(k, 1, n)` , where entry `i`
+        equals the result of :py:func:`place_siso` for the `i` -th
+        configuration.
+    """
+    a_mat = np.asarray(a_mat, dtype=float)
+    b_mat = np.asarray(b_mat, dtype=float)
+    pole_sets = np.atleast_2d(pole_sets)
+    _check_siso(a_mat, b_mat, pole_sets.shape[1])
 
-    return k
+    coefficients = _real_coefficients(_poly_coefficients(pole_sets))
+    gains = coefficients @ _ackermann_rows(a_mat, b_mat)
+    return gains[:, None, :]
 
 
 def calc_prefilter(a_mat, b_mat, c_mat, k_mat=None):
@@ -258,8 +329,9 @@ def calc_prefilter(a_mat, b_mat, c_mat, k_mat=None):
     if k_mat[0, 0] is not None:
         try:
             # prefilter: V = -[C(A-BK)^-1*B]^-1
-            v = -mat_inv(c_mat @ (mat_inv(a_mat - b_mat @ k_mat) @ b_mat))
-        except np.linalg.linalg.LinAlgError:
+            v = -mat_inv(c_mat @ np.linalg.solve(a_mat - b_mat @ k_mat,
+                                                 b_mat))
+        except np.linalg.LinAlgError:
             raise ValueError("Cannot calculate V due to singularity.")
     else:
         v = np.array([[1]])
@@ -6,6 +6,28 @@ import pymoskito as pm
 from . import settings as st
 
 
+@pm.jit
+def _ball_beam_dynamics(x, tau, B, G, M, J, Jb):
+    """
+    State derivatives of a single ball and beam system, see
+    :py:class:`BallBeamModel`
+    """
+    x1 = x[0]
+    x2 = x[1]
+    x3 = x[2]
+    x4 = x[3]
+
+    dx = np.empty(4)
+    dx[0] = x2
+    dx[1] = B * (x1 * x4 ** 2 - G * np.sin(x3))
+    dx[2] = x4
+
+    # inverse nonlinear system transformation
+    dx[3] = (tau - M * (2 * x1 * x2 * x4
+                        + G * x1 * np.cos(x3))) / (M * x1 ** 2 + J + Jb)
+    return dx
+
+
 #class
 class BallBeamModel(pm.Model):
     """
@@ -21,6 +43,7 @@ class BallBeamModel(pm.Model):
                                    ("beam depth", st.beam_depth),
                                    ("initial state", st.initial_state)
                                    ])
+    supports_batch = True
 
     #init
     def __init__(self, settings):
@@ -50,12 +73,17 @@ class BallBeamModel(pm.Model):
         :type args: system input tau
         """
 
+        if np.ndim(x) == 1:
+            # single system, evaluated by the compiled kernel
+            return _ball_beam_dynamics(x, float(np.squeeze(args[0])), self.B,
+                                       self.G, self.M, self.J, self.Jb)
+
         # definitional
-        x1 = x[0]
-        x2 = x[1]
-        x3 = x[2]
-        x4 = x[3]
-        tau = args[0].squeeze()
+        x1 = x[..., 0]
+        x2 = x[..., 1]
+        x3 = x[..., 2]
+        x4 = x[..., 3]
+        tau = np.squeeze(args[0])
 
         dx1 = x2
         dx2 = self.B * (x1 * x4 ** 2 - self.G * np.sin(x3))
@@ -67,7 +95,7 @@ class BallBeamModel(pm.Model):
                                                              + self.J + self.Jb)
         dx4 = u
 
-        return np.array([dx1, dx2, dx3, dx4])
+        return np.stack([dx1, dx2, dx3, dx4], axis=-1)
 
     #root
     def root_function(self, x):
@@ -96,7 +124,7 @@ class BallBeamModel(pm.Model):
         :param input_vector: input values
         :return: ball position
         """
-        return input_vector[0]
+        return input_vector[..., 0]
 
 
 #register
@@ -23,6 +23,7 @@ class LuenbergerObserver(pm.Observer):
         ("steady tau", 0),
         ("tick divider", 1),
     ])
+    state_attributes = ("output",)
 
     def __init__(self, settings):
         settings.update(output_dim=4)
@@ -70,6 +71,7 @@ class LuenbergerObserverReduced(pm.Observer):
         ("steady tau", 0),
         ("tick divider", 1),
     ])
+    state_attributes = ("output",)
 
     def __init__(self, settings):
         settings.update(output_dim=4)
@@ -155,6 +157,7 @@ class HighGainObserver(pm.Observer):
         ("poles", [-10, -10, -10, -10]),
         ("tick divider", 1),
     ])
+    state_attributes = ("output",)
 
     def __init__(self, settings):
         settings.update(output_dim=4)
@@ -227,6 +230,7 @@ class LuenbergerObserverInt(pm.Observer):
         ("start time", 0),
         ("end time", 5)
     ])
+    state_attributes = ("output",)
 
     def __init__(self, settings):
         settings.update(output_dim=4)
@@ -258,6 +262,16 @@ class LuenbergerObserverInt(pm.Observer):
         dx_o = (self.a_mat - self.L @ self.c_mat) @ x_o + self.b_mat @ u + self.L @ y
         return dx_o
 
+    def get_state(self):
+        state = super().get_state()
+        state.update(t=self.solver.t, y=np.copy(self.solver.y))
+        return state
+
+    def set_state(self, state):
+        state = dict(state)
+        self.solver.set_initial_value(state.pop("y"), state.pop("t"))
+        super().set_state(state)
+
     def _observe(self, time, system_input, system_output):
         if system_input is not None:
             self.solver.set_f_params((system_input, system_output))
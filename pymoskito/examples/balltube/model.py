@@ -89,6 +89,21 @@ class BallInTubeModel(pm.Model):
 
         return flag, x0
 
+    def event_functions(self):
+        """
+        zero crossings of the balls elevation and the fan speed, which are
+        handled by the root function
+        """
+        def ball_elevation(t, x, args):
+            return x[2]
+        ball_elevation.direction = -1
+
+        def fan_speed(t, x, args):
+            return x[0]
+        fan_speed.direction = -1
+
+        return [ball_elevation, fan_speed]
+
     def check_consistency(self, x):
         """
         Checks if the model rules are violated
@@ -192,6 +207,16 @@ class BallInTubeSpringModel(pm.Model):
 
         return flag, x0
 
+    def event_functions(self):
+        """
+        zero crossing of the fan speed, which is handled by the root function
+        """
+        def fan_speed(t, x, args):
+            return x[0]
+        fan_speed.direction = -1
+
+        return [fan_speed]
+
     def check_consistency(self, x):
         """
         Checks if the model rules are violated
@@ -7,6 +7,41 @@ import pymoskito as pm
 from . import settings as st
 
 
+@pm.jit
+def _point_mass_dynamics(x, F_star, m0, m1, m2, l1, l2, d0, d1, d2, g):
+    """
+    State derivatives of the point mass model, see :py:class:`TwoPendulumModel`
+    """
+    # definitional
+    x1 = x[0]
+    x2 = x[1]
+    x3 = x[2]
+    x4 = x[3]
+    x5 = x[4]
+    x6 = x[5]
+    M1_star = 0
+    M2_star = 0
+
+    # transformation of the input
+    M = m0 + m1*(np.sin(x3))**2 + m2*(np.sin(x5))**2
+    F1 = m1*np.sin(x3)*(g*np.cos(x3) - l1*x4**2)
+    F2 = m2*np.sin(x5)*(g*np.cos(x5) - l2*x6**2)
+    u = (F1 +
+         F2 +
+         (F_star - d0*x2) +
+         (M1_star - d1*x4)*np.cos(x3)/l1 +
+         (M2_star - d2*x6)*np.cos(x5)/l2)/M
+
+    dx = np.empty(6)
+    dx[0] = x2
+    dx[1] = u
+    dx[2] = x4
+    dx[3] = g*np.sin(x3)/l1 + u*np.cos(x3)/l1 + (M1_star - d1*x4)/(m1*l1**2)
+    dx[4] = x6
+    dx[5] = g*np.sin(x5)/l2 + u*np.cos(x5)/l2 + (M2_star - d2*x6)/(m2*l2**2)
+    return dx
+
+
 class TwoPendulumModel(pm.Model):
     """
     Implementation of the two pendulum on a cart system
@@ -66,36 +101,10 @@ class TwoPendulumModel(pm.Model):
         :type args: system input force on the cart
         """
 
-        # definitional
-        x1 = x[0]
-        x2 = x[1]
-        x3 = x[2]
-        x4 = x[3]
-        x5 = x[4]
-        x6 = x[5]
-        F_star = args[0].squeeze()
-        M1_star = 0
-        M2_star = 0
-
-        # transformation of the input
-        M = self.m0 + self.m1*(np.sin(x3))**2 + self.m2*(np.sin(x5))**2
-        F1 = self.m1*np.sin(x3)*(self.g*np.cos(x3) - self.l1*x4**2)
-        F2 = self.m2*np.sin(x5)*(self.g*np.cos(x5) - self.l2*x6**2)
-        u = (F1 +
-             F2 +
-             (F_star - self.d0*x2) +
-             (M1_star - self.d1*x4)*np.cos(x3)/self.l1 +
-             (M2_star - self.d2*x6)*np.cos(x5)/self.l2)/M
-
-        dx1 = x2
-        dx2 = u
-        dx3 = x4
-        dx4 = self.g*np.sin(x3)/self.l1 + u*np.cos(x3)/self.l1 + (M1_star - self.d1*x4)/(self.m1*self.l1**2)
-        dx5 = x6
-        dx6 = self.g*np.sin(x5)/self.l2 + u*np.cos(x5)/self.l2 + (M2_star - self.d2*x6)/(self.m2*self.l2**2)
-
-        dx = np.array([dx1, dx2, dx3, dx4, dx5, dx6])
-        return dx
+        return _point_mass_dynamics(x, float(np.squeeze(args[0])),
+                                    self.m0, self.m1, self.m2,
+                                    self.l1, self.l2,
+                                    self.d0, self.d1, self.d2, self.g)
 
     def root_function(self, x):
         return [False]
@@ -1,21 +1,28 @@
 from collections import OrderedDict
+from fractions import Fraction
+import math
 import os
 import pickle
 import warnings
 
+from scipy import integrate, linalg, sparse
 from scipy.integrate import ode
+from scipy.optimize import brentq
 import sympy as sp
 import numpy as np
 
 from .simulation_modules import (
     Model, Solver, SolverException, Trajectory, TrajectoryException, Controller,
-    Feedforward, SignalMixer, ModelMixer, ObserverMixer, Limiter, Sensor,
-    Disturbance
+    ControllerException, Feedforward, SignalMixer, ModelMixer, ObserverMixer,
+    Limiter, Sensor, Disturbance
 )
 from .controltools import calc_prefilter, place_siso
 
-__all__ = ["LinearStateSpaceModel", "ODEInt", "ModelInputLimiter",
+__all__ = ["LinearStateSpaceModel", "SymbolicModel", "ODEInt", "SolveIVP",
+           "ExplicitRungeKutta", "Euler", "Heun", "RungeKutta4",
+           "DormandPrince", "ExactDiscretization", "ModelInputLimiter",
            "Setpoint", "HarmonicTrajectory", "SmoothTransition",
+           "TabulatedTrajectory",
            "Feedthrough",
            "PIDController", "LinearStateSpaceController",
            "DeadTimeSensor", "GaussianNoise",
@@ -26,6 +33,41 @@ Ready to go implementations of simulation modules.
 """
 
 
+def _bandwidth(pattern):
+    """
+    Lower and upper bandwidth of a sparsity pattern.
+    """
+    rows, cols = sparse.coo_matrix(pattern).nonzero()
+    if not len(rows):
+        return 0, 0
+    return int(max(np.max(rows - cols), 0)), int(max(np.max(cols - rows), 0))
+
+
+def _banded_jacobian(jacobian, size, lband, uband):
+    """
+    Wrap a jacobian to return the packed band storage of the Fortran codes,
+    where entry `(i, j)` is stored at `(i - j + uband, j)` .
+    """
+    cols, rows = np.meshgrid(np.arange(size),
+                             np.arange(-uband, lband + 1))
+    rows = rows + cols
+    valid = (rows >= 0) & (rows < size)
+    rows = rows[valid]
+    cols = cols[valid]
+    packed_rows = rows - cols + uband
+
+    def _jacobian(t, y, *args):
+        jac = jacobian(t, y, *args)
+        banded = np.zeros((lband + uband + 1, size))
+        if sparse.issparse(jac):
+            banded[packed_rows, cols] = sparse.csr_matrix(jac)[rows, cols].A1
+        else:
+            banded[packed_rows, cols] = np.asarray(jac)[rows, cols]
+        return banded
+
+    return _jacobian
+
+
 class LinearStateSpaceModel(Model):
     """
     The state space model of a linear system.
@@ -48,6 +90,7 @@ class LinearStateSpaceModel(Model):
         ("initial state", None),
         ("initial output", None),
     ])
+    supports_batch = True
 
     def __init__(self, settings):
         file = settings["config file"]
@@ -94,17 +137,152 @@ class LinearStateSpaceModel(Model):
         super().__init__(settings)
 
     def state_function(self, t, x, args):
-        return np.squeeze(self.ss.A @ x + self.ss.B @ (
-            args[0] - self.input_offset))
+        u = np.asarray(args[0])
+        if u.ndim:
+            u = u.reshape(np.shape(x)[:-1] + (-1,))
+        return x @ self.ss.A.T + (u - self.input_offset) @ self.ss.B.T
+
+    def calc_output(self, input_vector):
+        return input_vector @ self.ss.C.T + self.output_offset
+
+    def discretize(self, step_size):
+        # the input is augmented as constant state, hence the upper blocks of
+        # expm([[A, B], [0, 0]] * h) hold the transition and input matrices
+        n, m = self.ss.B.shape
+        block = np.zeros((n + m, n + m))
+        block[:n, :n] = self.ss.A
+        block[:n, n:] = self.ss.B
+        block = linalg.expm(block * step_size)
+        phi = block[:n, :n]
+        gamma = block[:n, n:]
+        return phi, gamma, -gamma @ np.asarray(self.input_offset, dtype=float)
+
+
+class SymbolicModel(Model):
+    """
+    Base class for models whose dynamics are given by sympy expressions.
+
+    Derived classes implement :py:meth:`symbolic_system` and provide the
+    state function `f(x, u)` and the output map `h(x)` symbolically. All
+    further symbols in these expressions are model parameters, whose values
+    are taken from the settings entry of the same name.
+
+    The state function, its analytic jacobian and the output map are
+    translated into numpy functions once per class and kept in a cache, so
+    further instances, e.g. the members of an ensemble, reuse them. Since
+    :py:meth:`jacobian` is provided, solvers like :py:class:`ODEInt` or
+    :py:class:`SolveIVP` with an implicit method use the exact jacobian
+    instead of finite differences.
+
+    Note:
+        The settings `state_count` and `input_count` are derived from the
+        symbols and need not be given.
+    """
+    _function_cache = {}
+
+    def __init__(self, settings):
+        functions = self._function_cache.get(type(self), None)
+        if functions is None:
+            functions = self._lambdify_system()
+            self._function_cache[type(self)] = functions
+        (self._f, self._jac, self._h, parameters, self._sparsity,
+         settings["state_count"], settings["input_count"]) = functions
+
+        missing = [name for name in parameters if name not in settings]
+        if missing:
+            raise ValueError("Settings lack the values of the parameters "
+                             "{}.".format(missing))
+        self._parameters = parameters
+
+        super().__init__(settings)
+
+    def symbolic_system(self):
+        """
+        Provide the symbolic description of the system.
+
+        Returns:
+            tuple: Sequences of the state symbols `x` , the input symbols `u`
+            , the expressions of the state derivatives `f(x, u)` and the
+            expressions of the outputs `h(x)` . If `h` is `None` , the state
+            is used as output.
+
+        Note:
+            This method is called once per class, before the settings are
+            available, hence parameters have to enter the expressions as
+            symbols.
+        """
+        raise NotImplementedError
+
+    def _lambdify_system(self):
+        x, u, f, h = self.symbolic_system()
+        x = list(x)
+        u = list(u)
+        f = sp.Matrix(list(f))
+        if len(f) != len(x):
+            raise ValueError("Got {} state derivatives for {} states.".format(
+                len(f), len(x)))
+
+        known = set(x) | set(u)
+        free = f.free_symbols
+        if h is not None:
+            h = sp.Matrix(list(h))
+            free |= h.free_symbols
+        parameters = sorted(free - known, key=lambda sym: sym.name)
+
+        args = (x, u, parameters)
+        jacobian = f.jacobian(x)
+        rhs = sp.lambdify(args, f, "numpy", cse=True)
+        jac = sp.lambdify(args, jacobian, "numpy", cse=True)
+        out = None
+        if h is not None:
+            out = sp.lambdify((x, parameters), h, "numpy", cse=True)
+        sparsity = sparse.csr_matrix(np.array(
+            [[entry != 0 for entry in jacobian.row(idx)]
+             for idx in range(jacobian.rows)], dtype=bool))
+
+        return (rhs, jac, out, [sym.name for sym in parameters], sparsity,
+                len(x), len(u))
+
+    def _parameter_values(self):
+        return [self._settings[name] for name in self._parameters]
+
+    def state_function(self, t, x, args):
+        return np.ravel(self._f(x, np.ravel(args[0]),
+                                self._parameter_values()))
+
+    def jacobian(self, t, x, args):
+        """
+        Exact jacobian of :py:meth:`state_function` with respect to the
+        state.
+
+        Args:
+            t(float): System time.
+            x(array-like): System state.
+            args: Extra arguments, the first one being the system input.
+
+        Returns:
+            Array of shape `(state_count, state_count)` .
+        """
+        return np.asarray(self._jac(x, np.ravel(args[0]),
+                                    self._parameter_values()), dtype=float)
+
+    def jacobian_sparsity(self):
+        # the structure of the symbolic jacobian
+        return self._sparsity
 
     def calc_output(self, input_vector):
-        return (self.ss.C @ input_vector
-                + self.output_offset)
+        if self._h is None:
+            return input_vector
+        return np.ravel(self._h(input_vector, self._parameter_values()))
 
 
 class ODEInt(Solver):
     """
     Wrapper for ode_int from Scipy project
+
+    The settings `lband` and `uband` declare a banded jacobian for the modes
+    `vode` and `lsoda` . If both are unset, the band is derived from
+    :py:meth:`.Model.jacobian_sparsity` for `bdf` and `lsoda` .
     """
     public_settings = OrderedDict([
         ("Mode", "vode"),
@@ -113,28 +291,107 @@ class ODEInt(Solver):
         ("step size", 1e-3),
         ("rTol", 1e-6),
         ("aTol", 1e-9),
+        ("lband", None),
+        ("uband", None),
         ("start time", 0),
         ("end time", 5)
     ])
 
     def __init__(self, settings):
         Solver.__init__(self, settings)
+        band = self._get_band()
 
         # setup solver
-        if hasattr(self._model, "jacobian"):
-            self._solver = ode(self._model.state_function,
-                               jac=self._model.jacobian)
-        else:
-            self._solver = ode(self._model.state_function)
-
+        jacobian = getattr(self._model, "jacobian", None)
+        if jacobian is not None and band is not None:
+            jacobian = _banded_jacobian(jacobian, self._state_count(), *band)
+        self._solver = ode(self._model.state_function, jac=jacobian)
+
+        options = {}
+        if band is not None:
+            options.update(lband=band[0], uband=band[1])
         self._solver.set_integrator(self._settings["Mode"],
                                     method=self._settings["Method"],
                                     rtol=self._settings["rTol"],
                                     atol=self._settings["aTol"],
-                                    max_step=self._settings["step size"]
-                                    )
+                                    max_step=self._settings["step size"],
+                                    **options)
         self._solver.set_initial_value(np.atleast_1d(self._model.initial_state),
                                        t=self._settings["start time"])
+        self._statistics = {}
+
+    def _state_count(self):
+        return np.size(self._model.initial_state)
+
+    def _get_band(self):
+        """
+        Determine the band of the jacobian that is passed to the integrator.
+
+        Explicitly given bandwidths are used as they are. Otherwise, the band
+        is derived from :py:meth:`.Model.jacobian_sparsity` for the methods
+        that solve linear systems with the jacobian, i.e. `bdf` of `vode`
+        and `lsoda` , as long as it is narrower than the full matrix.
+
+        Returns:
+            tuple: Lower and upper bandwidth or `None` for a full jacobian.
+        """
+        lband = self._settings["lband"]
+        uband = self._settings["uband"]
+        if lband is not None or uband is not None:
+            if self._settings["Mode"] not in ("vode", "lsoda"):
+                raise SolverException("Banded jacobians are only supported "
+                                      "by the modes 'vode' and 'lsoda'.")
+            return int(lband or 0), int(uband or 0)
+
+        if not (self._settings["Mode"] == "lsoda"
+                or (self._settings["Mode"] == "vode"
+                    and self._settings["Method"] == "bdf")):
+            return None
+
+        pattern = self._model.jacobian_sparsity()
+        if pattern is None:
+            return None
+
+        lband, uband = _bandwidth(pattern)
+        if lband + uband + 1 >= self._state_count():
+            return None
+        return lband, uband
+
+    def _read_counters(self):
+        """
+        Read the counters of the integrator, which are reset on every restart
+        and, for the explicit Runge-Kutta methods, on every call.
+        """
+        iwork = self._solver._integrator.iwork
+        if self._settings["Mode"] in ("dopri5", "dop853"):
+            return {"steps": int(iwork[17]),
+                    "rhs evaluations": int(iwork[16]),
+                    "rejected steps": int(iwork[19])}
+
+        counters = {"steps": int(iwork[10]),
+                    "rhs evaluations": int(iwork[11]),
+                    "jacobian evaluations": int(iwork[12])}
+        if self._settings["Mode"] == "vode":
+            # convergence and error test failures
+            counters["rejected steps"] = int(iwork[20] + iwork[21])
+        return counters
+
+    def _collect_counters(self):
+        for key, val in self._read_counters().items():
+            self._statistics[key] = self._statistics.get(key, 0) + val
+
+    def _restart(self, y, t):
+        self._collect_counters()
+        self._solver.set_initial_value(y, t)
+
+    def get_statistics(self):
+        if self._settings["Mode"] in ("dopri5", "dop853"):
+            return dict(self._statistics)
+
+        stats = dict(self._statistics)
+        for key, val in self._read_counters().items():
+            stats[key] = stats.get(key, 0) + val
+        return stats
 
     @property
     def t(self):
@@ -144,13 +401,31 @@ class ODEInt(Solver):
     def successful(self):
         return self._solver.successful()
 
+    def get_state(self):
+        state = Solver.get_state(self)
+        state.update(t=self._solver.t, y=np.copy(self._solver.y),
+                     statistics=self.get_statistics())
+        return state
+
+    def set_state(self, state):
+        """
+        Restore the solver state.
+
+        Note:
+            The history of the integrator is not part of the state, hence the
+            integration restarts at the restored point.
+        """
+        state = dict(state)
+        self._restart(state.pop("y"), state.pop("t"))
+        self._statistics = dict(state.pop("statistics", {}))
+        Solver.set_state(self, state)
+
     def set_input(self, *args):
         """
         propagate input changes to ode_int
         """
         self._solver.set_f_params(args)
         if hasattr(self._model, "jacobian"):
-            # TODO Test
             self._solver.set_jac_params(args)
 
     def integrate(self, t):
@@ -161,12 +436,14 @@ class ODEInt(Solver):
         :return: system state at target time
         """
         state = self._solver.integrate(t + self._settings["step size"])
+        if self._settings["Mode"] in ("dopri5", "dop853"):
+            self._collect_counters()
 
         # check model constraints
         new_state = self._model.root_function(state)
         if new_state[0]:
             # reset solver since discontinuous change in equations happened
-            self._solver.set_initial_value(new_state[1], self.t)
+            self._restart(new_state[1], self.t)
 
         if not self._solver.successful():
             raise SolverException("Integration has not been successful.")
@@ -174,6 +451,684 @@ class ODEInt(Solver):
         return state
 
 
+class SolveIVP(Solver):
+    """
+    Solver based on the integrators of :py:func:`scipy.integrate.solve_ivp`
+    with event detection.
+
+    The integrator is advanced step by step up to the end of every
+    simulation step. As long as the model input does not change, it is kept
+    alive so that its step size and history are preserved, a step that
+    reaches beyond the end of the simulation step is kept and the state at
+    the end is interpolated from it. If the input changes, the integrator is
+    restarted at the end of the simulation step with the step size it
+    reached before, since the history of the multistep methods and the last
+    derivative of the one-step methods belong to the old input.
+    If the model declares :py:meth:`.Model.event_functions` , a sign change
+    of one of them is located within the integrator step using its dense
+    output, :py:meth:`.Model.root_function` is applied to the state at this
+    time and the integration restarts from the resulting state. Afterwards
+    and for models without events, :py:meth:`.Model.root_function` is
+    checked at the end of every simulation step, just as in
+    :py:class:`ODEInt` .
+
+    For the implicit methods, the structure of the jacobian is taken from
+    the settings `lband` and `uband` or from
+    :py:meth:`.Model.jacobian_sparsity` , see
+    :py:meth:`_get_jacobian_options` .
+
+    With `dense output` enabled, the interpolants of all integrator steps
+    are kept, so that the values can be recorded at the exact instants of
+    the measure rate. The `step size` then only has to resolve the changes
+    of the model input, i.e. the ticks of the controller, while the
+    integrator chooses its own steps in between.
+
+    Since the methods are implemented in Python, a step is more expensive
+    than with :py:class:`ODEInt` , which makes this solver the choice for
+    models whose discontinuities have to be located accurately.
+    """
+    public_settings = OrderedDict([
+        ("Method", "RK45"),
+        ("measure rate", 500),
+        ("step size", 1e-3),
+        ("rTol", 1e-6),
+        ("aTol", 1e-9),
+        ("dense output", True),
+        ("lband", None),
+        ("uband", None),
+        ("start time", 0),
+        ("end time", 5)
+    ])
+
+    methods = ["RK23", "RK45", "DOP853", "Radau", "BDF", "LSODA"]
+    """ Available integration methods. """
+
+    def __init__(self, settings):
+        Solver.__init__(self, settings)
+        if self._settings["Method"] not in self.methods:
+            raise SolverException("Unknown method '{}', choose one of "
+                                  "{}".format(self._settings["Method"],
+                                              self.methods))
+
+        initial_state = np.array(np.atleast_1d(self._model.initial_state),
+                                 dtype=float)
+        self._shape = initial_state.shape
+        self._args = ()
+        self._events = self._model.event_functions()
+        self._statistics = {"steps": 0, "rhs evaluations": 0,
+                            "jacobian evaluations": 0, "events": 0}
+        self._solver = None
+        self._first_step = None
+        self._g = None
+        self._jacobian_options = self._get_jacobian_options()
+        self._restart(initial_state.ravel(), self._settings["start time"])
+        self._step_start = (self._t, self._y)
+        self._segments = []
+
+    def _function(self, t, y):
+        return np.ravel(self._model.state_function(
+            t, np.reshape(y, self._shape), self._args))
+
+    def _jacobian(self, t, y):
+        return self._model.jacobian(t, np.reshape(y, self._shape),
+                                    self._args)
+
+    def _sparse_jacobian(self, t, y):
+        return sparse.csc_matrix(self._jacobian(t, y))
+
+    def _get_jacobian_options(self):
+        """
+        Options of the implicit methods that concern the jacobian.
+
+        The structure of the jacobian is given by the settings `lband` and
+        `uband` or, if both are unset, by
+        :py:meth:`.Model.jacobian_sparsity` . `Radau` and `BDF` then
+        use sparse finite differences or convert the jacobian of the model
+        to a sparse matrix, so that sparse LU decompositions are used, while
+        `LSODA` is given the band of the jacobian.
+        """
+        method = self._settings["Method"]
+        if method not in ("Radau", "BDF", "LSODA"):
+            return {}
+
+        size = int(np.prod(self._shape))
+        lband = self._settings["lband"]
+        uband = self._settings["uband"]
+        pattern = None
+        band = None
+        if lband is not None or uband is not None:
+            band = int(lband or 0), int(uband or 0)
+        else:
+            pattern = self._model.jacobian_sparsity()
+            if pattern is not None:
+                band = _bandwidth(pattern)
+
+        jacobian = None
+        if hasattr(self._model, "jacobian"):
+            jacobian = self._jacobian
+
+        options = {}
+        if method == "LSODA":
+            if band is not None and sum(band) + 1 < size:
+                options.update(lband=band[0], uband=band[1])
+                if jacobian is not None:
+                    jacobian = _banded_jacobian(jacobian, size, *band)
+        elif band is not None:
+            if pattern is None:
+                offsets = range(-band[0], band[1] + 1)
+                pattern = sparse.diags([np.ones(size - abs(k))
+                                        for k in offsets], offsets)
+            elif sparse.csc_matrix(pattern).nnz > size ** 2 / 4:
+                # too dense to gain anything from sparse linear algebra
+                pattern = None
+
+            if pattern is not None and jacobian is None:
+                options.update(jac_sparsity=sparse.csc_matrix(pattern))
+            elif pattern is not None:
+                jacobian = self._sparse_jacobian
+
+        if jacobian is not None:
+            options.update(jac=jacobian)
+        return options
+
+    def _event_values(self, t, y):
+        x = np.reshape(y, self._shape)
+        return np.array([event(t, x, self._args) for event in self._events],
+                        dtype=float)
+
+    def _collect_counters(self):
+        self._statistics["rhs evaluations"] += int(self._solver.nfev)
+        self._statistics["jacobian evaluations"] += int(self._solver.njev)
+
+    def _restart(self, y, t):
+        """
+        Restart the integration at `t` from the state `y` .
+
+        The integrator itself is created by :py:meth:`_start` , since the
+        methods evaluate the model and hence need its current input.
+        """
+        if self._solver is not None:
+            self._collect_counters()
+        self._solver = None
+        self._last_step = None
+        self._t = t
+        self._y = np.array(y, dtype=float)
+
+    def _start(self, t_end):
+        """
+        Create the integrator at the current state.
+
+        The integrator may proceed a step beyond the end time of the
+        simulation or `t_end` , whichever comes last. Its first step is at
+        most twice the largest step before the restart and ends at `t_end`
+        the latest.
+        """
+        t_bound = (max(self._settings["end time"], t_end)
+                   + self._settings["step size"])
+        options = dict(rtol=self._settings["rTol"],
+                       atol=self._settings["aTol"],
+                       **self._jacobian_options)
+        if self._first_step is not None and t_end > self._t:
+            options.update(first_step=min(2 * self._first_step,
+                                          t_end - self._t))
+
+        method = getattr(integrate, self._settings["Method"])
+        self._solver = method(self._function, self._t, self._y, t_bound,
+                              **options)
+        if self._events:
+            self._g = self._event_values(self._t, self._y)
+
+    def _locate_event(self, g_old, g_new, t_old, dense_output=None):
+        """
+        Find the first event within the last integrator step.
+
+        Args:
+            g_old(array): Values of the event functions before the step.
+            g_new(array): Values of the event functions after the step.
+            t_old(float): Time before the step.
+            dense_output: Interpolant of the step, created if required and
+                not given.
+
+        Returns:
+            tuple: Time and integrator state of the event or `None` if no
+            event occurred.
+        """
+        # crossings have to start off the surface, otherwise a state that
+        # rests on it would trigger the event again and again
+        rising = (g_old < 0) & (g_new >= 0)
+        falling = (g_old > 0) & (g_new <= 0)
+        t_event = None
+        for idx, event in enumerate(self._events):
+            direction = getattr(event, "direction", 0)
+            if not ((rising[idx] and direction >= 0)
+                    or (falling[idx] and direction <= 0)):
+                continue
+
+            if dense_output is None:
+                dense_output = self._solver.dense_output()
+
+            def _value(t):
+                return event(t, np.reshape(dense_output(t), self._shape),
+                             self._args)
+
+            root = brentq(_value, t_old, self._solver.t,
+                          xtol=4 * np.finfo(float).eps)
+
+            # make sure that the crossing is complete at the returned time,
+            # otherwise the root function would not detect it
+            delta = 4 * np.finfo(float).eps * max(1, abs(root))
+            while g_old[idx] * _value(root) > 0 and root < self._solver.t:
+                root = min(root + delta, self._solver.t)
+                delta *= 2
+
+            if t_event is None or root < t_event:
+                t_event = root
+
+        if t_event is None:
+            return None
+        return t_event, dense_output(t_event)
+
+    @property
+    def t(self):
+        return self._t
+
+    @property
+    def successful(self):
+        return self._solver is None or self._solver.status != "failed"
+
+    @property
+    def dense_output(self):
+        return self._settings["dense output"]
+
+    def interpolate(self, t):
+        t_start, y_start = self._step_start
+        if t <= t_start or not self._segments:
+            return np.reshape(y_start, self._shape)
+
+        for t_old, t_new, dense_output in self._segments:
+            if t <= t_new:
+                break
+        return np.reshape(dense_output(min(t, t_new)), self._shape)
+
+    def get_statistics(self):
+        stats = dict(self._statistics)
+        if self._solver is not None:
+            stats["rhs evaluations"] += int(self._solver.nfev)
+            stats["jacobian evaluations"] += int(self._solver.njev)
+        return stats
+
+    def get_state(self):
+        state = Solver.get_state(self)
+        state.update(t=self.t, y=np.copy(self._y),
+                     statistics=self.get_statistics())
+        return state
+
+    def set_state(self, state):
+        """
+        Restore the solver state.
+
+        Note:
+            The history of the integrator is not part of the state, hence the
+            integration restarts at the restored point.
+        """
+        state = dict(state)
+        self._restart(state.pop("y"), state.pop("t"))
+        self._statistics = dict(state.pop("statistics", self._statistics))
+        Solver.set_state(self, state)
+
+    def set_input(self, *args):
+        """
+        Set the model input and restart the integrator if it has changed.
+        """
+        if self._solver is not None and (
+                len(args) != len(self._args)
+                or not all(np.array_equal(new, old)
+                           for new, old in zip(args, self._args))):
+            self._restart(self._y, self._t)
+
+        # the inputs may be buffers that are overwritten in the next step
+        self._args = tuple(np.copy(arg) for arg in args)
+
+    def integrate(self, t):
+        """
+        Integrate until target step is reached.
+
+        Args:
+            t(float): Current time, the model is integrated up to
+                `t + step size` .
+
+        Returns:
+            System state at target time.
+        """
+        t_end = t + self._settings["step size"]
+        # steps that end closer to t_end are regarded as ending there
+        tolerance = 1e-9 * self._settings["step size"]
+        if self._solver is None:
+            self._start(t_end)
+        self._step_start = (self._t, np.copy(self._y))
+        self._segments = []
+        last_step = self._last_step
+        if last_step is not None and self._settings["dense output"]:
+            self._segments.append(last_step)
+        g_old = self._g
+
+        step_size = 0
+        while self._solver is not None and self._solver.t < t_end - tolerance:
+            if self._solver.status == "finished":
+                # the bound has been reached, let the integration continue
+                self._restart(self._solver.y, self._solver.t)
+                self._start(t_end)
+                g_old = self._g
+
+            t_old = self._solver.t
+            message = self._solver.step()
+            self._statistics["steps"] += 1
+            if self._solver.status == "failed":
+                raise SolverException("Integration has not been successful: "
+                                      "{}".format(message))
+            step_size = max(step_size, self._solver.step_size)
+
+            dense_output = None
+            if (self._settings["dense output"]
+                    or self._solver.t > t_end + tolerance):
+                dense_output = self._solver.dense_output()
+            last_step = [t_old, self._solver.t, dense_output]
+            if self._settings["dense output"]:
+                self._segments.append(last_step)
+            if not self._events:
+                continue
+
+            g_new = self._event_values(self._solver.t, self._solver.y)
+            event = self._locate_event(g_old, g_new, t_old, dense_output)
+            g_old = g_new
+            if event is None:
+                continue
+
+            t_event, y_event = event
+            if t_event > t_end + tolerance:
+                # the input may change until the event, hence the integration
+                # is repeated from the end of the simulation step
+                last_step[1] = t_end
+                if dense_output is None:
+                    dense_output = self._solver.dense_output()
+                self._restart(dense_output(t_end), t_end)
+                break
+
+            self._statistics["events"] += 1
+            reset, x = self._model.root_function(
+                np.reshape(y_event, self._shape).copy())
+            if reset:
+                # continue from the reset state at the time of the event
+                last_step[1] = t_event
+                self._restart(np.ravel(x), t_event)
+                self._start(t_end)
+                g_old = self._g
+
+        if step_size:
+            self._first_step = step_size
+        if self._solver is not None:
+            self._g = g_old
+            if self._solver.t > t_end + tolerance:
+                # keep the step that reaches into the next simulation step
+                self._last_step = last_step
+                self._y = np.array(last_step[2](t_end), dtype=float)
+            else:
+                self._last_step = None
+                self._y = np.copy(self._solver.y)
+            self._t = t_end
+
+        state = np.reshape(self._y, self._shape).copy()
+
+        # check model constraints
+        new_state = self._model.root_function(state)
+        if new_state[0]:
+            # reset solver since discontinuous change in equations happened
+            self._restart(np.ravel(new_state[1]), self.t)
+
+        return state
+
+
+class ExplicitRungeKutta(Solver):
+    """
+    Base class for explicit Runge-Kutta solvers with a fixed step size.
+
+    Derived classes define the method by its Butcher tableau. Every call of
+    :py:meth:`integrate` performs a single step of `step size` in pure NumPy,
+    which avoids the per call overhead of the Fortran integrators used by
+    :py:class:`ODEInt` and suits non-stiff models. The state may have any
+    shape, hence batched states of ensemble runs are supported as well.
+    """
+    public_settings = OrderedDict([
+        ("measure rate", 500),
+        ("step size", 1e-3),
+        ("start time", 0),
+        ("end time", 5)
+    ])
+    state_attributes = Solver.state_attributes + ("_t", "_x", "_statistics")
+
+    butcher_a = [[]]
+    """ Coupling coefficients, row `i` holds the weights of stage `i` . """
+    butcher_b = [1]
+    """ Weights of the stages in the final combination. """
+    butcher_c = [0]
+    """ Nodes, i.e. the relative times of the stages. """
+
+    in_place_size = 64
+    """
+    States with at least this many entries are computed in place, using the
+    state buffers of the solver. For smaller ones, the overhead of the
+    in-place operations exceeds the cost of the temporary arrays.
+    """
+
+    def __init__(self, settings):
+        Solver.__init__(self, settings)
+        self._function = self._model.state_function
+        self._t = self._settings["start time"]
+        self._x = self._init_state_buffers(
+            np.atleast_1d(self._model.initial_state))
+        self._args = ()
+        self._statistics = {"steps": 0, "rhs evaluations": 0}
+
+        # scale the tableau by the step size and drop vanishing coefficients
+        # once instead of on every step
+        h = self._settings["step size"]
+        self._stages = [(h * c, [(j, h * a) for j, a in enumerate(row) if a])
+                        for c, row in zip(self.butcher_c, self.butcher_a)]
+        self._weights = [(i, h * b) for i, b in enumerate(self.butcher_b)
+                         if b]
+
+        # the stage derivatives and the intermediate arrays are reused in
+        # every step
+        self._k = [None] * len(self._stages)
+        self._x_stage = np.empty_like(self._x)
+        self._term = np.empty_like(self._x)
+
+    @property
+    def t(self):
+        return self._t
+
+    @property
+    def successful(self):
+        return bool(np.isfinite(self._x).all())
+
+    def get_statistics(self):
+        return dict(self._statistics)
+
+    def set_input(self, *args):
+        self._args = args
+
+    def _combine(self, x, terms, out=None):
+        """
+        Compute `x + sum(a * k[j] for j, a in terms)` , in `out` if given.
+        """
+        k = self._k
+        if out is None:
+            for j, a in terms:
+                x = x + a * k[j]
+            return x
+
+        term = self._term
+        terms = iter(terms)
+        j, a = next(terms)
+        np.multiply(k[j], a, out=out)
+        out += x
+        for j, a in terms:
+            np.multiply(k[j], a, out=term)
+            out += term
+        return out
+
+    def _step(self, t, x, out=None):
+        """
+        Perform a single step starting at `x` , the result is written to
+        `out` if given.
+        """
+        function = self._function
+        args = self._args
+        k = self._k
+        x_stage_out = None if out is None else self._x_stage
+        for idx, (dt, row) in enumerate(self._stages):
+            x_stage = x
+            if row:
+                x_stage = self._combine(x, row, x_stage_out)
+            k[idx] = np.asarray(function(t + dt, x_stage, args))
+
+        self._statistics["steps"] += 1
+        self._statistics["rhs evaluations"] += len(k)
+
+        return self._combine(x, self._weights, out)
+
+    def integrate(self, t):
+        """
+        Integrate until target step is reached.
+
+        Args:
+            t(float): Current time, the model is integrated up to
+                `t + step size` .
+
+        Returns:
+            System state at target time.
+        """
+        if self._x.size < self.in_place_size:
+            state = self._step(self._t, self._x)
+            self._x = state
+        else:
+            self._step(self._t, self._x,
+                       self._state_buffers[self._buffer_index ^ 1])
+            self._x, state = self._swap_state_buffers()
+        self._t = t + self._settings["step size"]
+
+        # check model constraints
+        new_state = self._model.root_function(self._x)
+        if new_state[0]:
+            # continue from the reset state
+            self._x = np.array(np.reshape(new_state[1], np.shape(state)),
+                               dtype=float)
+
+        if not self.successful:
+            raise SolverException("Integration has not been successful.")
+
+        return state
+
+
+class Euler(ExplicitRungeKutta):
+    """
+    Explicit Euler method, first order.
+    """
+    butcher_a = [[]]
+    butcher_b = [1]
+    butcher_c = [0]
+
+
+class Heun(ExplicitRungeKutta):
+    """
+    Heun's method, second order.
+    """
+    butcher_a = [[],
+                 [1]]
+    butcher_b = [1 / 2, 1 / 2]
+    butcher_c = [0, 1]
+
+
+class RungeKutta4(ExplicitRungeKutta):
+    """
+    Classical Runge-Kutta method, fourth order.
+    """
+    butcher_a = [[],
+                 [1 / 2],
+                 [0, 1 / 2],
+                 [0, 0, 1]]
+    butcher_b = [1 / 6, 1 / 3, 1 / 3, 1 / 6]
+    butcher_c = [0, 1 / 2, 1 / 2, 1]
+
+
+class DormandPrince(ExplicitRungeKutta):
+    """
+    Fifth order solution of the Dormand-Prince method with a fixed step.
+
+    Since the step size is not adapted, the embedded error estimate and
+    hence the seventh stage are omitted. The last stage of a step cannot be
+    reused in the next one either, because the model input changes between
+    the steps.
+    """
+    butcher_a = [[],
+                 [1 / 5],
+                 [3 / 40, 9 / 40],
+                 [44 / 45, -56 / 15, 32 / 9],
+                 [19372 / 6561, -25360 / 2187, 64448 / 6561, -212 / 729],
+                 [9017 / 3168, -355 / 33, 46732 / 5247, 49 / 176,
+                  -5103 / 18656]]
+    butcher_b = [35 / 384, 0, 500 / 1113, 125 / 192, -2187 / 6784, 11 / 84]
+    butcher_c = [0, 1 / 5, 3 / 10, 4 / 5, 8 / 9, 1]
+
+
+class ExactDiscretization(Solver):
+    """
+    Exact solver for linear models with zero-order hold input.
+
+    The model has to provide :py:meth:`.Model.discretize` , like
+    :py:class:`LinearStateSpaceModel` does. The matrices of the discrete
+    time system are computed once from the matrix exponential, afterwards
+    every step consists of two matrix-vector products that are exact up to
+    machine precision, regardless of the step size and the stiffness of the
+    system. No arrays are allocated during the steps, which keeps large
+    linear plants cheap to simulate.
+    """
+    public_settings = OrderedDict([
+        ("measure rate", 500),
+        ("step size", 1e-3),
+        ("start time", 0),
+        ("end time", 5)
+    ])
+    state_attributes = Solver.state_attributes + ("_t", "_x", "_statistics")
+
+    def __init__(self, settings):
+        Solver.__init__(self, settings)
+        try:
+            phi, gamma, offset = self._model.discretize(
+                self._settings["step size"])
+        except NotImplementedError:
+            raise SolverException("Model '{}' does not provide an exact "
+                                  "discretization.".format(
+                type(self._model).__name__))
+
+        # transposed, since the states are handled as row vectors
+        self._phi = np.ascontiguousarray(np.transpose(phi), dtype=float)
+        self._gamma = np.ascontiguousarray(np.transpose(gamma), dtype=float)
+        self._offset = np.array(offset, dtype=float)
+        self._input_term = np.empty(self._gamma.shape[1])
+
+        self._t = self._settings["start time"]
+        self._x = self._init_state_buffers(
+            np.atleast_1d(self._model.initial_state))
+        self._u = np.zeros(self._gamma.shape[0])
+        self._statistics = {"steps": 0}
+
+    @property
+    def t(self):
+        return self._t
+
+    @property
+    def successful(self):
+        return bool(np.isfinite(self._x).all())
+
+    def get_statistics(self):
+        return dict(self._statistics)
+
+    def set_input(self, *args):
+        self._u = np.ravel(args[0])
+
+    def integrate(self, t):
+        """
+        Advance the system by one step.
+
+        Args:
+            t(float): Current time, the model is advanced to
+                `t + step size` .
+
+        Returns:
+            System state at target time.
+        """
+        x_new = np.matmul(self._x, self._phi,
+                          out=self._state_buffers[self._buffer_index ^ 1])
+        x_new += np.matmul(self._u, self._gamma, out=self._input_term)
+        x_new += self._offset
+        self._t = t + self._settings["step size"]
+        self._x, state = self._swap_state_buffers()
+        self._statistics["steps"] += 1
+
+        # check model constraints
+        new_state = self._model.root_function(self._x)
+        if new_state[0]:
+            # continue from the reset state
+            self._x = np.array(np.reshape(new_state[1], np.shape(state)),
+                               dtype=float)
+
+        if not self.successful:
+            raise SolverException("Integration has not been successful.")
+
+        return state
+
+
 class SmoothTransition(Trajectory):
     """
     provides (differential) smooth transition between two scalar states
@@ -183,28 +1138,17 @@ class SmoothTransition(Trajectory):
                        "delta t": 5,
                        }
 
+    _polynomial_cache = {}
+    """ Coefficients of the transition polynomials per differential order. """
+
     def __init__(self, settings):
         settings["states"] = np.asarray(settings["states"])
         Trajectory.__init__(self, settings)
 
-        # setup symbolic expressions
-        tau, k = sp.symbols("tau, k")
-
-        gamma = self._settings["differential_order"] + 1
-        alpha = sp.factorial(2 * gamma + 1)
-
-        f = sp.binomial(gamma, k) * (-1) ** k * tau ** (gamma + k + 1) / (gamma + k + 1)
-        phi = alpha / sp.factorial(gamma) ** 2 * sp.summation(f, (k, 0, gamma))
-
-        # differentiate phi(tau), index in list corresponds to order
-        dphi_sym = [phi]  # init with phi(tau)
-        for order in range(self._settings["differential_order"]):
-            dphi_sym.append(dphi_sym[-1].diff(tau))
-
-        # lambdify
-        self.dphi_num = []
-        for der in dphi_sym:
-            self.dphi_num.append(sp.lambdify(tau, der, "numpy"))
+        order = self._settings["differential_order"]
+        self._coefficients = self.transition_polynomials(order)
+        self._time_scaling = np.power(float(self._settings["delta t"]),
+                                      -np.arange(order + 1))
 
         # issue deprecation warning
         if self._settings["states"].ndim == 1:
@@ -222,23 +1166,80 @@ class SmoothTransition(Trajectory):
         t0 = self._settings['start time']
         dt = self._settings['delta t']
 
-        y = np.zeros((yd.shape[0], len(self.dphi_num)))
+        y = np.zeros((yd.shape[0], self._coefficients.shape[1]))
         if t < t0:
             y[:, 0] = yd[:, 0]
         elif t > t0 + dt:
             y[:, 0] = yd[:, 1]
         else:
-            for order, dphi in enumerate(self.dphi_num):
-                if order == 0:
-                    ya = yd[:, 0]
-                else:
-                    ya = np.zeros_like(yd[:, 0])
+            # all derivatives of phi at once
+            scale = np.polyval(self._coefficients, (t - t0) / dt)
+            scale *= self._time_scaling
+            np.multiply.outer(yd[:, 1] - yd[:, 0], scale, out=y)
+            y[:, 0] += yd[:, 0]
 
-                scale = dphi((t - t0) / dt) * 1 / dt ** order
-                y[:, order] = ya + (yd[:, 1] - yd[:, 0]) * scale
+        return y
+
+    def desired_values_batch(self, t):
+        yd = self._settings['states']
+        t0 = self._settings['start time']
+        dt = self._settings['delta t']
 
+        t = np.asarray(t, dtype=float)
+        y = np.zeros((len(t), yd.shape[0], self._coefficients.shape[1]))
+        before = t < t0
+        after = t > t0 + dt
+        during = ~(before | after)
+        y[before, :, 0] = yd[:, 0]
+        y[after, :, 0] = yd[:, 1]
+
+        scale = np.polyval(self._coefficients, (t[during, None] - t0) / dt)
+        scale *= self._time_scaling
+        y[during] = (yd[:, 1] - yd[:, 0])[:, None] * scale[:, None, :]
+        y[during, :, 0] += yd[:, 0]
         return y
 
+    @classmethod
+    def transition_polynomials(cls, differential_order):
+        """
+        Coefficients of the transition polynomial and its derivatives.
+
+        The polynomial rises from zero to one on the interval [0, 1], while
+        its derivatives up to order `differential_order + 1` vanish at both
+        ends. The coefficients are computed exactly from the closed form and
+        stored for the whole process.
+
+        Args:
+            differential_order(int): Highest derivative that is needed.
+
+        Returns:
+            numpy.ndarray: Coefficients with the highest power first, column
+            `i` belongs to the `i` -th derivative, as expected by
+            :py:func:`numpy.polyval` .
+        """
+        coefficients = cls._polynomial_cache.get(differential_order, None)
+        if coefficients is None:
+            gamma = differential_order + 1
+            alpha = Fraction(math.factorial(2 * gamma + 1),
+                             math.factorial(gamma) ** 2)
+
+            # coefficients of phi(tau), lowest power first
+            poly = [Fraction(0)] * (2 * gamma + 2)
+            for k in range(gamma + 1):
+                poly[gamma + k + 1] = (alpha * math.comb(gamma, k) * (-1) ** k
+                                       / (gamma + k + 1))
+
+            columns = []
+            for order in range(differential_order + 1):
+                columns.append([float(c) for c in reversed(poly)])
+                poly = [i * c for i, c in enumerate(poly)][1:] + [0]
+
+            coefficients = np.array(columns).T
+            coefficients.flags.writeable = False
+            cls._polynomial_cache[differential_order] = coefficients
+
+        return coefficients
+
 
 class HarmonicTrajectory(Trajectory):
     """
@@ -254,32 +1255,24 @@ class HarmonicTrajectory(Trajectory):
     def __init__(self, settings):
         Trajectory.__init__(self, settings)
 
-        # calculate symbolic derivatives up to order n
-        t, a, f, off, p = sp.symbols("t, a, f, off, p")
-        self.yd_sym = []
-        harmonic = a * sp.sin(2 * sp.pi * f * t + p) + off
-
-        for idx in range(settings["differential_order"] + 1):
-            self.yd_sym.append(harmonic.diff(t, idx))
-
-        # lambdify
-        for idx, val in enumerate(self.yd_sym):
-            self.yd_sym[idx] = sp.lambdify((t, a, f, off, p), val, "numpy")
+        # the n-th derivative is a * omega^n * sin(omega * t + p + n * pi / 2)
+        # hence alternately a sine and a cosine term with changing signs
+        order = np.arange(self._settings["differential_order"] + 1)
+        omega = 2 * np.pi * self._settings["Frequency"]
+        factors = self._settings["Amplitude"] * omega ** order
+        self._sine_factors = factors * np.choose(order % 4, [1, 0, -1, 0])
+        self._cosine_factors = factors * np.choose(order % 4, [0, 1, 0, -1])
+        self._offset = np.where(order == 0, self._settings["Offset"], 0.)
+        self._phase = self._settings["Phase in degree"] * np.pi / 180
+        self._omega = omega
 
     def _desired_values(self, t):
-        # yd = []
-        yd = np.zeros((self._settings['differential_order'] + 1), )
+        angle = self._omega * t + self._phase
+        return (np.sin(angle) * self._sine_factors
+                + np.cos(angle) * self._cosine_factors + self._offset)
 
-        a = self._settings['Amplitude']
-        f = self._settings['Frequency']
-        off = self._settings["Offset"]
-        p = self._settings["Phase in degree"] * np.pi / 180
-
-        for idx, val in enumerate(self.yd_sym):
-            yd[idx] = val(t, a, f, off, p)
-            # yd.append(val(t, a, f, off, p))
-
-        return yd
+    def desired_values_batch(self, t):
+        return self._desired_values(np.asarray(t, dtype=float)[:, None])
 
 
 class Setpoint(Trajectory):
@@ -308,6 +1301,139 @@ class Setpoint(Trajectory):
     def _desired_values(self, t):
         return self.yd
 
+    def desired_values_batch(self, t):
+        return np.repeat(self.yd[None], len(t), axis=0)
+
+
+class TabulatedTrajectory(Trajectory):
+    """
+    Replays a recorded trajectory from a `.npy` file.
+
+    The file holds a two-dimensional array whose 0th column contains the
+    strictly increasing sample times. The other columns hold the components
+    one after another, each with its value followed by its derivatives, e.g.
+    `t, y1, dy1, y2, dy2` for two components with their first derivatives.
+    The file is memory-mapped, so only the samples that are actually needed
+    are read from the disk.
+
+    Between the samples, the values are interpolated linearly. On a uniform
+    time grid the samples are found by index arithmetic, otherwise by binary
+    search. Before the first and after the last sample, the values of these
+    samples are held.
+    """
+
+    public_settings = OrderedDict([("File", "reference.npy"),
+                                   ("Outputs", 1)])
+
+    _chunk_size = 2 ** 16
+    """ Number of samples that are checked at once when opening a file. """
+
+    def __init__(self, settings):
+        Trajectory.__init__(self, settings)
+
+        file_name = os.path.expanduser(self._settings["File"])
+        try:
+            data = np.load(file_name, mmap_mode="r")
+        except (OSError, ValueError) as e:
+            raise TrajectoryException("Cannot read the trajectory file '{}': "
+                                      "{}".format(file_name, e))
+
+        outputs = self._settings["Outputs"]
+        if data.ndim != 2 or data.shape[0] < 2 or data.shape[1] < 2:
+            raise TrajectoryException("The trajectory file '{}' has to hold "
+                                      "at least two samples of the time and "
+                                      "the values.".format(file_name))
+        if (data.shape[1] - 1) % outputs:
+            raise TrajectoryException("The {} value columns of '{}' cannot be "
+                                      "split into {} outputs."
+                                      "".format(data.shape[1] - 1, file_name,
+                                                outputs))
+
+        self._columns = (data.shape[1] - 1) // outputs
+        self._order = self._settings["differential_order"] + 1
+        if self._columns < self._order:
+            raise TrajectoryException("The trajectory file '{}' provides "
+                                      "derivatives up to order {}, but {} "
+                                      "are needed."
+                                      "".format(file_name, self._columns - 1,
+                                                self._order - 1))
+
+        self._data = data
+        self._times = data[:, 0]
+        self._start = float(self._times[0])
+        self._end = float(self._times[-1])
+        self._last = len(data) - 2
+        self._step_size = self._check_grid()
+
+    def _check_grid(self):
+        """
+        Make sure that the sample times increase and check whether they lie
+        on a uniform grid.
+
+        Returns:
+            float: The sample interval of a uniform grid or `None` .
+        """
+        times = self._times
+        count = len(times)
+        step_size = (self._end - self._start) / (count - 1)
+        tolerance = 1e-9 * max(abs(self._start), abs(self._end), step_size)
+        uniform = True
+        for first in range(0, count - 1, self._chunk_size):
+            chunk = np.asarray(times[first:first + self._chunk_size + 1])
+            if np.any(np.diff(chunk) <= 0):
+                raise TrajectoryException("The sample times of '{}' do not "
+                                          "increase strictly."
+                                          "".format(self._settings["File"]))
+            if uniform:
+                grid = self._start + np.arange(first, first + len(chunk)
+                                               ) * step_size
+                uniform = np.max(np.abs(chunk - grid)) <= tolerance
+
+        return step_size if uniform else None
+
+    def _locate(self, t):
+        """
+        Index of the sample before `t` and the relative position between it
+        and the next sample.
+        """
+        if self._step_size is not None:
+            pos = (t - self._start) / self._step_size
+            idx = np.clip(np.floor(pos), 0, self._last).astype(int)
+            return idx, np.clip(pos - idx, 0, 1)
+
+        idx = np.clip(np.searchsorted(self._times, t, side="right") - 1,
+                      0, self._last)
+        start = self._times[idx]
+        frac = (t - start) / (self._times[idx + 1] - start)
+        return idx, np.clip(frac, 0, 1)
+
+    def _select(self, rows):
+        """
+        Reshape value rows into components and derivatives and drop the
+        derivatives that are not needed.
+        """
+        values = rows[..., 1:].reshape(rows.shape[:-1]
+                                       + (self._settings["Outputs"],
+                                          self._columns))
+        return values[..., :self._order]
+
+    def _desired_values(self, t):
+        # plain float arithmetic is considerably faster for a single time
+        if self._step_size is not None:
+            pos = (t - self._start) / self._step_size
+            idx = min(max(math.floor(pos), 0), self._last)
+            frac = min(max(pos - idx, 0.), 1.)
+        else:
+            idx, frac = self._locate(t)
+        rows = np.asarray(self._data[idx:idx + 2], dtype=float)
+        return self._select(rows[0] + frac * (rows[1] - rows[0]))
+
+    def desired_values_batch(self, t):
+        idx, frac = self._locate(np.asarray(t, dtype=float))
+        lower = np.asarray(self._data[idx], dtype=float)
+        upper = np.asarray(self._data[idx + 1], dtype=float)
+        return self._select(lower + frac[:, None] * (upper - lower))
+
 
 class Feedthrough(Feedforward):
     """
@@ -316,6 +1442,7 @@ class Feedthrough(Feedforward):
     public_settings = OrderedDict([
         ("tick divider", 1),
     ])
+    supports_batch = True
 
     def __init__(self, settings):
         settings.update(input_order=0)
@@ -418,71 +1545,135 @@ class LinearStateSpaceController(Controller):
 
 class PIDController(Controller):
     """
-    PID Controller
+    PID Controller for one or more channels.
+
+    Every channel feeds back the model state given by `input_state` and
+    compares it with the corresponding component of the trajectory. The
+    integral is discretized by the rule given by `discretization` , either
+    `backward Euler` or `Tustin` , while the derivative is always
+    approximated by a backward difference. To prevent windup, the integral is
+    limited to the `output_limits` , just like the output.
+
+    The weights of the discrete update are computed once for the sample
+    interval, i.e. the time between two calls, and all channels are updated
+    at once in preallocated arrays. Gains and limits may also be given as
+    arrays of shape `(N,)` , so that a single instance controls a whole
+    ensemble.
     """
     public_settings = OrderedDict([("Kp", 700),
                                    ("Ki", 500),
                                    ("Kd", 200),
                                    ("output_limits", [0, 255]),
                                    ("input_state", [2]),
+                                   ("discretization", "backward Euler"),
                                    ("tick divider", 1)])
-    last_time = 0
+    supports_batch = True
+    state_attributes = ("e_old", "integral_old", "output", "last_time")
+    discretizations = ("backward Euler", "Tustin")
 
     def __init__(self, settings):
         # add specific "private" settings
         settings.update(input_order=0)
-        settings.update(output_dim=len(self.public_settings["input_state"]))
+        settings.update(output_dim=len(settings["input_state"]))
         settings.update(input_type="Model_State")
         Controller.__init__(self, settings)
 
-        # define variables for data saving in the right dimension
-        # (columns vectors)
-        self.e_old = np.zeros((len(self._settings["input_state"]), ))
-        self.integral_old = np.zeros((len(self._settings["input_state"]), ))
-        self.last_u = np.zeros((len(self._settings["input_state"]), ))
-        self.output = np.zeros((len(self._settings["input_state"]), ))
+        if self._settings["discretization"] not in self.discretizations:
+            raise ControllerException(
+                "Unknown discretization '{}', choose one of {}.".format(
+                    self._settings["discretization"], self.discretizations))
+
+        # gains and limits broadcast against the channels in the last axis
+        self._channels = np.array(self._settings["input_state"], dtype=int)
+        self._kp = np.expand_dims(np.asarray(self._settings["Kp"],
+                                             dtype=float), -1)
+        self._ki = np.expand_dims(np.asarray(self._settings["Ki"],
+                                             dtype=float), -1)
+        self._kd = np.expand_dims(np.asarray(self._settings["Kd"],
+                                             dtype=float), -1)
+        limits = np.asarray(self._settings["output_limits"], dtype=float)
+        self._lower = limits[..., :1]
+        self._upper = limits[..., 1:]
+
+        shape = np.broadcast_shapes(self._kp.shape, self._ki.shape,
+                                    self._kd.shape, self._lower.shape)
+        self._allocate(shape[:-1] + (len(self._channels),))
+        self.last_time = None
+        self._dt = None
+
+    def _allocate(self, shape):
+        """
+        Create the state and work arrays for outputs of the given shape.
+        """
+        self.e_old = np.zeros(shape)
+        self.integral_old = np.zeros(shape)
+        self.output = np.zeros(shape)
+        self._e = np.empty(shape)
+        self._term = np.empty(shape)
 
-    def _control(self, time, trajectory_values=None, feedforward_values=None, input_values=None, **kwargs):
-        # input abbreviations
-        x = np.zeros((len(self._settings["input_state"]), ))
-        for idx, state in enumerate(self._settings["input_state"]):
-            x[idx] = input_values[int(state)]
+    def _set_sample_time(self, dt):
+        """
+        Compute the weights of the discrete update for the sample time `dt` .
+        """
+        self._dt = dt
+        if self._settings["discretization"] == "Tustin":
+            self._weights = (dt / 2, dt / 2)
+        else:
+            self._weights = (dt, 0)
+        self._kd_dt = self._kd / dt
 
-        yd = trajectory_values
+    def _control(self, time, trajectory_values=None, feedforward_values=None,
+                 input_values=None, **kwargs):
+        if self.last_time is None:
+            self.last_time = time
 
         # step size
         dt = time - self.last_time
-        # save current time
+        if dt == 0:
+            return self.output
         self.last_time = time
-
-        if dt != 0:
-            for i in range(len(x)):
-                # error
-                e = yd[i] - x[i]
-                integral = e * dt + self.integral_old[i]
-                if integral > self._settings["output_limits"][1]:
-                    integral = self._settings["output_limits"][1]
-                elif integral < self._settings["output_limits"][0]:
-                    integral = self._settings["output_limits"][0]
-                differential = (e - self.e_old[i]) / dt
-
-                self.output[i] = (self._settings["Kp"] * e
-                                  + self._settings["Ki"] * integral
-                                  + self._settings["Kd"] * differential)
-
-                if self.output[i] > self._settings["output_limits"][1]:
-                    self.output[i] = self._settings["output_limits"][1]
-                elif self.output[i] < self._settings["output_limits"][0]:
-                    self.output[i] = self._settings["output_limits"][0]
-
-                # save data for new calculation
-                self.e_old[i] = e
-                self.integral_old[i] = integral
-            u = self.output
-        else:
-            u = self.last_u
-        self.last_u = u
-        return u
+        if self._dt is None or abs(dt - self._dt) > 1e-9 * self._dt:
+            self._set_sample_time(dt)
+
+        yd = np.asarray(trajectory_values)
+        if yd.ndim == 1:
+            # trajectories of a single output, e.g. the HarmonicTrajectory,
+            # return the derivatives as 1-D array
+            yd = np.reshape(yd, (len(self._channels), -1))
+        yd = yd[..., :len(self._channels), 0]
+        x = np.asarray(input_values)[..., self._channels]
+        if np.shape(x) != self.output.shape:
+            # the first call of a batch evaluation
+            self._allocate(np.broadcast_shapes(np.shape(yd), np.shape(x),
+                                               self.output.shape))
+
+        e = self._e
+        term = self._term
+        np.subtract(yd, x, out=e)
+
+        # integral with anti-windup
+        integral = self.integral_old
+        np.multiply(e, self._weights[0], out=term)
+        integral += term
+        if self._weights[1]:
+            np.multiply(self.e_old, self._weights[1], out=term)
+            integral += term
+        np.maximum(integral, self._lower, out=integral)
+        np.minimum(integral, self._upper, out=integral)
+
+        output = self.output
+        np.subtract(e, self.e_old, out=term)
+        term *= self._kd_dt
+        np.multiply(self._kp, e, out=output)
+        output += term
+        np.multiply(self._ki, integral, out=term)
+        output += term
+        np.maximum(output, self._lower, out=output)
+        np.minimum(output, self._upper, out=output)
+
+        # save data for new calculation
+        self._e, self.e_old = self.e_old, e
+        return output
 
 
 class AdditiveMixer(SignalMixer):
@@ -493,6 +1684,7 @@ class AdditiveMixer(SignalMixer):
     """
     public_settings = OrderedDict([("Input A", None),
                                    ("Input B", None)])
+    supports_batch = True
 
     def __init__(self, settings):
         settings.update([("input signals", [settings["Input A"],
@@ -542,6 +1734,7 @@ class DeadTimeSensor(Sensor):
 
     public_settings = OrderedDict([("states to delay", [0]),
                                    ("delay", 1)])
+    state_attributes = ("_storage",)
 
     def __init__(self, settings):
         settings.update([("input signal", "Model_State")])
@@ -552,12 +1745,12 @@ class DeadTimeSensor(Sensor):
         if self._storage is None:
             # create storage with length "delay"
             # initial values are the first input
-            self._storage = [value]*int(self._settings["delay"])
+            self._storage = [np.copy(value)]*int(self._settings["delay"])
 
         # save current values
-        measurement = value.copy()
-        # add new measurement
-        self._storage.append(value)
+        measurement = np.copy(value)
+        # add new measurement, the input is only valid during this step
+        self._storage.append(np.copy(value))
 
         # get delayed measurements
         delayed_measurement = self._storage.pop(0)
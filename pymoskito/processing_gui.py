@@ -13,6 +13,7 @@ from PyQt5.QtWidgets import (
 
 from . import registry as pm
 from .processing_core import PostProcessingModule, MetaProcessingModule
+from .simulation_runner import load_result
 from .tools import get_resource, PlainTextLogger
 from .mpl_settings import enable_latex, disable_latex
 
@@ -196,8 +197,7 @@ class PostProcessor(QMainWindow):
         loads a result file
         """
         self._logger.info("loading result file {}".format(file_name))
-        with open(file_name.encode(), "rb") as f:
-            self.results.append(pickle.load(f))
+        self.results.append(load_result(file_name))
 
         self.sim_results_changed.emit()
 
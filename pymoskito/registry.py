@@ -1,8 +1,6 @@
 # -*- coding: utf-8 -*-
 
-from .processing_core import ProcessingModule
 from .simulation_modules import SimulationModule, SignalMixer
-from .visualization import Visualizer
 
 __all__ = ["register_simulation_module", "register_processing_module",
            "register_visualizer",
@@ -14,6 +12,10 @@ __all__ = ["register_simulation_module", "register_processing_module",
 
 """
 wrapper for easy user interaction
+
+The base classes of the processing modules and visualizers depend on Qt and
+matplotlib, hence they are only imported by the functions that need them,
+which keeps the simulation engine free of these imports.
 """
 
 _registry = {}
@@ -138,6 +140,8 @@ def register_processing_module(module_type, cls):
     :param cls: class to be registered
     :return: None
     """
+    from .processing_core import ProcessingModule
+
     if not issubclass(cls, ProcessingModule):
         raise TypeError("Only PostProcessing Modules can be registered!")
 
@@ -150,10 +154,14 @@ def get_registered_processing_modules(module_type):
     :param module_type:
     :return:
     """
+    from .processing_core import ProcessingModule
+
     return get_registered_modules(ProcessingModule, module_type)
 
 
 def get_processing_module_class_by_name(module_type, module_name):
+    from .processing_core import ProcessingModule
+
     return get_module_class_by_name(ProcessingModule, module_type, module_name)
 
 
@@ -163,6 +171,8 @@ def register_visualizer(vis_cls):
 
     :param vis_cls: class to be registered
     """
+    from .visualization import Visualizer
+
     if not issubclass(vis_cls, Visualizer):
         raise TypeError("Module must match type to be registered for! "
                         "{0} <> {1}".format(vis_cls, Visualizer))
@@ -183,4 +193,6 @@ def get_registered_visualizers():
     hook to retrieve registered visualizers
     :return: visualizer class
     """
+    from .visualization import Visualizer
+
     return _registry.get(Visualizer, [])
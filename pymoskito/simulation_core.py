@@ -1,12 +1,18 @@
 ﻿# -*- coding: utf-8 -*-
 
 
+import copy
 import logging
+import os
+import pickle
 import sys
+import time
+from collections import OrderedDict
 
 import numpy as np
-from PyQt5.QtCore import QObject, pyqtSignal, pyqtSlot
 
+from . import simulation_modules
+from .registry import get_simulation_module_class_by_name
 from .simulation_modules import SimulationException
 
 
@@ -51,18 +57,560 @@ class SimulationSettings(object):
         }
 
 
-class Simulator(QObject):
+class SignalBuffer(object):
+    """
+    Contiguous storage for the values of a single signal.
+
+    All values are stored in one preallocated array whose first axis is the
+    time axis. If the capacity is exceeded, the array grows geometrically.
+    The dtype and shape of the stored values are taken from the first value
+    that is appended.
+
+    Args:
+        capacity(int): Number of values to preallocate.
+    """
+    growth_factor = 2
+
+    def __init__(self, capacity):
+        self._capacity = max(int(capacity), 1)
+        self._size = 0
+        self._data = None
+
+    def __len__(self):
+        return self._size
+
+    def append(self, value):
+        """
+        Store a copy of `value` .
+        """
+        value = np.asarray(value)
+        if self._data is None:
+            self._data = np.empty((self._capacity,) + value.shape,
+                                  dtype=value.dtype)
+        elif not np.can_cast(value.dtype, self._data.dtype):
+            self._data = self._data.astype(np.promote_types(self._data.dtype,
+                                                            value.dtype))
+
+        if self._size == self._data.shape[0]:
+            self._grow()
+
+        self._data[self._size] = value
+        self._size += 1
+
+    def extend(self, values):
+        """
+        Store a copy of all entries of `values` along its first axis.
+        """
+        values = np.asarray(values)
+        if self._data is None:
+            self._data = np.empty((max(self._capacity, len(values)),)
+                                  + values.shape[1:],
+                                  dtype=values.dtype)
+        elif not np.can_cast(values.dtype, self._data.dtype):
+            self._data = self._data.astype(np.promote_types(self._data.dtype,
+                                                            values.dtype))
+
+        while self._size + len(values) > self._data.shape[0]:
+            self._grow()
+
+        self._data[self._size:self._size + len(values)] = values
+        self._size += len(values)
+
+    def _grow(self):
+        new_data = np.empty((self._data.shape[0] * self.growth_factor,)
+                            + self._data.shape[1:],
+                            dtype=self._data.dtype)
+        new_data[:self._size] = self._data[:self._size]
+        self._data = new_data
+
+    def clear(self):
+        """
+        Discard all stored values but keep the allocated memory.
+        """
+        self._size = 0
+
+    @property
+    def data(self):
+        """
+        View on all stored values.
+        """
+        if self._data is None:
+            return np.empty((0,))
+        return self._data[:self._size]
+
+
+class SimulationProfile(object):
+    """
+    Wall time statistics of the module evaluations in the simulation loop.
+    """
+
+    def __init__(self):
+        self._stats = OrderedDict()
+        self.wall_time = 0
+
+    def add(self, module_name, duration):
+        """
+        Record a single evaluation of a module.
+
+        Args:
+            module_name(str): Name of the module.
+            duration(float): Wall time of the evaluation in seconds.
+        """
+        stats = self._stats.get(module_name, None)
+        if stats is None:
+            stats = self._stats[module_name] = [0, 0.0, 0.0]
+        stats[0] += 1
+        stats[1] += duration
+        stats[2] = max(stats[2], duration)
+
+    def to_dict(self):
+        """
+        Call count, total, mean and max wall time (in seconds) of every
+        module.
+        """
+        return OrderedDict(
+            (name, {"count": count,
+                    "total": total,
+                    "mean": total / count,
+                    "max": max_time})
+            for name, (count, total, max_time) in self._stats.items())
+
+
+def format_profile(profile):
+    """
+    Create a human readable table from the `profile` of simulation results.
+
+    Args:
+        profile(dict): The `profile` entry of the results.
+
+    Returns:
+        str: The formatted table.
+    """
+    lines = ["Simulation profile, wall time: {:.3f} s".format(
+        profile["wall time"]),
+        "{:<16}{:>10}{:>12}{:>12}{:>12}".format(
+            "Module", "Calls", "Total [s]", "Mean [ms]", "Max [ms]")]
+    for name, stats in profile["modules"].items():
+        lines.append("{:<16}{:>10}{:>12.4f}{:>12.4f}{:>12.4f}".format(
+            name, stats["count"], stats["total"], stats["mean"] * 1e3,
+            stats["max"] * 1e3))
+
+    if profile["solver"]:
+        lines.append("Solver statistics: {}".format(", ".join(
+            "{}: {}".format(key, val)
+            for key, val in profile["solver"].items())))
+
+    return "\n".join(lines)
+
+
+class RealTimePacer(object):
+    """
+    Lock the simulation time to the wall clock and check module deadlines.
+
+    Every simulation step is released at the wall time that corresponds to
+    its simulation time. A module that is evaluated in this step has to
+    finish before its next release, i.e. within `tick divider` steps.
+    For every module, the latency between release and start of its
+    evaluation, its lateness with respect to the deadline and the number of
+    missed deadlines are recorded.
+
+    Args:
+        factor(float): Simulated seconds per wall clock second, `1` runs the
+            simulation in real time.
+        step_size(float): Step size of the simulation in seconds.
+        clock(callable): Function that returns the wall time in seconds.
+        sleep(callable): Function that waits for the given number of seconds
+            of the `clock` .
+    """
+
+    def __init__(self, factor, step_size, clock=time.perf_counter,
+                 sleep=time.sleep):
+        if factor <= 0:
+            raise ValueError("Real time factor has to be positive.")
+        self.factor = factor
+        self.step_size = step_size
+        self.clock = clock
+        self.sleep = sleep
+        self.late_steps = 0
+        self.release = None
+        self._stats = OrderedDict()
+        self._wall_start = None
+        self._sim_start = None
+
+    def start(self, sim_time):
+        """
+        Align the simulation time `sim_time` with the current wall time.
+        """
+        self._wall_start = self.clock()
+        self._sim_start = sim_time
+
+    def wait(self, sim_time):
+        """
+        Wait until the step at `sim_time` is released.
+        """
+        self.release = (self._wall_start
+                        + (sim_time - self._sim_start) / self.factor)
+        remaining = self.release - self.clock()
+        if remaining > 0:
+            self.sleep(remaining)
+        elif remaining < 0:
+            self.late_steps += 1
+
+    def add(self, module_name, start, end, tick_divider):
+        """
+        Record the evaluation of a module in the current step.
+
+        Args:
+            module_name(str): Name of the module.
+            start(float): Wall time at which the evaluation started.
+            end(float): Wall time at which the evaluation finished.
+            tick_divider(int): Tick divider of the module.
+        """
+        stats = self._stats.get(module_name, None)
+        if stats is None:
+            stats = self._stats[module_name] = dict(
+                ticks=0, missed=0, latency_sum=0.0, latency_sq_sum=0.0,
+                max_latency=0.0, max_lateness=-np.inf,
+                period=tick_divider * self.step_size / self.factor)
+
+        latency = start - self.release
+        lateness = end - (self.release + stats["period"])
+        stats["ticks"] += 1
+        stats["latency_sum"] += latency
+        stats["latency_sq_sum"] += latency ** 2
+        stats["max_latency"] = max(stats["max_latency"], latency)
+        stats["max_lateness"] = max(stats["max_lateness"], lateness)
+        if lateness > 0:
+            stats["missed"] += 1
+
+    def to_dict(self):
+        """
+        Deadline statistics of all modules, times are given in seconds.
+        """
+        modules = OrderedDict()
+        for name, stats in self._stats.items():
+            mean = stats["latency_sum"] / stats["ticks"]
+            variance = max(stats["latency_sq_sum"] / stats["ticks"]
+                           - mean ** 2, 0)
+            modules[name] = {
+                "ticks": stats["ticks"],
+                "period": stats["period"],
+                "missed deadlines": stats["missed"],
+                "max lateness": stats["max_lateness"],
+                "mean latency": mean,
+                "max latency": stats["max_latency"],
+                "jitter": np.sqrt(variance),
+            }
+
+        return {"factor": self.factor,
+                "late steps": self.late_steps,
+                "modules": modules}
+
+
+def format_realtime(realtime):
+    """
+    Create a human readable table from the `realtime` entry of simulation
+    results.
+
+    Args:
+        realtime(dict): The `realtime` entry of the results.
+
+    Returns:
+        str: The formatted table.
+    """
+    lines = ["Real time statistics, factor: {}, late steps: {}".format(
+        realtime["factor"], realtime["late steps"]),
+        "{:<16}{:>10}{:>12}{:>10}{:>15}{:>13}".format(
+            "Module", "Ticks", "Period [ms]", "Missed", "Lateness [ms]",
+            "Jitter [ms]")]
+    for name, stats in realtime["modules"].items():
+        lines.append("{:<16}{:>10}{:>12.3f}{:>10}{:>15.3f}{:>13.3f}".format(
+            name, stats["ticks"], stats["period"] * 1e3,
+            stats["missed deadlines"], stats["max lateness"] * 1e3,
+            stats["jitter"] * 1e3))
+
+    return "\n".join(lines)
+
+
+class ResultStream(object):
+    """
+    Append-only result file that is written while the simulation runs.
+
+    The file is a sequence of pickled records: A header that holds the
+    settings of the run, followed by chunks with at most `chunk_size` values
+    of every signal and a trailer that marks the end of the run. Every record
+    is flushed to disk as soon as it is written, so all chunks that have been
+    written before a crash remain readable, see :py:meth:`read` .
+
+    Args:
+        file(file): File object, opened for binary writing.
+        chunk_size(int): Number of values per signal in every chunk.
+        info(dict): Additional entries for the header, e.g. the
+            `regime name` .
+    """
+    format_key = "pymoskito result stream"
+
+    def __init__(self, file, chunk_size=10000, info=None):
+        self._file = file
+        self.chunk_size = max(int(chunk_size), 1)
+        self._info = info or {}
+
+    @property
+    def name(self):
+        """
+        Path of the result file.
+        """
+        return self._file.name
+
+    @property
+    def closed(self):
+        return self._file.closed
+
+    def _write(self, record):
+        pickle.dump(record, self._file, protocol=4)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def write_header(self, modules, simulation):
+        """
+        Start the stream with the settings of the run.
+        """
+        header = dict(self._info, modules=modules, simulation=simulation)
+        header[self.format_key] = 1
+        self._write(header)
+
+    def write_chunk(self, results):
+        """
+        Append the values of all signals.
+
+        Args:
+            results(dict): Array of new values for every signal.
+        """
+        self._write({"type": "chunk", "results": results})
+
+    def close(self, finished, simulation):
+        """
+        Mark the end of the run and close the file.
+
+        Args:
+            finished(bool): Whether the simulation finished successfully.
+            simulation(dict): Final simulation settings.
+        """
+        self._write({"type": "trailer",
+                     "finished": finished,
+                     "simulation": simulation})
+        self._file.close()
+
+    @classmethod
+    def is_header(cls, record):
+        """
+        Check whether `record` is the header of a result stream.
+        """
+        return isinstance(record, dict) and cls.format_key in record
+
+    @classmethod
+    def read(cls, header, file):
+        """
+        Read the remaining records of a result stream.
+
+        If the stream lacks a trailer because the run has been interrupted,
+        all complete chunks are returned and the results are marked as not
+        finished. Streams of resumed runs hold several trailers, of which the
+        last one is used.
+
+        Args:
+            header(dict): Header record that has already been read.
+            file(file): File object, positioned behind the header.
+
+        Returns:
+            dict: Simulation results, in the same format as
+            :py:attr:`Simulator.output` .
+        """
+        data = {key: val for key, val in header.items()
+                if key != cls.format_key}
+        chunks = OrderedDict()
+        finished = False
+        while True:
+            try:
+                record = pickle.load(file)
+            except EOFError:
+                break
+            except (pickle.UnpicklingError, ValueError):
+                logging.getLogger(cls.__name__).warning(
+                    "Skipping truncated record at the end of '{}'".format(
+                        getattr(file, "name", file)))
+                break
+
+            if record["type"] == "trailer":
+                finished = record["finished"]
+                data["simulation"] = record["simulation"]
+                continue
+
+            for key, val in record["results"].items():
+                chunks.setdefault(key, []).append(val)
+
+        data["results"] = {key: np.concatenate(val)
+                           for key, val in chunks.items()}
+        data["results"]["finished"] = finished
+        return data
+
+
+def setup_simulation_modules(module_settings):
+    """
+    Create the simulation modules from their settings.
+
+    Args:
+        module_settings(dict): Settings for every simulation module that is to
+            be used, indexed by the module name (e.g. `Model` ). Every
+            entry must hold the key `type` which names the registered class
+            to instantiate.
+
+    Returns:
+        tuple: :py:class:`SimulationSettings` and dict of module instances.
+
+    Raises:
+        SimulationException: If a module cannot be found or created or if
+            mandatory modules are missing.
+    """
+    sim_settings = None
+    sim_modules = {}
+    for module_name in Simulator.setup_order:
+        if module_settings.get(module_name, None) is None:
+            continue
+
+        settings = OrderedDict(module_settings[module_name])
+        sub_module_name = settings["type"]
+
+        module_cls = getattr(simulation_modules, module_name)
+        sub_module_cls = get_simulation_module_class_by_name(module_cls,
+                                                             sub_module_name)
+        if sub_module_cls is None:
+            raise SimulationException("No sub-module called '{}' registered "
+                                      "for '{}'".format(sub_module_name,
+                                                        module_name))
+
+        settings.update({"modules": sim_modules})
+
+        # append special settings
+        if module_name == "Solver":
+            if "Model" not in sim_modules:
+                raise SimulationException("A Solver needs a Model to work on.")
+            sim_settings = SimulationSettings(settings["start time"],
+                                              settings["end time"],
+                                              settings["step size"],
+                                              settings["measure rate"])
+
+        # build object
+        try:
+            sim_modules[module_name] = sub_module_cls(settings)
+        except Exception as e:
+            raise SimulationException("Init of module '{}' failed: "
+                                      "{}".format(module_name, e)) from e
+
+    missing = [mod for mod in Simulator.static_module_list
+               if mod not in sim_modules]
+    if missing:
+        raise SimulationException("Mandatory modules missing: "
+                                  "{}".format(", ".join(missing)))
+
+    return sim_settings, sim_modules
+
+
+def get_module_settings(regime, previous=None, ignore_is_public=False):
+    """
+    Resolve a regime into the complete settings of all its modules.
+
+    Settings that are not given in the regime are taken from the
+    `public_settings` of the selected module class.
+    If the regime does not `clear previous` settings, all modules that are not
+    mentioned in the regime keep the settings from `previous` .
+    The `ensemble` entry of a regime is not resolved here, see
+    :py:func:`.get_ensemble_settings` .
+
+    Args:
+        regime(dict): Simulation regime, as read from a `.sreg` file.
+        previous(dict): Module settings of the previous regime.
+        ignore_is_public(bool): Accept settings that are not part of the
+            public settings of a module, this is needed to restore the
+            settings stored in result files.
+
+    Returns:
+        OrderedDict: Settings for every used module, including its `type` .
+
+    Raises:
+        SimulationException: If the regime holds unknown modules or settings.
+    """
+    if regime.get("clear previous", True) or previous is None:
+        module_settings = OrderedDict()
+    else:
+        module_settings = copy.deepcopy(previous)
+
+    for module_name, value in regime.items():
+        if module_name in ("Name", "clear previous", "ensemble"):
+            continue
+
+        module_cls = getattr(simulation_modules, module_name, None)
+        if module_name not in Simulator.module_list or module_cls is None:
+            raise SimulationException("No module called "
+                                      "'{}'".format(module_name))
+
+        module_type = value["type"]
+        sub_module_cls = get_simulation_module_class_by_name(module_cls,
+                                                             module_type)
+        if sub_module_cls is None:
+            raise SimulationException("No sub-module called "
+                                      "'{}'".format(module_type))
+
+        settings = copy.deepcopy(OrderedDict(sub_module_cls.public_settings))
+        for key, val in value.items():
+            if key == "type":
+                continue
+            if key not in settings and not ignore_is_public:
+                raise SimulationException(
+                    "No public setting called '{}' available for Module: "
+                    "'{}'".format(key, module_type))
+            settings[key] = copy.deepcopy(val)
+
+        settings["type"] = module_type
+        module_settings[module_name] = settings
+
+    return module_settings
+
+
+class Simulator(object):
     """ 
     This Class executes the time-step integration.
 
-    It forms the Core of the physical simulation and interacts with the GUI
-    via the :py:class:''SimulationInterface`
+    It forms the Core of the physical simulation and is free of any Qt
+    dependencies. State changes are reported via the optional `callback`
+    which is used by the :py:class:`.SimulatorInteractor` to forward them to
+    the GUI.
 
     Calculated values will be stored every 1 / measure rate seconds.
-    """
+    If a :py:class:`ResultStream` is given, the values are written to it in
+    chunks instead of being kept in memory.
 
-    work_done = pyqtSignal()
-    state_changed = pyqtSignal(SimulationStateChange)
+    If the trajectory implements
+    :py:meth:`.Trajectory.desired_values_batch` , its values are computed for
+    all steps of the run when the simulation starts and looked up during the
+    steps.
+
+    Args:
+        settings(:py:class:`SimulationSettings`): Settings of the simulation.
+        modules(dict): Instances of the simulation modules to use.
+        callback(callable): Function that will be called with a
+            :py:class:`SimulationStateChange` whenever the state of the
+            simulation changes.
+        stream(:py:class:`ResultStream`): Optional sink for the results.
+        profile(bool): Measure the wall time of all module evaluations and
+            add it to the results, see :py:class:`SimulationProfile` .
+        realtime_factor(float): If given, the simulation is paced to run
+            this many simulated seconds per wall clock second and the deadline
+            statistics of all modules are added to the results, see
+            :py:class:`RealTimePacer` .
+        pacer(:py:class:`RealTimePacer`): Pacer to use instead of the one
+            created for `realtime_factor` , e.g. to run on another clock.
+    """
 
     # list of modules that have to appear in every run
     static_module_list = [
@@ -86,21 +634,49 @@ class Simulator(QObject):
 
     module_list = static_module_list + _dynamic_module_list
 
-    def __init__(self, settings, modules):
-        QObject.__init__(self, None)
+    max_table_size = 2 ** 22
+    """ Maximum number of values in the precomputed trajectory table. """
+
+    # order in which the modules have to be created, the Trajectory comes last
+    # because it needs the derivative orders of controller and feedforward
+    setup_order = [mod for mod in module_list if mod != "Trajectory"] + [
+        "Trajectory"]
+
+    def __init__(self, settings, modules, callback=None, stream=None,
+                 profile=False, realtime_factor=None, pacer=None):
         self._run = False
         self._logger = logging.getLogger(self.__class__.__name__)
+        self._callback = callback
+        self._stream = stream
+        self._profile = SimulationProfile() if profile else None
+        self._pacer = pacer
+        if pacer is None and realtime_factor is not None:
+            self._pacer = RealTimePacer(realtime_factor, settings.step_size)
+        self._resumed = False
+        self._first_run = True
 
         assert isinstance(settings, SimulationSettings)
         self._settings = settings
+        self._end_time = settings.end_time
         assert isinstance(modules, dict)
         self._simulation_modules = modules
+        self._solver = modules["Solver"]
+        self._plan = None
 
         self._init_states()
         self._init_settings()
         self.updated_time = 0
+        self._record_index = 0
         self._storage = dict()
 
+        if self._stream is None:
+            # one entry per measurement plus the initial values
+            self._storage_capacity = int(np.ceil(
+                (self._settings.end_time - self._settings.start_time)
+                * self._settings.measure_rate)) + 2
+        else:
+            self._storage_capacity = self._stream.chunk_size
+
     def _init_states(self):
         self._input_vector = {}
         self._counter = {}
@@ -125,22 +701,108 @@ class Simulator(QObject):
 
         return
 
-    def _calc_module(self, module_name):
-        """ Calculates the output of a simulation module
+    def _bind(self, module_name):
+        """ Create the call that computes the output of a module, wrapped by
+        the measurements that are enabled for this run.
         """
-        if module_name in self._simulation_modules.keys():
-            if self._counter[module_name] == \
-                    self._simulation_modules[module_name].tick_divider:
-                self._current_outputs[module_name] = np.atleast_1d(
-                    self._simulation_modules[module_name].calc_output(
-                        self._input_vector))
-                self._counter[module_name] = 1
-            else:
-                self._counter[module_name] += 1
+        module = self._simulation_modules[module_name]
+        func = module.calc_output
+        if module_name == "Trajectory":
+            func = self._tabulate(module) or func
+
+        if self._profile is not None:
+            profile = self._profile
+            calc_output = func
+
+            def func(input_vector):
+                start = time.perf_counter()
+                output = calc_output(input_vector)
+                profile.add(module_name, time.perf_counter() - start)
+                return output
+
+        if self._pacer is not None and module_name != "Model":
+            pacer = self._pacer
+            tick_divider = module.tick_divider
+            evaluate = func
+
+            def func(input_vector):
+                start = pacer.clock()
+                output = evaluate(input_vector)
+                pacer.add(module_name, start, pacer.clock(), tick_divider)
+                return output
+
+        return func
 
-            # update input vector
-            self._input_vector.update(
-                {module_name: self._current_outputs[module_name]})
+    def _tabulate(self, trajectory):
+        """
+        Compute the trajectory for all remaining steps of the run.
+
+        The times of the steps are accumulated just like the solvers do it.
+        If a step does not hit one of them, the trajectory is evaluated as
+        usual. Like `calc_output` , the lookup returns a new array in every
+        step.
+
+        Returns:
+            callable: Replacement of `calc_output` that looks the values up
+            or `None` if the module is no :py:class:`.Trajectory` , e.g. the
+            wrapper of an ensemble, if it does not implement
+            :py:meth:`.Trajectory.desired_values_batch` or if the table would
+            be too large.
+        """
+        if not isinstance(trajectory, simulation_modules.Trajectory):
+            return None
+
+        batch = trajectory.desired_values_batch
+        start = self._solver.t
+        step_size = self._settings.step_size
+        count = max(1, int(np.ceil((self._settings.end_time - start)
+                                   / step_size)) + 2)
+        times = np.cumsum(np.r_[start, np.full(count - 1, step_size)])
+        try:
+            if np.size(batch(times[:1])) * count > self.max_table_size:
+                return None
+            table = np.asarray(batch(times))
+        except NotImplementedError:
+            return None
+
+        table.flags.writeable = False
+        calc_output = trajectory.calc_output
+        idx = 0
+
+        def func(input_vector):
+            nonlocal idx
+            t = input_vector["time"]
+            while idx < count - 1 and times[idx] < t:
+                idx += 1
+            if times[idx] == t:
+                return table[idx].copy()
+            return calc_output(input_vector)
+
+        return func
+
+    def _compile(self):
+        """
+        Compile the module set of this run into a flat execution plan.
+
+        The plan lists the calls of all present modules in the order of
+        evaluation together with their tick dividers and counters, and the
+        source of the model input is resolved once, so that
+        :py:meth:`_calc_step` does not have to look anything up.
+        """
+        self._model_call = self._bind("Model")
+        self._plan = [[name, self._bind(name),
+                       self._simulation_modules[name].tick_divider,
+                       self._counter[name]]
+                      for name in self._dynamic_module_list + ["Solver"]
+                      if name in self._simulation_modules]
+        self._model_input_source = self._choose_model_input(
+            self._simulation_modules)
+
+    def _sync_counter(self):
+        """ Write the tick counters of the execution plan back.
+        """
+        if self._plan is not None:
+            self._counter.update({step[0]: step[3] for step in self._plan})
 
     def _calc_step(self):
         """
@@ -152,138 +814,369 @@ class Simulator(QObject):
             overridden. Be careful about which value is needed at which place or
             otherwise you end up using a value from the last step.
         """
+        solver = self._solver
+        outputs = self._current_outputs
+        inputs = self._input_vector
+
         # update time and current state
-        self._current_outputs["time"] = self._simulation_modules["Solver"].t
-        self._input_vector.update(
-            time=self._current_outputs["time"],
-            Model_State=np.atleast_1d(
-                self._simulation_modules["Solver"].next_output)
-        )
+        t = solver.t
+        state = solver.next_output
+        if state.__class__ is not np.ndarray or not state.ndim:
+            state = np.atleast_1d(state)
+        outputs["time"] = inputs["time"] = t
+        inputs["Model_State"] = state
 
         # apply new output
-        self._current_outputs["Model"] = np.atleast_1d(
-            self._simulation_modules["Model"].calc_output(
-                self._input_vector["Model_State"]))
-        self._input_vector.update(Model_Output=self._current_outputs["Model"])
+        output = self._model_call(state)
+        if output.__class__ is not np.ndarray or not output.ndim:
+            output = np.atleast_1d(output)
+        outputs["Model"] = inputs["Model_Output"] = output
 
-        # compute all dynamic modules
-        for mod in self._dynamic_module_list:
-            self._calc_module(mod)
+        # compute all present modules, the solver comes last
+        model_input = self._model_input_source
+        for step in self._plan:
+            name = step[0]
+            if name == "Solver":
+                inputs["model_input"] = inputs[model_input]
 
-        # integrate model
-        self._choose_model_input(self._input_vector)
-        self._calc_module("Solver")
+            if step[3] == step[2]:
+                output = step[1](inputs)
+                if output.__class__ is not np.ndarray or not output.ndim:
+                    output = np.atleast_1d(output)
+                outputs[name] = inputs[name] = output
+                step[3] = 1
+            else:
+                # keep the last output in the input vector
+                step[3] += 1
 
         return
 
-    def _choose_model_input(self, input_vector):
-        """ This is mainly done for convenience.
+    @staticmethod
+    def _choose_model_input(modules):
+        """ Select the module whose output drives the model.
         """
-        if "Limiter" in input_vector:
-            _input = input_vector["Limiter"]
-        elif "ModelMixer" in input_vector:
-            _input = input_vector["ModelMixer"]
-        elif "Controller" in input_vector:
-            if "Feedforward" in input_vector:
+        if "Limiter" in modules:
+            return "Limiter"
+        elif "ModelMixer" in modules:
+            return "ModelMixer"
+        elif "Controller" in modules:
+            if "Feedforward" in modules:
                 raise SimulationException(
                     "Controller and Feedforward present but no"
                     "ModelMixer. Ambiguous Situation")
-            _input = input_vector["Controller"]
-        elif "Feedforward" in input_vector:
-            _input = input_vector["Feedforward"]
+            return "Controller"
+        elif "Feedforward" in modules:
+            return "Feedforward"
         else:
             raise SimulationException("No model input given.")
 
-        self._input_vector["model_input"] = _input
-
-    def _store_values(self):
+    def _store_values(self, values=None):
         """
         store all values of finished integration step
         """
-        for key, val in self._current_outputs.items():
-            if key in self._storage:
-                self._storage[key].append(np.array(val))
-            else:
-                self._storage.update({key: [np.array(val)]})
+        if values is None:
+            values = self._current_outputs
+
+        for key, val in values.items():
+            if key not in self._storage:
+                self._storage[key] = SignalBuffer(self._storage_capacity)
+            self._storage[key].append(val)
+
+        if (self._stream is not None
+                and len(self._storage["time"]) >= self._stream.chunk_size):
+            self._flush_storage()
 
         return
 
+    def _flush_storage(self):
+        """
+        Write all stored values to the stream and free the storage.
+        """
+        buffers = {key: buf for key, buf in self._storage.items()
+                   if isinstance(buf, SignalBuffer)}
+        if not buffers or not len(buffers["time"]):
+            return
+
+        self._stream.write_chunk({key: buf.data
+                                  for key, buf in buffers.items()})
+        for buf in buffers.values():
+            buf.clear()
+
+    def _close_stream(self, finished):
+        if self._stream is None:
+            return
+
+        self._flush_storage()
+        self._stream.close(finished, self._settings.to_dict())
+
     def _check_time(self):
         """
         send update notification every second
         """
         t = self._current_outputs["time"]
         if t - self.updated_time > 1:
-            self.state_changed.emit(SimulationStateChange(type="time", t=t))
-            # self.timeChanged.emit(t)
+            self._notify(SimulationStateChange(type="time", t=t))
             self.updated_time = t
 
-    @pyqtSlot()
+    def _notify(self, state_change):
+        if self._callback is not None:
+            self._callback(state_change)
+
     def run(self):
         """
         Start the simulation.
+
+        Returns:
+            dict: The simulation results, see :py:attr:`output` .
         """
         self._run = True
-        self.state_changed.emit(SimulationStateChange(type="start"))
+        self._run_start = time.perf_counter()
+        if self._stream is not None and not self._resumed:
+            self._stream.write_header(
+                {mod: obj.settings
+                 for mod, obj in self._simulation_modules.items()},
+                self._settings.to_dict())
+        self._notify(SimulationStateChange(type="start"))
 
-        first_run = True
         rate = 1 / self._settings.measure_rate
-        solver = self._simulation_modules["Solver"]
+        solver = self._solver
+        try:
+            self._compile()
+        except SimulationException:
+            return self._abort(sys.exc_info())
+        if self._pacer is not None:
+            self._pacer.start(solver.t)
+
+        if solver.dense_output:
+            return self._run_dense()
 
         while self._current_outputs["time"] < self._settings.end_time:
             t = solver.t
             dt = 0
             while dt < rate:
                 if not self._run:
-                    self._abort("Simulation aborted by user")
-                    break
+                    return self._abort("Simulation aborted by user")
+
+                if self._pacer is not None:
+                    self._pacer.wait(solver.t)
 
                 try:
                     self._calc_step()
 
                 except Exception:
                     # catch all to avoid loosing data
-                    self._abort(sys.exc_info())
-                    return
+                    return self._abort(sys.exc_info())
 
                 dt = solver.t - t
-                if dt < rate and first_run:
+                if dt < rate and self._first_run:
                     self._store_values()
-                first_run = False
+                self._first_run = False
 
             self._store_values()
             self._check_time()
 
-        self._finish()
+        return self._finish()
+
+    def _run_dense(self):
+        """
+        Main loop for solvers with dense output.
+
+        The values are recorded at the exact instants of the measure rate,
+        independent of the step size. In between the steps, the state is
+        interpolated by the solver and the model output is computed from it,
+        while all other signals hold the values of the last step. These
+        evaluations of the model are profiled just like the ones of the steps.
+        """
+        solver = self._solver
+        start_time = self._settings.start_time
+        end_time = self._settings.end_time
+        measure_rate = self._settings.measure_rate
+        # instants that coincide with the end of a step belong to the next one
+        tolerance = 1e-9 * self._settings.step_size
+
+        while self._current_outputs["time"] < end_time:
+            if not self._run:
+                return self._abort("Simulation aborted by user")
+
+            if self._pacer is not None:
+                self._pacer.wait(solver.t)
+
+            try:
+                self._calc_step()
+
+                instant = start_time + self._record_index / measure_rate
+                while (instant < solver.t - tolerance
+                       and instant <= end_time + tolerance):
+                    state = np.atleast_1d(solver.interpolate(instant))
+                    values = dict(self._current_outputs)
+                    values.update(time=instant,
+                                  Solver=state,
+                                  Model=np.atleast_1d(
+                                      self._model_call(state)))
+                    self._store_values(values)
+                    self._record_index += 1
+                    instant = start_time + self._record_index / measure_rate
+
+            except Exception:
+                # catch all to avoid loosing data
+                return self._abort(sys.exc_info())
+
+            self._check_time()
+
+        return self._finish()
 
     def _abort(self, info):
         """ Overwrite end time with reached time.
         """
         self._settings.end_time = self._current_outputs["time"]
         self._storage.update(finished=False)
+        self._close_stream(False)
+        self._update_wall_time()
         end_state = "abort"
-        self.state_changed.emit(SimulationStateChange(type=end_state,
-                                                      data=self.output,
-                                                      info=info))
-        self.work_done.emit()
+        data = self.output
+        self._notify(SimulationStateChange(type=end_state,
+                                           data=data,
+                                           info=info))
+        return data
 
     def _finish(self):
         self._storage.update(finished=True)
+        self._close_stream(True)
+        self._update_wall_time()
         end_state = "finish"
-        self.state_changed.emit(SimulationStateChange(type=end_state,
-                                                      data=self.output,
-                                                      info="Success"))
-        self.work_done.emit()
+        data = self.output
+        self._notify(SimulationStateChange(type=end_state,
+                                           data=data,
+                                           info="Success"))
+        return data
+
+    def _update_wall_time(self):
+        if self._profile is not None:
+            self._profile.wall_time += time.perf_counter() - self._run_start
 
-    @pyqtSlot(name="stop")
     def stop(self):
         """ Stop the simulation. """
         self._run = False
 
+    def snapshot(self, file_name=None):
+        """
+        Capture the complete state of the simulation loop.
+
+        The snapshot can be taken from within the callback or after the run
+        has been stopped. It holds the settings and the internal states of all
+        modules (see :py:meth:`.SimulationModule.get_state` ) as well as all
+        values recorded so far, which allows to continue the run later on via
+        :py:meth:`restore` , possibly in another process.
+        If the results are streamed, the recorded values are flushed to the
+        stream instead.
+
+        Args:
+            file_name(str): If given, the snapshot is also written to this
+                file.
+
+        Returns:
+            dict: Picklable snapshot of the simulation.
+        """
+        if self._stream is not None and not self._stream.closed:
+            self._flush_storage()
+
+        self._sync_counter()
+        settings = self._settings.to_dict()
+        settings["end time"] = self._end_time
+        snapshot = dict(
+            simulation=settings,
+            modules={name: dict(settings=obj.settings,
+                                state=obj.get_state())
+                     for name, obj in self._simulation_modules.items()},
+            counter=dict(self._counter),
+            current_outputs=copy.deepcopy(self._current_outputs),
+            input_vector=copy.deepcopy(self._input_vector),
+            updated_time=self.updated_time,
+            first_run=self._first_run,
+            record_index=self._record_index,
+            storage={key: buf.data.copy()
+                     for key, buf in self._storage.items()
+                     if isinstance(buf, SignalBuffer) and len(buf)},
+        )
+        if self._stream is not None:
+            snapshot.update({"result file": self._stream.name,
+                             "chunk size": self._stream.chunk_size})
+
+        if file_name is not None:
+            with open(file_name, "wb") as f:
+                pickle.dump(snapshot, f, protocol=4)
+
+        return snapshot
+
+    @classmethod
+    def restore(cls, snapshot, callback=None, stream=None, modules=None):
+        """
+        Create a simulator that continues the run captured in a snapshot.
+
+        Args:
+            snapshot: Snapshot as returned by :py:meth:`snapshot` or the path
+                of a file it has been written to.
+            callback(callable): See :py:class:`Simulator` .
+            stream(:py:class:`ResultStream`): Sink for the results of the
+                continued run. To continue a streamed run, this has to append
+                to the file given in the `result file` entry of the snapshot.
+            modules(dict): Module instances to use instead of creating them
+                from the stored settings, e.g. to branch several what-if
+                continuations with modified settings. The stored states are
+                applied to them.
+
+        Returns:
+            :py:class:`Simulator`: The restored simulator, ready to
+            :py:meth:`run` .
+        """
+        if isinstance(snapshot, str):
+            with open(snapshot, "rb") as f:
+                snapshot = pickle.load(f)
+
+        if modules is None:
+            _, modules = setup_simulation_modules(OrderedDict(
+                (name, entry["settings"])
+                for name, entry in snapshot["modules"].items()))
+
+        settings = snapshot["simulation"]
+        sim_settings = SimulationSettings(settings["start time"],
+                                          settings["end time"],
+                                          settings["step size"],
+                                          settings["measure rate"])
+        sim = cls(sim_settings, modules, callback=callback, stream=stream)
+
+        for name, entry in snapshot["modules"].items():
+            if name in modules:
+                modules[name].set_state(entry["state"])
+
+        sim._counter = dict(snapshot["counter"])
+        sim._current_outputs = copy.deepcopy(snapshot["current_outputs"])
+        sim._input_vector = copy.deepcopy(snapshot["input_vector"])
+        sim.updated_time = snapshot["updated_time"]
+        sim._first_run = snapshot["first_run"]
+        sim._record_index = snapshot.get("record_index", 0)
+        for key, values in snapshot["storage"].items():
+            sim._storage[key] = SignalBuffer(sim._storage_capacity)
+            sim._storage[key].extend(values)
+
+        sim._resumed = True
+        return sim
+
     @property
     def output(self):
+        """
+        The simulation results.
+
+        If the results are streamed, the signals are only available in the
+        file given by `result file` . If profiling is enabled, the `profile`
+        entry holds the wall time statistics of all modules and the
+        statistics of the solver. Paced runs add the deadline statistics of
+        all modules as `realtime` entry.
+        """
         # convert storage entries
         out = dict(modules={}, simulation={}, results={})
+        if self._stream is not None:
+            out.update({"result file": self._stream.name})
 
         for mod, results in self._storage.items():
             # grab module settings
@@ -292,19 +1185,27 @@ class Simulator(QObject):
                     {mod: self._simulation_modules[mod].settings})
 
             # grab module data
-            if not isinstance(results, list):
+            if isinstance(results, SignalBuffer):
+                if self._stream is not None:
+                    continue
+                entry = results.data
+            else:
                 # flag or string -> nothing to convert
                 entry = results
-            elif isinstance(results[0], np.ndarray):
-                # convert list of 1d-arrays into 2d-array
-                entry = np.array(results)
-            else:
-                # convert list of scalars into 1d-array
-                entry = np.array(results)
             out["results"].update({mod: entry})
 
         # grab simulator settings
         out.update({"simulation": self._settings.to_dict()})
+
+        if self._pacer is not None:
+            out.update({"realtime": self._pacer.to_dict()})
+
+        if self._profile is not None:
+            out.update({"profile": {
+                "wall time": self._profile.wall_time,
+                "modules": self._profile.to_dict(),
+                "solver": self._simulation_modules["Solver"].get_statistics(),
+            }})
         return out
 
     @property
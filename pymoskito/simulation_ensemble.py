@@ -0,0 +1,453 @@
+# -*- coding: utf-8 -*-
+"""
+Ensemble simulation of parameter variants.
+
+In an ensemble run, `N` variants of a regime that only differ in some of
+their settings are advanced together in one pass through the simulation loop.
+All signals in the loop then carry the ensemble members along their first
+axis, e.g. the model state has the shape `(N, state_count)` .
+
+The variants are given in the `ensemble` entry of a regime, which lists the
+values of every varied setting per module::
+
+    - Name: mass_sweep
+      Model:
+        type: BallBeamModel
+      ...
+      ensemble:
+        Model:
+          M: [0.05, 0.1, 0.15]
+
+Modules whose class sets :py:attr:`.SimulationModule.supports_batch` are
+evaluated once for the whole ensemble, all other modules are evaluated
+member by member. The solver integrates the stacked states of all members
+at once.
+"""
+import copy
+from collections import OrderedDict
+
+import numpy as np
+from scipy import sparse
+from scipy.linalg import block_diag
+
+from .simulation_core import Simulator, setup_simulation_modules
+from .simulation_modules import (
+    SimulationModule, SimulationException, Model, ModelException, Solver
+)
+
+__all__ = ["EnsembleModule", "EnsembleModel", "EnsembleSolver",
+           "get_ensemble_settings", "setup_ensemble_modules",
+           "split_ensemble_output"]
+
+
+def _member_value(value, idx):
+    """ Select the value of a single ensemble member. """
+    if np.ndim(value) == 0:
+        return value
+    return value[idx]
+
+
+def _get_member_states(wrapper):
+    """ Capture the states of all instances of an ensemble wrapper. """
+    state = {"members": [mod.get_state() for mod in wrapper.members]}
+    if (wrapper.batch_module is not None
+            and wrapper.batch_module not in wrapper.members):
+        state["batch"] = wrapper.batch_module.get_state()
+    return state
+
+
+def _set_member_states(wrapper, state):
+    """ Restore the states of all instances of an ensemble wrapper. """
+    for mod, mod_state in zip(wrapper.members, state["members"]):
+        mod.set_state(mod_state)
+    if "batch" in state:
+        wrapper.batch_module.set_state(state["batch"])
+
+
+def get_ensemble_settings(module_settings, ensemble):
+    """
+    Create the module settings of every ensemble member.
+
+    Args:
+        module_settings(dict): Complete module settings of the regime, see
+            :py:func:`.get_module_settings` .
+        ensemble(dict): Values of the varied settings, indexed by module and
+            setting name.
+
+    Returns:
+        list: Module settings for every member.
+
+    Raises:
+        SimulationException: If the ensemble specification is invalid.
+    """
+    sizes = set()
+    for module_name, variants in ensemble.items():
+        if module_name == "Solver":
+            raise SimulationException("The Solver settings are shared by all "
+                                      "ensemble members and cannot be varied.")
+        if module_name not in module_settings:
+            raise SimulationException("Module '{}' of ensemble is not part "
+                                      "of the regime".format(module_name))
+        for key, values in variants.items():
+            if key not in module_settings[module_name]:
+                raise SimulationException(
+                    "No setting called '{}' available for ensemble of "
+                    "'{}'".format(key, module_name))
+            sizes.add(len(values))
+
+    if len(sizes) != 1:
+        raise SimulationException("All varied settings of an ensemble need "
+                                  "the same, nonzero number of values.")
+    size = sizes.pop()
+    if size == 0:
+        raise SimulationException("Ensemble without members given.")
+
+    members = []
+    for idx in range(size):
+        settings = copy.deepcopy(module_settings)
+        for module_name, variants in ensemble.items():
+            for key, values in variants.items():
+                settings[module_name][key] = copy.deepcopy(values[idx])
+        members.append(settings)
+
+    return members
+
+
+class EnsembleModule(SimulationModule):
+    """
+    Wrapper that evaluates a simulation module for all members of an ensemble.
+
+    Args:
+        members(list): Instances of the module, one per ensemble member.
+        batch_module: Instance that computes the outputs of all members at
+            once. If `None` , the members are evaluated one after another.
+    """
+    public_settings = OrderedDict()
+
+    def __init__(self, members, batch_module=None):
+        self.members = members
+        self.batch_module = batch_module
+        SimulationModule.__init__(self, OrderedDict(members[0].settings))
+
+    @property
+    def ensemble_size(self):
+        return len(self.members)
+
+    @SimulationModule.step_width.setter
+    def step_width(self, value):
+        self._settings["step width"] = value
+        for mod in self._instances():
+            mod.step_width = value
+
+    def _instances(self):
+        if self.batch_module is None or self.batch_module in self.members:
+            return self.members
+        return self.members + [self.batch_module]
+
+    def member_settings(self, idx):
+        """ Settings of the ensemble member `idx` . """
+        return self.members[idx].settings
+
+    def get_state(self):
+        return _get_member_states(self)
+
+    def set_state(self, state):
+        _set_member_states(self, state)
+
+    def calc_output(self, input_vector):
+        if self.batch_module is not None:
+            return self.batch_module.calc_output(input_vector)
+
+        outputs = []
+        for idx, mod in enumerate(self.members):
+            member_input = {key: val if key == "time"
+                            else _member_value(val, idx)
+                            for key, val in input_vector.items()}
+            outputs.append(mod.calc_output(member_input))
+
+        return np.array(outputs)
+
+
+class EnsembleModel(Model):
+    """
+    Wrapper that combines the models of all ensemble members.
+
+    Towards the solver, this model has the flattened states of all members as
+    state vector, while its output is computed from the stacked states of
+    shape `(N, state_count)` .
+
+    Args:
+        members(list): Instances of the model, one per ensemble member.
+        batch_module: Instance that computes the derivatives of all members
+            at once. If `None` , the members are evaluated one after another.
+    """
+    public_settings = OrderedDict()
+
+    def __init__(self, members, batch_module=None):
+        self.members = members
+        self.batch_module = batch_module
+        self.ensemble_shape = (len(members),
+                               members[0].settings["state_count"])
+
+        settings = OrderedDict(members[0].settings)
+        settings["initial state"] = np.concatenate(
+            [np.atleast_1d(mod.initial_state) for mod in members]
+        ).astype(float)
+        settings["state_count"] = len(settings["initial state"])
+        Model.__init__(self, settings)
+
+    @property
+    def ensemble_size(self):
+        return len(self.members)
+
+    def member_settings(self, idx):
+        """ Settings of the ensemble member `idx` . """
+        return self.members[idx].settings
+
+    def get_state(self):
+        return _get_member_states(self)
+
+    def set_state(self, state):
+        _set_member_states(self, state)
+
+    def state_function(self, t, x, args):
+        x = np.reshape(x, self.ensemble_shape)
+        if self.batch_module is not None:
+            dx = self.batch_module.state_function(t, x, args)
+        else:
+            dx = [mod.state_function(t, x[idx],
+                                     [_member_value(arg, idx) for arg in args])
+                  for idx, mod in enumerate(self.members)]
+
+        return np.ravel(dx)
+
+    def root_function(self, x):
+        x = np.array(x).reshape(self.ensemble_shape)
+        reset = False
+        for idx, mod in enumerate(self.members):
+            res = mod.root_function(x[idx])
+            if res[0]:
+                reset = True
+                x[idx] = res[1]
+
+        return reset, x.ravel()
+
+    def event_functions(self):
+        events = []
+        for idx, mod in enumerate(self.members):
+            for event in mod.event_functions():
+                events.append(self._member_event(event, idx))
+
+        return events
+
+    def _member_event(self, event, idx):
+        """ Evaluate the event of a member on the stacked states. """
+        def _event(t, x, args):
+            return event(t, np.reshape(x, self.ensemble_shape)[idx],
+                         [_member_value(arg, idx) for arg in args])
+
+        _event.direction = getattr(event, "direction", 0)
+        return _event
+
+    def jacobian_sparsity(self):
+        # the members are decoupled, hence their blocks are independent
+        blocks = []
+        for mod in self.members:
+            pattern = mod.jacobian_sparsity()
+            if pattern is None:
+                pattern = np.ones((self.ensemble_shape[1], ) * 2)
+            blocks.append(sparse.csr_matrix(pattern))
+        return sparse.block_diag(blocks, format="csr")
+
+    def discretize(self, step_size):
+        # the members are decoupled, hence the matrices are block diagonal
+        systems = [mod.discretize(step_size) for mod in self.members]
+        return (block_diag(*[phi for phi, _, _ in systems]),
+                block_diag(*[gamma for _, gamma, _ in systems]),
+                np.concatenate([offset for _, _, offset in systems]))
+
+    def check_consistency(self, x):
+        x = np.reshape(x, self.ensemble_shape)
+        for idx, mod in enumerate(self.members):
+            try:
+                mod.check_consistency(x[idx])
+            except ModelException as e:
+                raise ModelException("Ensemble member {}: {}".format(idx, e))
+
+    def calc_output(self, input_vector):
+        if self.batch_module is not None:
+            return self.batch_module.calc_output(input_vector)
+
+        return np.array([mod.calc_output(input_vector[idx])
+                         for idx, mod in enumerate(self.members)])
+
+
+class EnsembleSolver(Solver):
+    """
+    Wrapper that integrates the stacked states of all ensemble members.
+
+    A single instance of the selected solver integrates the flattened states
+    provided by the :py:class:`EnsembleModel` , while the states handed to the
+    simulation loop have the shape `(N, state_count)` .
+
+    Note:
+        Adaptive solvers control their step size over all members, hence the
+        results may slightly differ from separate simulations of every member.
+
+    Args:
+        solver_cls: Class of the solver to use.
+        settings(dict): Settings of the solver.
+        model(:py:class:`EnsembleModel`): The ensemble model to integrate.
+    """
+    public_settings = OrderedDict()
+
+    def __init__(self, solver_cls, settings, model):
+        settings = OrderedDict(settings)
+        settings["modules"] = {"Model": model}
+        self._solver = solver_cls(settings)
+
+        settings = OrderedDict(self._solver.settings)
+        settings["modules"] = {"Model": model}
+        Solver.__init__(self, settings)
+
+    @property
+    def next_output(self):
+        return self._next_output
+
+    @next_output.setter
+    def next_output(self, value):
+        if value is None:
+            self._next_output = None
+        else:
+            self._next_output = np.reshape(value, self._model.ensemble_shape)
+
+    @Solver.step_width.setter
+    def step_width(self, value):
+        self._settings["step width"] = value
+        self._solver.step_width = value
+
+    @property
+    def t(self):
+        return self._solver.t
+
+    @property
+    def successful(self):
+        return self._solver.successful
+
+    def get_state(self):
+        state = Solver.get_state(self)
+        state["solver"] = self._solver.get_state()
+        return state
+
+    def get_statistics(self):
+        return self._solver.get_statistics()
+
+    def set_state(self, state):
+        state = dict(state)
+        self._solver.set_state(state.pop("solver"))
+        Solver.set_state(self, state)
+
+    @property
+    def dense_output(self):
+        return self._solver.dense_output
+
+    def interpolate(self, t):
+        return np.reshape(self._solver.interpolate(t),
+                          self._model.ensemble_shape)
+
+    def set_input(self, *args):
+        self._solver.set_input(*args)
+
+    def integrate(self, t):
+        return np.reshape(self._solver.integrate(t),
+                          self._model.ensemble_shape)
+
+
+def setup_ensemble_modules(module_settings, ensemble):
+    """
+    Create the simulation modules for an ensemble run.
+
+    For every module, one instance per member is created. If the module class
+    supports batch evaluation, a single instance that receives the varied
+    settings as arrays of shape `(N,)` is created additionally.
+
+    Args:
+        module_settings(dict): Complete module settings of the regime.
+        ensemble(dict): Values of the varied settings, see
+            :py:func:`get_ensemble_settings` .
+
+    Returns:
+        tuple: :py:class:`.SimulationSettings` and dict of ensemble modules.
+    """
+    member_settings = get_ensemble_settings(module_settings, ensemble)
+    members = [setup_simulation_modules(settings)
+               for settings in member_settings]
+    sim_settings = members[0][0]
+
+    modules = {}
+    for module_name in Simulator.setup_order:
+        if module_name not in members[0][1] or module_name == "Solver":
+            continue
+
+        instances = [mods[module_name] for _, mods in members]
+        batch_module = None
+        if instances[0].supports_batch:
+            variants = {key: values for key, values
+                        in ensemble.get(module_name, {}).items()
+                        if key != "initial state"}
+            if variants:
+                settings = copy.deepcopy(member_settings[0][module_name])
+                for key, values in variants.items():
+                    settings[key] = np.array(values)
+                settings["modules"] = members[0][1]
+                batch_module = type(instances[0])(settings)
+            else:
+                batch_module = instances[0]
+
+        if module_name == "Model":
+            modules[module_name] = EnsembleModel(instances, batch_module)
+        else:
+            modules[module_name] = EnsembleModule(instances, batch_module)
+
+    modules["Solver"] = EnsembleSolver(type(members[0][1]["Solver"]),
+                                       member_settings[0]["Solver"],
+                                       modules["Model"])
+
+    return sim_settings, modules
+
+
+def split_ensemble_output(data, modules):
+    """
+    Split the results of an ensemble run into the results of every member.
+
+    Args:
+        data(dict): Results of the ensemble run.
+        modules(dict): The ensemble modules used in the run.
+
+    Returns:
+        list: Results of every member, in the same format as the results of
+        a regular simulation.
+    """
+    outputs = []
+    for idx in range(modules["Model"].ensemble_size):
+        out = dict(modules={},
+                   simulation=copy.copy(data["simulation"]),
+                   results={})
+        for key in ("profile", "realtime"):
+            if key in data:
+                out[key] = data[key]
+        for mod in data["modules"]:
+            if isinstance(modules[mod], (EnsembleModule, EnsembleModel)):
+                out["modules"][mod] = modules[mod].member_settings(idx)
+            else:
+                out["modules"][mod] = data["modules"][mod]
+
+        for key, val in data["results"].items():
+            if key in modules:
+                out["results"][key] = val[:, idx]
+            else:
+                out["results"][key] = val
+
+        outputs.append(out)
+
+    return outputs
@@ -5,7 +5,6 @@ import logging
 import numpy as np
 import os
 import pickle
-import time
 from importlib import metadata
 import webbrowser
 import yaml
@@ -51,9 +50,11 @@ except ImportError as e:
 
 # pymoskito
 from .registry import get_registered_visualizers
+from .simulation_core import format_profile
 from .simulation_interface import SimulatorInteractor, SimulatorView
 from .visualization import MplVisualizer, VtkVisualizer, DummyVisualizer
 from .processing_gui import PostProcessor
+from .simulation_runner import load_result, result_file_name
 from .tools import (
     get_resource, PlainTextLogger, Exporter, create_button_from_action
 )
@@ -208,6 +209,26 @@ class SimulationGui(QMainWindow):
         self.actExitOnBatchCompletion.changed.connect(
             self.update_exit_on_batch_completion_setting)
 
+        self.actSetBatchWorkers = QAction(self)
+        self.actSetBatchWorkers.setText("Set &Parallel Batch Workers")
+        self.actSetBatchWorkers.setToolTip(
+            "Number of processes that simulate the regimes of a batch in "
+            "parallel.")
+        self.actSetBatchWorkers.triggered.connect(self.set_batch_workers)
+
+        self.actProfileSimulation = QAction(self)
+        self.actProfileSimulation.setText("&Profile Simulation")
+        self.actProfileSimulation.setToolTip(
+            "Measure the computation time of all modules and log it after "
+            "every simulation.")
+        self.actProfileSimulation.setCheckable(True)
+        self.actProfileSimulation.setChecked(
+            self._settings.value("control/profile_simulation") == "True"
+        )
+        self.sim.profile = self.actProfileSimulation.isChecked()
+        self.actProfileSimulation.changed.connect(
+            self.update_profile_simulation_setting)
+
         # regime management
         self.runningBatch = False
         self._current_regime_index = None
@@ -215,6 +236,8 @@ class SimulationGui(QMainWindow):
 
         self.regimeFinished.connect(self.run_next_regime)
         self.finishedRegimeBatch.connect(self.regime_batch_finished)
+        self.sim.batch_regime_finalized.connect(self.new_batch_result)
+        self.sim.batch_finalized.connect(self.parallel_batch_finished)
 
         # last sim window
         self.lastSimList = QListWidget(self)
@@ -481,6 +504,8 @@ class SimulationGui(QMainWindow):
         simMenu.addAction(self.actSimulateCurrent)
         simMenu.addAction(self.actSimulateAll)
         simMenu.addAction(self.actExitOnBatchCompletion)
+        simMenu.addAction(self.actSetBatchWorkers)
+        simMenu.addAction(self.actProfileSimulation)
         simMenu.addAction(self.actPostprocessing)
 
         animMenu = self.menuBar().addMenu("&Animation")
@@ -834,6 +859,8 @@ class SimulationGui(QMainWindow):
         # control flow management
         self._add_setting("control/autoplay_animation", "False")
         self._add_setting("control/exit_on_batch_completion", "False")
+        self._add_setting("control/batch_workers", "1")
+        self._add_setting("control/profile_simulation", "False")
 
         # view management
         self._add_setting("view/show_coordinates", "True")
@@ -870,6 +897,23 @@ class SimulationGui(QMainWindow):
             state = self.actExitOnBatchCompletion.isChecked()
         self._settings.setValue("control/exit_on_batch_completion", str(state))
 
+    def update_profile_simulation_setting(self):
+        state = self.actProfileSimulation.isChecked()
+        self._settings.setValue("control/profile_simulation", str(state))
+        self.sim.profile = state
+
+    @pyqtSlot()
+    def set_batch_workers(self):
+        workers, ok = QInputDialog.getInt(
+            self,
+            "Parallel Batch Workers",
+            "Number of regimes to simulate in parallel:",
+            int(self._settings.value("control/batch_workers")),
+            1,
+            os.cpu_count() or 1)
+        if ok:
+            self._settings.setValue("control/batch_workers", str(workers))
+
     def set_visualizer(self, vis):
         self.visualizer = vis
         self.vtkWidget.Initialize()
@@ -1036,9 +1080,7 @@ class SimulationGui(QMainWindow):
     def _simfile_name(self, regime_name):
         """ Create a canonical name for a simulation result file
         """
-        suggestion = (time.strftime("%Y%m%d-%H%M%S")
-                      + "_" + regime_name + ".pmr")
-        return suggestion
+        return result_file_name(regime_name)
 
     def load_regime_dialog(self):
         regime_path = os.path.join(os.curdir)
@@ -1152,7 +1194,54 @@ class SimulationGui(QMainWindow):
 
         self.runningBatch = True
         self._current_regime_index = -1
-        self.regimeFinished.emit()
+
+        workers = int(self._settings.value("control/batch_workers"))
+        if workers > 1:
+            self._start_parallel_batch(workers)
+        else:
+            self.regimeFinished.emit()
+
+    def _start_parallel_batch(self, workers):
+        """
+        Simulate all regimes in parallel worker processes.
+        """
+        self.actSimulateCurrent.setDisabled(True)
+        self.statusLabel.setText("simulating {} regimes".format(
+            len(self._regimes)))
+        self._logger.info("Simulating {} regimes using {} workers".format(
+            len(self._regimes), workers))
+
+        self.guiProgress = QProgressBar(self)
+        self.sim.simulationProgressChanged.connect(self.guiProgress.setValue)
+        self.statusBar().addWidget(self.guiProgress)
+
+        self.sim.run_regime_batch(
+            self._regimes,
+            self._settings.value("path/simulation_results"),
+            workers)
+
+    @pyqtSlot(str, str)
+    def new_batch_result(self, regime_name, file_path):
+        """
+        Slot to be called when a regime of a parallel batch is finished.
+
+        Args:
+            regime_name (str): Name of the simulated regime.
+            file_path (str): Path of the stored results.
+        """
+        self._logger.info("results of '{}' saved to {}".format(regime_name,
+                                                                file_path))
+        data = load_result(file_path)
+        self._add_to_history(data, regime_name)
+
+    @pyqtSlot(bool)
+    def parallel_batch_finished(self, status):
+        self.actSimulateCurrent.setDisabled(False)
+        self.sim.simulationProgressChanged.disconnect(self.guiProgress.setValue)
+        self.statusBar().removeWidget(self.guiProgress)
+
+        if self.runningBatch:
+            self.finishedRegimeBatch.emit(status)
 
     def run_next_regime(self):
         """
@@ -1174,7 +1263,10 @@ class SimulationGui(QMainWindow):
     def stop_regime_execution(self):
         """ Stop the batch process.
         """
-        self.stopSimulation.emit()
+        if int(self._settings.value("control/batch_workers")) > 1:
+            self.sim.stop_regime_batch()
+        else:
+            self.stopSimulation.emit()
         self.finishedRegimeBatch.emit(False)
 
     def regime_batch_finished(self, status):
@@ -1228,6 +1320,9 @@ class SimulationGui(QMainWindow):
 
         self.stop_animation()
 
+        if "profile" in data:
+            self._logger.info(format_profile(data["profile"]))
+
         if data:
             # import new data
             self.currentDataset = data
@@ -1237,19 +1332,7 @@ class SimulationGui(QMainWindow):
             self.visualizer.update_config(data["modules"])
 
             # add results to history
-            lastSimCount = self.lastSimList.count()
-            lastSimData = {'modules': data['modules'],
-                           'results': data['results'],
-                           'simulation': data['simulation'],
-                           'name': self._current_regime_name,
-                           }
-            display_name = "{}:{}".format(lastSimCount,
-                                          self._current_regime_name)
-            self._lastSimulations.append(lastSimData)
-            new_item = QListWidgetItem(display_name)
-            self.lastSimList.addItem(new_item)
-            self.lastSimList.scrollToItem(new_item)
-            self.setQListItemBold(self.lastSimList, new_item)
+            self._add_to_history(data, self._current_regime_name)
 
         if self._settings.value("control/autoplay_animation") == "True":
             self.actPlayPause.trigger()
@@ -1264,6 +1347,23 @@ class SimulationGui(QMainWindow):
         else:
             self.actSimulateAll.setDisabled(False)
 
+    def _add_to_history(self, data, regime_name):
+        """
+        Add simulation results to the list of previous simulations.
+        """
+        lastSimCount = self.lastSimList.count()
+        lastSimData = {'modules': data['modules'],
+                       'results': data['results'],
+                       'simulation': data['simulation'],
+                       'name': regime_name,
+                       }
+        display_name = "{}:{}".format(lastSimCount, regime_name)
+        self._lastSimulations.append(lastSimData)
+        new_item = QListWidgetItem(display_name)
+        self.lastSimList.addItem(new_item)
+        self.lastSimList.scrollToItem(new_item)
+        self.setQListItemBold(self.lastSimList, new_item)
+
     def _read_results(self):
         state = self.currentDataset["results"]["Solver"]
         self.interpolator = interp1d(self.currentDataset["results"]["time"],
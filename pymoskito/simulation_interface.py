@@ -6,6 +6,7 @@
 import ast
 import copy
 import logging
+import multiprocessing
 import sys
 from collections import OrderedDict
 
@@ -20,8 +21,10 @@ from .registry import (
     get_registered_simulation_modules, get_simulation_module_class_by_name
 )
 from .simulation_core import (
-    Simulator, SimulationSettings, SimulationStateChange
+    Simulator, SimulationStateChange, setup_simulation_modules
 )
+from .simulation_modules import SimulationException
+from .simulation_runner import execute_regimes
 
 
 class SimulatorModel(QStandardItemModel):
@@ -176,6 +179,78 @@ class SimulatorView(QTreeView):
         return self.sizeHint()
 
 
+class SimulatorWorker(QObject):
+    """
+    Thin Qt adapter that runs a :py:class:`.Simulator` in a worker thread.
+
+    All state changes of the simulator are forwarded via the `state_changed`
+    signal.
+    """
+
+    work_done = pyqtSignal()
+    state_changed = pyqtSignal(SimulationStateChange)
+
+    def __init__(self, settings, modules, profile=False):
+        QObject.__init__(self, None)
+        self._simulator = Simulator(settings, modules,
+                                    callback=self.state_changed.emit,
+                                    profile=profile)
+
+    @pyqtSlot()
+    def run(self):
+        self._simulator.run()
+        self.work_done.emit()
+
+    @pyqtSlot(name="stop")
+    def stop(self):
+        self._simulator.stop()
+
+
+class BatchWorker(QObject):
+    """
+    Thin Qt adapter that simulates a batch of regimes in a process pool.
+
+    See :py:func:`.execute_regimes` for details.
+    """
+
+    regime_finished = pyqtSignal(str, str)
+    progress_changed = pyqtSignal(int)
+    work_done = pyqtSignal(bool)
+
+    def __init__(self, regimes, out_dir, workers):
+        QObject.__init__(self, None)
+        self._regimes = regimes
+        self._out_dir = out_dir
+        self._workers = workers
+        self._run = False
+
+    def _progress(self, done, total):
+        self.progress_changed.emit(int(done / total * 100))
+
+    @pyqtSlot()
+    def run(self):
+        self._run = True
+        success = True
+        # forking a process with a running Qt application is not safe
+        batch = execute_regimes(self._regimes, self._out_dir, self._workers,
+                                self._progress,
+                                multiprocessing.get_context("spawn"))
+        for res in batch:
+            success &= res.finished
+            if res.result is not None:
+                self.regime_finished.emit(res.name, res.result)
+            if not self._run:
+                batch.close()
+                success = False
+                break
+
+        self.work_done.emit(success)
+
+    @pyqtSlot(name="stop")
+    def stop(self):
+        self._run = False
+
+
 class SimulatorInteractor(QObject):
     """
     Class that interacts between the gui which controls the programs execution
@@ -185,6 +260,8 @@ class SimulatorInteractor(QObject):
     # signals
     simulation_finalized = pyqtSignal(str, dict)
     simulationProgressChanged = pyqtSignal(int)
+    batch_regime_finalized = pyqtSignal(str, str)
+    batch_finalized = pyqtSignal(bool)
 
     def __init__(self, parent=None):
         QObject.__init__(self, parent)
@@ -197,9 +274,12 @@ class SimulatorInteractor(QObject):
         self._worker = None
         self._sim_settings = None
         self.simThread = QThread()
+        self._batch_worker = None
+        self.batchThread = QThread()
         self._sim_modules = {}
         self._sim_data = None
         self._sim_state = None
+        self.profile = False
 
     def _setup_model(self):
         # create model
@@ -217,16 +297,8 @@ class SimulatorInteractor(QObject):
         fill model with items corresponding to all predefined SimulationModules
         """
 
-        # build initialisation list
-        setup_list = Simulator.module_list
-
-        # push init of Trajectory module to the end because it needs the
-        # derivative orders of controller and feedforward
-        setup_list.append("Trajectory")
-        setup_list.remove("Trajectory")
-
         # insert main items
-        for sim_module in setup_list:
+        for sim_module in Simulator.setup_order:
             name = PropertyItem(sim_module)
             value = PropertyItem(None)
             new_items = [name, value]
@@ -298,8 +370,8 @@ class SimulatorInteractor(QObject):
         Returns:
             bool: If setup was successful.
         """
+        module_settings = OrderedDict()
         for row in range(model.rowCount()):
-            # build correct object and add it to the simulator
             module_item = model.item(row, 0)
             module_name = str(module_item.text())
             sub_module_item = model.item(row, 1)
@@ -308,48 +380,21 @@ class SimulatorInteractor(QObject):
             if sub_module_name == 'None':
                 continue
 
-            # get class
-            module_cls = getattr(simulation_modules, module_name)
-            sub_module_cls = get_simulation_module_class_by_name(
-                module_cls,
-                sub_module_name)
-
             # get public settings for module
             settings = self._get_settings(self.target_model, module_item.text())
             if settings is None:
                 return False
             settings.update({"type": sub_module_name})
-            settings.update({"modules": self._sim_modules})
-
-            # append special settings
-            if module_name == "Solver":
-                if "Model" not in settings["modules"]:
-                    return False
-                self._sim_settings = SimulationSettings(
-                    settings["start time"],
-                    settings["end time"],
-                    settings["step size"],
-                    settings["measure rate"])
-
-            # build object
-            try:
-                slot = sub_module_cls(settings)
-            except Exception as e:
-                self._logger.error("Init of module '{}' failed.".format(module_name))
-                self._logger.exception(e)
-                return False
-
-            # add to simulation modules
-            self._sim_modules.update({module_name: slot})
-
-            # store settings
-            # self._sim_data['modules'].update({module_name: settings})
+            module_settings[module_name] = settings
 
-        if all([mod in self._sim_modules
-                for mod in Simulator.static_module_list]):
-            return True
+        try:
+            self._sim_settings, self._sim_modules = setup_simulation_modules(
+                module_settings)
+        except SimulationException as e:
+            self._logger.exception(e)
+            return False
 
-        return False
+        return True
 
     def set_regime(self, reg):
         """
@@ -400,6 +445,12 @@ class SimulatorInteractor(QObject):
             if module_name == "Name" or module_name == "clear previous":
                 continue
 
+            if module_name == "ensemble":
+                self._logger.warning("_apply_regime(): Ensembles are only "
+                                     "simulated in parallel or headless "
+                                     "batches, using nominal settings.")
+                continue
+
             # sanity check
             module_cls = getattr(simulation_modules, module_name, None)
             if module_cls is None:
@@ -475,13 +526,10 @@ class SimulatorInteractor(QObject):
             return
 
         # setup simulator
-        self._worker = Simulator(self._sim_settings, self._sim_modules)
+        self._worker = SimulatorWorker(self._sim_settings, self._sim_modules,
+                                       self.profile)
         self._worker.moveToThread(self.simThread)
 
-        # setup simulation modules
-        for _module in self._sim_modules.values():
-            _module.moveToThread(self.simThread)
-
         # setup signal connections
         self.simThread.started.connect(self._worker.run)
         self._worker.state_changed.connect(self.simulation_state_changed)
@@ -492,6 +540,44 @@ class SimulatorInteractor(QObject):
         # run
         self.simThread.start()
 
+    def run_regime_batch(self, regimes, out_dir, workers):
+        """
+        Simulate the given regimes in parallel worker processes.
+
+        The results are written to `out_dir` and the path of every finished
+        result file is announced via `batch_regime_finalized` .
+
+        Args:
+            regimes(list): Regimes to simulate.
+            out_dir(str): Directory to store the results in.
+            workers(int): Number of worker processes.
+        """
+        # wait for the previous batch thread to shut down
+        self.batchThread.wait()
+
+        self._batch_worker = BatchWorker(regimes, out_dir, workers)
+        self._batch_worker.moveToThread(self.batchThread)
+
+        self.batchThread.started.connect(self._batch_worker.run)
+        self._batch_worker.regime_finished.connect(self.batch_regime_finalized)
+        self._batch_worker.progress_changed.connect(
+            self.simulationProgressChanged)
+        self._batch_worker.work_done.connect(self._batch_done)
+        self._batch_worker.work_done.connect(self.batchThread.quit)
+
+        self.batchThread.start()
+
+    @pyqtSlot()
+    def stop_regime_batch(self):
+        if self._batch_worker is not None:
+            self._batch_worker.stop()
+
+    @pyqtSlot(bool)
+    def _batch_done(self, success):
+        self.batchThread.started.disconnect(self._batch_worker.run)
+        self._batch_worker = None
+        self.batch_finalized.emit(success)
+
     @pyqtSlot(SimulationStateChange)
     def simulation_state_changed(self, state_change):
         """
@@ -7,11 +7,9 @@ by subclassing `SimulationModule`.
 import logging
 from abc import ABCMeta, abstractmethod
 from collections import OrderedDict
-from copy import copy
+from copy import copy, deepcopy
 
-from PyQt5.QtCore import QObject
-
-pyqtWrapperType = type(QObject)
+import numpy as np
 
 __all__ = ["SimulationModule", "SimulationException",
            "Trajectory", "Feedforward", "Controller", "Limiter",
@@ -19,7 +17,7 @@ __all__ = ["SimulationModule", "SimulationException",
            "Solver", "Disturbance", "Sensor", "ObserverMixer", "Observer"]
 
 
-class SimulationModuleMeta(ABCMeta, pyqtWrapperType):
+class SimulationModuleMeta(ABCMeta):
     pass
 
 
@@ -27,7 +25,7 @@ class SimulationException(Exception):
     pass
 
 
-class SimulationModule(QObject, metaclass=SimulationModuleMeta):
+class SimulationModule(metaclass=SimulationModuleMeta):
     """
     Base unit of the simulation framework.
 
@@ -67,8 +65,29 @@ class SimulationModule(QObject, metaclass=SimulationModuleMeta):
         Get rid of the point restriction
     """
 
+    supports_batch = False
+    """
+    Flag that tells whether this module can evaluate all members of an
+    ensemble at once.
+
+    In an ensemble simulation, all signals carry the ensemble members along
+    their first axis. Modules that set this flag have to accept such inputs
+    (e.g. a model state of shape `(N, state_count)` ) as well as numpy arrays
+    of shape `(N,)` for all settings that are varied in the ensemble.
+    All other modules are evaluated once per member.
+    """
+
+    state_attributes = ()
+    """
+    Names of the attributes that hold the internal state of the module.
+
+    These attributes are captured by :py:meth:`get_state` and restored by
+    :py:meth:`set_state` , which allows to checkpoint and resume simulations
+    (see :py:meth:`.Simulator.snapshot` ). Modules whose state cannot be
+    expressed this way have to override both methods.
+    """
+
     def __init__(self, settings):
-        QObject.__init__(self, None)
         self._logger = logging.getLogger(self.__class__.__name__)
 
         assert isinstance(settings, dict)
@@ -126,6 +145,26 @@ class SimulationModule(QObject, metaclass=SimulationModuleMeta):
     def step_width(self, value):
         self._settings["step width"] = value
 
+    def get_state(self):
+        """
+        Capture the internal state of the module.
+
+        Returns:
+            dict: Picklable copy of all :py:attr:`state_attributes` .
+        """
+        return deepcopy({name: getattr(self, name)
+                         for name in self.state_attributes})
+
+    def set_state(self, state):
+        """
+        Restore the internal state of the module.
+
+        Args:
+            state(dict): State as returned by :py:meth:`get_state` .
+        """
+        for name, value in deepcopy(state).items():
+            setattr(self, name, value)
+
     @abstractmethod
     def calc_output(self, input_vector):
         """
@@ -210,6 +249,58 @@ class Model(SimulationModule):
         """
         return False, x
 
+    def event_functions(self):
+        """
+        Zero crossing functions that locate the discontinuities handled by
+        :py:meth:`root_function` .
+
+        Solvers with event detection (see :py:class:`.SolveIVP` ) determine
+        the time at which one of these functions changes its sign and apply
+        :py:meth:`root_function` to the state at exactly this time, instead
+        of checking it after every step only.
+
+        Returns:
+            list: Callables `g(t, x, args)` with the same arguments as
+            :py:meth:`state_function` . An optional attribute `direction`
+            restricts the detection to falling (`-1`) or rising (`1`)
+            crossings, like the events of :py:func:`scipy.integrate.solve_ivp` .
+        """
+        return []
+
+    def jacobian_sparsity(self):
+        """
+        Structure of the jacobian of :py:meth:`state_function` .
+
+        Large models with only locally coupled states, like spatially
+        discretized ones, should declare which derivatives may be nonzero.
+        Solvers then use banded or sparse linear algebra in their implicit
+        methods, see :py:class:`.ODEInt` and :py:class:`.SolveIVP` .
+
+        Returns:
+            Array-like or sparse matrix of shape `(state_count,
+            state_count)` whose nonzero entries mark the derivatives that
+            may be nonzero, or `None` if the structure is unknown.
+        """
+        return None
+
+    def discretize(self, step_size):
+        """
+        Exact discretization of linear dynamics with zero-order hold input.
+
+        Models whose dynamics are linear may implement this method, so that
+        they can be simulated by :py:class:`.ExactDiscretization` without
+        numerical integration.
+
+        Args:
+            step_size(float): Time between two steps.
+
+        Returns:
+            tuple: Matrices `Phi` , `Gamma` and vector `c` , such that the
+            state after one step is given by `Phi @ x + Gamma @ u + c` for
+            an input `u` that is held constant during the step.
+        """
+        raise NotImplementedError
+
     def check_consistency(self, x):
         """
         Check whether the assumptions, made in the modelling process are 
@@ -239,7 +330,17 @@ class Solver(SimulationModule):
 
     After initialization, for every step in the simulation
     `set_input` will be called, followed by `integrate`.
+
+    Solvers have to extend :py:meth:`get_state` and :py:meth:`set_state` by
+    the state of their integrator.
+
+    Solvers that compute the new state in place may write it into the state
+    buffers of :py:meth:`_init_state_buffers` and hand out read-only views of
+    them. Therefore, the `Model_State` and the output of the solver are only
+    valid during the current step, modules that keep them have to store a
+    copy.
     """
+    state_attributes = ("next_output",)
 
     def __init__(self, settings):
         assert isinstance(settings["modules"]["Model"], Model)
@@ -260,6 +361,42 @@ class Solver(SimulationModule):
                                   "Model raised: {0}".format(e))
         return output
 
+    def _init_state_buffers(self, state):
+        """
+        Allocate two buffers for the states that are used in turns.
+
+        While the integrator reads the current state from one buffer, the new
+        state is written to the other one, so that no arrays have to be
+        allocated during the steps. See :py:meth:`_swap_state_buffers` .
+
+        Args:
+            state(array-like): Initial state, copied into the current buffer.
+
+        Returns:
+            numpy.ndarray: The current buffer.
+        """
+        state = np.array(state, dtype=float)
+        self._state_buffers = [state, np.empty_like(state)]
+        self._state_views = []
+        for buffer in self._state_buffers:
+            view = buffer.view()
+            view.flags.writeable = False
+            self._state_views.append(view)
+        self._buffer_index = 0
+        return state
+
+    def _swap_state_buffers(self):
+        """
+        Make the buffer that received the new state the current one.
+
+        Returns:
+            tuple: The current buffer and a read-only view of it, which is
+            handed to the simulation loop.
+        """
+        self._buffer_index ^= 1
+        return (self._state_buffers[self._buffer_index],
+                self._state_views[self._buffer_index])
+
     @abstractmethod
     def set_input(self, *args):
         """
@@ -285,6 +422,41 @@ class Solver(SimulationModule):
         """
         pass
 
+    @property
+    def dense_output(self):
+        """
+        Whether the solver can interpolate the state within the last step,
+        see :py:meth:`interpolate` .
+
+        If so, the simulator records the values at the exact instants given
+        by the measure rate instead of at the integration steps, which allows
+        to choose a step size that is larger than the measurement interval.
+        """
+        return False
+
+    def interpolate(self, t):
+        """
+        Interpolate the state within the last integration step.
+
+        Args:
+            t(float): Time between the start and the end of the last call of
+                :py:meth:`integrate` .
+
+        Returns:
+            System state at time `t` .
+        """
+        raise NotImplementedError
+
+    def get_statistics(self):
+        """
+        Statistics of the integration so far.
+
+        Returns:
+            dict: Counters like the number of `steps` , `rhs evaluations` or
+            `rejected steps` , empty if the solver does not provide any.
+        """
+        return {}
+
     @property
     @abstractmethod
     def successful(self):
@@ -501,6 +673,23 @@ class Trajectory(SimulationModule):
         """
         pass
 
+    def desired_values_batch(self, t):
+        """
+        Calculate the desired values for many times at once.
+
+        Trajectories that only depend on the time may implement this method,
+        so that the simulator can compute the values for all steps of a run
+        in advance, see :py:meth:`.Simulator.run` .
+
+        Args:
+            t (array): Times in ascending order.
+
+        Returns:
+            Array: The outputs of :py:meth:`_desired_values` for all times,
+            stacked along a new 0th axis.
+        """
+        raise NotImplementedError
+
 
 class MixerException(Exception):
     pass
@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""
+Parallel-in-time simulation of long open-loop runs.
+
+A single simulation is strictly sequential, hence it cannot make use of
+several cores. The Parareal algorithm splits the simulated time span into
+slices instead: a cheap coarse propagation, i.e. the same regime with a
+larger step size, predicts the state at the boundaries of the slices, the
+regular (fine) simulation of all slices runs in parallel in a process pool
+and the boundary states are corrected by
+
+.. math::
+
+    x_{n+1}^{k+1} = G(x_n^{k+1}) + F(x_n^k) - G(x_n^k)
+
+until they do not change anymore. Every iteration makes at least one more
+slice exact, so the wall time drops as long as a few iterations suffice,
+which is the case for smooth open-loop dynamics.
+
+Only the model state is corrected, therefore the regime must not contain a
+controller or an observer, whose internal states would have to be corrected
+as well. All other modules have to depend on the time only, e.g. trajectories
+and feedforwards. Furthermore, the model has to use the setting
+`initial state` as it is, since the boundary states are passed this way.
+
+The result equals the sequential simulation only up to the accuracy of the
+solver: :py:class:`.ODEInt` interpolates its output from integrator steps that
+may reach beyond a change of the model input, hence restarting it at the slice
+boundaries alters the result within its tolerances. The same holds for
+:py:class:`.SolveIVP` if the model input stays constant across a boundary,
+otherwise it is restarted there anyway and reproduces the sequential run.
+"""
+import copy
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .simulation_core import (
+    SimulationSettings, Simulator, setup_simulation_modules
+)
+from .simulation_modules import SimulationException
+from .simulation_runner import _get_registrations, _init_worker
+
+__all__ = ["simulate_parareal"]
+
+CLOSED_LOOP_MODULES = ["Controller", "Observer"]
+""" Modules whose internal states prevent the parallelization in time. """
+
+
+def _run_slice(module_settings, start, end, state, step_size):
+    """
+    Simulate the regime from `start` to `end` , starting at `state` .
+
+    The step size is adapted to fit the slice and every step is recorded.
+
+    Returns:
+        tuple: The recorded results and the state at `end` .
+    """
+    steps = max(1, int(round((end - start) / step_size)))
+    step_size = (end - start) / steps
+
+    settings = copy.deepcopy(module_settings)
+    settings["Model"]["initial state"] = np.array(state, dtype=float)
+    settings["Solver"].update({"start time": start,
+                               "end time": end,
+                               "step size": step_size,
+                               "measure rate": 1 / step_size})
+    sim_settings, sim_modules = setup_simulation_modules(settings)
+    if not sim_modules["Solver"].dense_output:
+        # the time is accumulated step by step, a slightly shorter
+        # measurement interval makes sure that no step is skipped
+        sim_settings.measure_rate *= 1 + 1e-6
+
+    results = Simulator(sim_settings, sim_modules).run()["results"]
+    if not results["finished"]:
+        raise SimulationException("Simulation of the slice from {} to {} "
+                                  "failed.".format(start, end))
+
+    idx = np.argmin(np.abs(results["time"] - end))
+    if abs(results["time"][idx] - end) > step_size / 2:
+        raise SimulationException("The end of the slice from {} to {} has "
+                                  "not been recorded.".format(start, end))
+
+    return results, np.array(results["Solver"][idx], dtype=float)
+
+
+def _merge_slices(slices, bounds, measure_rate):
+    """
+    Assemble the results of all slices on the measurement grid.
+    """
+    start = bounds[0]
+    count = int(np.floor((bounds[-1] - start) * measure_rate + 1e-9)) + 1
+    grid = start + np.arange(count) / measure_rate
+
+    merged = {}
+    for n, results in enumerate(slices):
+        last = n == len(slices) - 1
+        mask = grid >= bounds[n] - 1e-9 / measure_rate
+        if last:
+            mask &= grid <= bounds[n + 1] + 1e-9 / measure_rate
+        else:
+            mask &= grid < bounds[n + 1] - 1e-9 / measure_rate
+
+        times = results["time"]
+        idx = np.clip(np.searchsorted(times, grid[mask]), 1, len(times) - 1)
+        idx -= grid[mask] - times[idx - 1] < times[idx] - grid[mask]
+        for key, values in results.items():
+            if isinstance(values, np.ndarray) and len(values) == len(times):
+                merged.setdefault(key, []).append(values[idx])
+
+    merged = {key: np.concatenate(values) for key, values in merged.items()}
+    merged["time"] = grid[:len(merged["time"])]
+    merged["finished"] = True
+    return merged
+
+
+def simulate_parareal(module_settings, slices=None, coarse_step=None,
+                      tolerance=1e-6, max_iterations=None, workers=None,
+                      mp_context=None):
+    """
+    Simulate an open-loop regime with the Parareal algorithm.
+
+    Args:
+        module_settings(dict): Complete settings of all modules, see
+            :py:func:`.get_module_settings` .
+        slices(int): Number of time slices, defaults to the number of
+            workers.
+        coarse_step(float): Step size of the coarse propagation, defaults to
+            twenty times the step size of the regime, but at most one slice.
+        tolerance(float): The iteration stops as soon as the boundary states
+            change less than `tolerance * (1 + max|x|)` .
+        max_iterations(int): Upper limit of the iterations, defaults to the
+            number of slices, after which the result is exact anyway.
+        workers(int): Number of worker processes, defaults to the number of
+            cores.
+        mp_context: Multiprocessing context of the process pool.
+
+    Returns:
+        dict: Simulation results like those of :py:func:`.simulate` , with
+        the values recorded at `start time + k / measure rate` . The entry
+        `parareal` holds the number of `slices` and `iterations` , whether
+        the run `converged` and the `changes` of the boundary states per
+        iteration.
+    """
+    logger = logging.getLogger(__name__)
+    for name in CLOSED_LOOP_MODULES:
+        if name in module_settings:
+            raise SimulationException("A parallel-in-time simulation needs an "
+                                      "open loop, but the regime contains a "
+                                      "{}.".format(name))
+
+    solver = module_settings["Solver"]
+    start = solver["start time"]
+    end = solver["end time"]
+    step_size = solver["step size"]
+    measure_rate = solver["measure rate"]
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if slices is None:
+        slices = workers
+
+    # put the boundaries onto the measurement grid
+    samples = int(round((end - start) * measure_rate))
+    bounds = sorted(set(start + int(round(n * samples / slices)) / measure_rate
+                        for n in range(slices)))
+    bounds.append(end)
+    slices = len(bounds) - 1
+    if max_iterations is None:
+        max_iterations = slices
+    if coarse_step is None:
+        coarse_step = 20 * step_size
+    coarse_step = min(coarse_step, min(np.diff(bounds)))
+
+    def _coarse(n, state):
+        return _run_slice(module_settings, bounds[n], bounds[n + 1], state,
+                          coarse_step)[1]
+
+    # initial prediction
+    states = [np.array(module_settings["Model"]["initial state"],
+                       dtype=float)]
+    coarse = []
+    for n in range(slices):
+        coarse.append(_coarse(n, states[n]))
+        states.append(coarse[n])
+
+    fine_results = [None] * slices
+    fine = [None] * slices
+    changed = [True] * slices
+    changes = []
+    converged = False
+    with ProcessPoolExecutor(max_workers=min(workers, slices),
+                             mp_context=mp_context,
+                             initializer=_init_worker,
+                             initargs=(_get_registrations(module_settings),)
+                             ) as pool:
+        for iteration in range(max_iterations):
+            futures = {n: pool.submit(_run_slice, module_settings, bounds[n],
+                                      bounds[n + 1], states[n], step_size)
+                       for n in range(slices) if changed[n]}
+            for n, future in futures.items():
+                fine_results[n], fine[n] = future.result()
+
+            # sequential correction, the first slice is always exact
+            new_states = [states[0], fine[0]]
+            for n in range(1, slices):
+                prediction = _coarse(n, new_states[n])
+                new_states.append(prediction + fine[n] - coarse[n])
+                coarse[n] = prediction
+
+            change = max(np.max(np.abs(new - old))
+                         for new, old in zip(new_states, states))
+            scale = 1 + max(np.max(np.abs(x)) for x in new_states)
+            changes.append(float(change))
+            changed = [not np.array_equal(new, old)
+                       for new, old in zip(new_states[:-1], states[:-1])]
+            states = new_states
+            logger.debug("Parareal iteration {}: boundary states changed by "
+                         "{:.3g}".format(iteration + 1, change))
+            if change <= tolerance * scale or iteration + 1 >= slices:
+                # after as many iterations as slices, all slices are exact
+                converged = True
+                break
+
+    if not converged:
+        logger.warning("Parareal did not converge within {} iterations."
+                       "".format(max_iterations))
+
+    data = dict(modules={}, simulation=SimulationSettings(
+        start, end, step_size, measure_rate).to_dict())
+    for name, settings in module_settings.items():
+        data["modules"][name] = dict(settings)
+    data["results"] = _merge_slices(fine_results, bounds, measure_rate)
+    data["parareal"] = dict(slices=slices, iterations=len(changes),
+                            converged=converged, changes=changes)
+    return data
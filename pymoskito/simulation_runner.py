@@ -0,0 +1,619 @@
+# -*- coding: utf-8 -*-
+"""
+Headless execution of simulation regimes.
+
+The functions in this module run simulation regimes without any GUI or Qt
+event loop, which makes them suitable for batch jobs on compute servers or
+continuous integration pipelines. The same is available from the command
+line via::
+
+    pymoskito-run regimes.sreg -o results -m my_package
+
+where `my_package` is the package that registers the custom modules used in
+`regimes.sreg` .
+"""
+import argparse
+import importlib
+import logging
+import os
+import pickle
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from operator import attrgetter
+
+import yaml
+
+from . import simulation_modules
+from .registry import (
+    get_simulation_module_class_by_name, register_simulation_module
+)
+from .simulation_core import (
+    ResultStream, Simulator, format_profile, format_realtime,
+    get_module_settings, setup_simulation_modules
+)
+from .simulation_ensemble import setup_ensemble_modules, split_ensemble_output
+from .simulation_modules import SimulationException
+
+__all__ = ["load_regimes", "simulate_regime", "simulate_ensemble",
+           "resume_simulation", "run_regimes", "execute_regimes",
+           "save_result", "load_result", "open_result_stream", "BatchResult"]
+
+
+def load_regimes(file_name):
+    """
+    Load simulation regimes from a regime file.
+
+    Args:
+        file_name(str): Path of the `.sreg` file.
+
+    Returns:
+        list: Regimes stored in the file.
+    """
+    with open(file_name, "r") as f:
+        return yaml.full_load(f)
+
+
+def result_file_name(regime_name):
+    """ Create a canonical name for a simulation result file
+    """
+    return time.strftime("%Y%m%d-%H%M%S") + "_" + regime_name + ".pmr"
+
+
+def _create_result_file(out_dir, regime_name):
+    """
+    Create a new result file in `out_dir` and open it for binary writing.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    file_name = result_file_name(regime_name)
+    file_path = os.path.join(out_dir, file_name)
+
+    # never overwrite results of regimes with the same name
+    suffix = 0
+    while True:
+        try:
+            return open(file_path, "xb")
+        except FileExistsError:
+            suffix += 1
+            file_path = os.path.join(out_dir, "{}_{}.pmr".format(
+                file_name[:-4], suffix))
+
+
+def save_result(data, out_dir):
+    """
+    Store simulation results in the given directory.
+
+    Args:
+        data(dict): Simulation results, holding the entry `regime name` .
+        out_dir(str): Target directory, will be created if it does not exist.
+
+    Returns:
+        str: Path of the written `.pmr` file.
+    """
+    with _create_result_file(out_dir, data["regime name"]) as f:
+        pickle.dump(data, f, protocol=4)
+        return f.name
+
+
+def open_result_stream(out_dir, regime_name, chunk_size):
+    """
+    Create a result file in the given directory that receives the results
+    while the simulation runs.
+
+    Args:
+        out_dir(str): Target directory, will be created if it does not exist.
+        regime_name(str): Name of the regime, also stored in the file.
+        chunk_size(int): Number of values that are written at once.
+
+    Returns:
+        :py:class:`.ResultStream`: The opened stream.
+    """
+    return ResultStream(_create_result_file(out_dir, regime_name),
+                        chunk_size, {"regime name": regime_name})
+
+
+def load_result(file_name):
+    """
+    Load simulation results from a `.pmr` file.
+
+    Both, files stored at the end of a simulation and streamed files are
+    supported. Streamed files of interrupted runs yield all values that have
+    been written before the interruption.
+
+    Args:
+        file_name(str): Path of the result file.
+
+    Returns:
+        dict: The simulation results.
+    """
+    with open(file_name, "rb") as f:
+        data = pickle.load(f)
+        if ResultStream.is_header(data):
+            data = ResultStream.read(data, f)
+
+    return data
+
+
+class ProgressLogger:
+    """
+    Callback for the :py:class:`.Simulator` that logs the progress and the
+    outcome of a simulation.
+    """
+
+    def __init__(self, name, end_time):
+        self._logger = logging.getLogger(self.__class__.__name__)
+        self.name = name
+        self.end_time = end_time
+        self.last_progress = 0
+
+    def __call__(self, state_change):
+        if state_change.type == "time":
+            progress = int(state_change.t / self.end_time * 100)
+            if progress != self.last_progress:
+                self._logger.debug("'{}' reached {}%".format(self.name,
+                                                             progress))
+                self.last_progress = progress
+        elif state_change.type == "abort":
+            if isinstance(state_change.info, str):
+                self._logger.info(state_change.info)
+            else:
+                self._logger.error("Simulation of '{}' has been aborted due "
+                                   "to an exception".format(self.name),
+                                   exc_info=state_change.info)
+
+
+def simulate(module_settings, name="", callback=None, stream=None,
+             profile=False, realtime_factor=None):
+    """
+    Simulate the given module configuration.
+
+    Args:
+        module_settings(dict): Complete settings of all modules, see
+            :py:func:`.get_module_settings` .
+        name(str): Name of the regime, stored as `regime name` in the results.
+        callback(callable): Receives all :py:class:`.SimulationStateChange`
+            objects of the run. If omitted, the progress is logged.
+        stream(:py:class:`.ResultStream`): If given, the results are written
+            to this stream while the simulation runs, see
+            :py:func:`open_result_stream` .
+        profile(bool): Add the wall time statistics of all modules to the
+            results, see :py:class:`.SimulationProfile` .
+        realtime_factor(float): Pace the simulation to this many simulated
+            seconds per wall clock second and add the deadline statistics of
+            all modules to the results, see :py:class:`.RealTimePacer` .
+
+    Returns:
+        dict: Simulation results. If a `stream` is used, the signals are not
+        included.
+    """
+    sim_settings, sim_modules = setup_simulation_modules(module_settings)
+    if callback is None:
+        callback = ProgressLogger(name, sim_settings.end_time)
+
+    data = Simulator(sim_settings, sim_modules, callback=callback,
+                     stream=stream, profile=profile,
+                     realtime_factor=realtime_factor).run()
+    data.update({"regime name": name})
+    return data
+
+
+def resume_simulation(snapshot, name="", callback=None):
+    """
+    Continue a simulation from a snapshot.
+
+    Snapshots are taken via :py:meth:`.Simulator.snapshot` . If the snapshot
+    has been taken from a run whose results are streamed, the
+    results of the continued run are appended to the same result file.
+
+    Args:
+        snapshot: The snapshot or the path of the file it has been written to.
+        name(str): Name of the regime, stored as `regime name` in the results.
+        callback(callable): See :py:func:`simulate` .
+
+    Returns:
+        dict: Simulation results of the complete run.
+    """
+    if isinstance(snapshot, str):
+        with open(snapshot, "rb") as f:
+            snapshot = pickle.load(f)
+
+    stream = None
+    if snapshot.get("result file"):
+        stream = ResultStream(open(snapshot["result file"], "ab"),
+                              snapshot["chunk size"])
+    if callback is None:
+        callback = ProgressLogger(name, snapshot["simulation"]["end time"])
+
+    data = Simulator.restore(snapshot, callback=callback, stream=stream).run()
+    data.update({"regime name": name})
+    return data
+
+
+def simulate_ensemble(module_settings, ensemble, name="", callback=None,
+                      profile=False, realtime_factor=None):
+    """
+    Simulate all variants of an ensemble in a single run.
+
+    Args:
+        module_settings(dict): Complete settings of all modules, see
+            :py:func:`.get_module_settings` .
+        ensemble(dict): Values of the varied settings, indexed by module and
+            setting name, see :py:func:`.get_ensemble_settings` .
+        name(str): Name of the regime, the results of every member are
+            stored with the regime name `<name>_<index>` .
+        callback(callable): See :py:func:`simulate` .
+        profile(bool): See :py:func:`simulate` .
+        realtime_factor(float): See :py:func:`simulate` .
+
+    Returns:
+        list: Simulation results of every member.
+    """
+    sim_settings, sim_modules = setup_ensemble_modules(module_settings,
+                                                       ensemble)
+    if callback is None:
+        callback = ProgressLogger(name, sim_settings.end_time)
+
+    data = Simulator(sim_settings, sim_modules, callback=callback,
+                     profile=profile, realtime_factor=realtime_factor).run()
+    outputs = split_ensemble_output(data, sim_modules)
+    for idx, out in enumerate(outputs):
+        out.update({"regime name": "{}_{}".format(name, idx)})
+    return outputs
+
+
+def simulate_regime(regime, previous=None, callback=None):
+    """
+    Simulate a single regime.
+
+    Args:
+        regime(dict): The regime to simulate.
+        previous(dict): Module settings of the previously simulated regime,
+            only used if the regime does not `clear previous` settings.
+        callback(callable): See :py:func:`simulate` .
+
+    Returns:
+        dict: Simulation results, equivalent to the content of a `.pmr` file
+        written by the GUI. For regimes that define an `ensemble` , a list
+        with the results of every member is returned.
+    """
+    module_settings = get_module_settings(regime, previous)
+    if regime.get("ensemble"):
+        return simulate_ensemble(module_settings, regime["ensemble"],
+                                 regime["Name"], callback)
+    return simulate(module_settings, regime["Name"], callback)
+
+
+BatchResult = namedtuple("BatchResult", ["index", "name", "result",
+                                         "finished"])
+BatchResult.__doc__ = """
+Outcome of a single regime of a batch.
+
+Attributes:
+    index(int): Position of the regime in the batch.
+    name(str): Name of the regime.
+    result: Simulation results or, if an output directory is used, the path of
+        the written file. `None` if the simulation could not be set up.
+    finished(bool): `True` if the simulation finished successfully.
+"""
+
+
+def _get_registrations(module_settings):
+    """
+    Collect the classes of all modules that are used in `module_settings` .
+    """
+    registrations = []
+    for module_name, settings in module_settings.items():
+        module_type = getattr(simulation_modules, module_name)
+        registrations.append((module_type,
+                              get_simulation_module_class_by_name(
+                                  module_type, settings["type"])))
+    return registrations
+
+
+def _init_worker(registrations):
+    """
+    Make sure that all needed modules are registered in the worker process.
+
+    Depending on the start method of the process pool, the registry of the
+    parent may not be available in the worker. Since the classes are
+    transferred by reference, unpickling them imports their defining modules
+    and the remaining registration is done here.
+    """
+    for module_type, cls in registrations:
+        if get_simulation_module_class_by_name(module_type,
+                                               cls.__name__) is None:
+            register_simulation_module(module_type, cls)
+
+
+def _run_job(index, name, module_settings, ensemble, out_dir, chunk_size,
+             profile, realtime_factor):
+    """
+    Simulate a single regime of a batch.
+
+    Returns:
+        list: :py:class:`BatchResult` of the regime or of every member of
+        its ensemble.
+    """
+    logger = logging.getLogger(__name__)
+    logger.info("Simulating: {}".format(name))
+    if chunk_size and ensemble:
+        logger.warning("Results of ensemble '{}' cannot be streamed, "
+                       "keeping them in memory".format(name))
+        chunk_size = None
+
+    try:
+        if ensemble:
+            outputs = simulate_ensemble(module_settings, ensemble, name,
+                                        profile=profile,
+                                        realtime_factor=realtime_factor)
+        elif chunk_size:
+            sim_settings, sim_modules = setup_simulation_modules(
+                module_settings)
+            stream = open_result_stream(out_dir, name, chunk_size)
+            data = Simulator(sim_settings, sim_modules,
+                             callback=ProgressLogger(name,
+                                                     sim_settings.end_time),
+                             stream=stream, profile=profile,
+                             realtime_factor=realtime_factor).run()
+            if profile:
+                logger.info(format_profile(data["profile"]))
+            if realtime_factor is not None:
+                logger.info(format_realtime(data["realtime"]))
+            logger.info("results streamed to {}".format(stream.name))
+            return [BatchResult(index, name, stream.name,
+                                data["results"]["finished"])]
+        else:
+            outputs = [simulate(module_settings, name, profile=profile,
+                                realtime_factor=realtime_factor)]
+    except SimulationException as e:
+        logger.error("Simulation Setup of '{}' failed: {}".format(name, e))
+        return [BatchResult(index, name, None, False)]
+
+    if profile:
+        logger.info(format_profile(outputs[0]["profile"]))
+    if realtime_factor is not None:
+        logger.info(format_realtime(outputs[0]["realtime"]))
+
+    results = []
+    for data in outputs:
+        finished = data["results"]["finished"]
+        if out_dir is None:
+            results.append(BatchResult(index, data["regime name"], data,
+                                       finished))
+            continue
+
+        file_path = save_result(data, out_dir)
+        logger.info("results saved to {}".format(file_path))
+        results.append(BatchResult(index, data["regime name"], file_path,
+                                   finished))
+
+    return results
+
+
+def execute_regimes(regimes, out_dir=None, workers=1, progress=None,
+                    mp_context=None, chunk_size=None, profile=False,
+                    realtime_factor=None, names=None):
+    """
+    Simulate a batch of regimes, possibly in parallel.
+
+    The settings of all regimes are resolved in the calling process, while
+    the simulation modules are built and simulated in a pool of `workers`
+    processes. Results are yielded as soon as a simulation has finished, so
+    their order may differ from the order of `regimes` .
+
+    Args:
+        regimes(list): Regimes to simulate.
+        out_dir(str): If given, the results are written to this directory by
+            the workers and only the file paths are transferred back.
+        workers(int): Number of worker processes, `None` uses one per CPU.
+            If `1` , all regimes are simulated in the calling process.
+        progress(callable): Called with the number of completed and the
+            total number of regimes whenever a regime is done.
+        mp_context: Multiprocessing context for the process pool, defaults
+            to the start method of the platform.
+        chunk_size(int): If given, the results are streamed to `out_dir` in
+            chunks of this many values while the simulations run. This keeps
+            the memory usage constant and preserves the results of aborted
+            runs.
+        profile(bool): Log the wall time statistics of all modules and store
+            them in the results, see :py:func:`simulate` .
+        realtime_factor(float): Pace every simulation to this many simulated
+            seconds per wall clock second and log the deadline statistics
+            of all modules, see :py:func:`simulate` .
+        names(list): If given, only the regimes with these names are
+            simulated. The settings of all regimes are resolved nonetheless,
+            since a regime that does not `clear previous` settings builds on
+            the ones before it.
+
+    Yields:
+        :py:class:`BatchResult` : Outcome of every regime in completion order.
+        For regimes that define an `ensemble` , the outcome of every member
+        is yielded.
+    """
+    if chunk_size and out_dir is None:
+        raise ValueError("Streaming results requires an output directory.")
+
+    logger = logging.getLogger(__name__)
+    jobs = []
+    module_settings = None
+    for index, regime in enumerate(regimes):
+        selected = names is None or regime["Name"] in names
+        try:
+            module_settings = get_module_settings(regime, module_settings)
+        except SimulationException as e:
+            if selected:
+                logger.error("Simulation Setup of '{}' failed: {}".format(
+                    regime["Name"], e))
+                jobs.append((index, regime["Name"], None, None))
+            module_settings = None
+            continue
+        if selected:
+            jobs.append((index, regime["Name"], module_settings,
+                         regime.get("ensemble")))
+    total = len(jobs)
+
+    def _failed(index, name):
+        return BatchResult(index, name, None, False)
+
+    done = 0
+    if workers == 1:
+        for index, name, settings, ensemble in jobs:
+            if settings is None:
+                res = [_failed(index, name)]
+            else:
+                res = _run_job(index, name, settings, ensemble, out_dir,
+                               chunk_size, profile, realtime_factor)
+            done += 1
+            if progress is not None:
+                progress(done, total)
+            yield from res
+        return
+
+    registrations = []
+    for _, _, settings, _ in jobs:
+        if settings is not None:
+            registrations += [reg for reg in _get_registrations(settings)
+                              if reg not in registrations]
+
+    pool = ProcessPoolExecutor(max_workers=workers,
+                               mp_context=mp_context,
+                               initializer=_init_worker,
+                               initargs=(registrations,))
+    futures = []
+    try:
+        for index, name, settings, ensemble in jobs:
+            if settings is None:
+                done += 1
+                if progress is not None:
+                    progress(done, total)
+                yield _failed(index, name)
+                continue
+            futures.append(pool.submit(_run_job, index, name, settings,
+                                       ensemble, out_dir, chunk_size,
+                                       profile, realtime_factor))
+
+        logger.info("Simulating {} regimes with {} workers".format(
+            len(futures), workers or os.cpu_count()))
+        for future in as_completed(futures):
+            done += 1
+            if progress is not None:
+                progress(done, total)
+            yield from future.result()
+    finally:
+        # cancel pending jobs if the consumer stops early
+        for future in futures:
+            future.cancel()
+        pool.shutdown(wait=True)
+
+
+def run_regimes(regimes, out_dir=None, workers=1, chunk_size=None,
+                profile=False, realtime_factor=None):
+    """
+    Simulate all given regimes.
+
+    Args:
+        regimes(list): Regimes to simulate.
+        out_dir(str): If given, the results are written to this directory
+            instead of being returned.
+        workers(int): Number of worker processes, see
+            :py:func:`execute_regimes` .
+        chunk_size(int): Stream the results to `out_dir` , see
+            :py:func:`execute_regimes` .
+        profile(bool): Profile the simulations, see
+            :py:func:`execute_regimes` .
+        realtime_factor(float): Pace the simulations, see
+            :py:func:`execute_regimes` .
+
+    Returns:
+        tuple: List of results (or written file paths if `out_dir` is given)
+        in the order of `regimes` and a flag that tells whether all
+        simulations finished successfully.
+    """
+    results = []
+    success = True
+    for res in execute_regimes(regimes, out_dir, workers,
+                               chunk_size=chunk_size, profile=profile,
+                               realtime_factor=realtime_factor):
+        success &= res.finished
+        if res.result is not None:
+            results.append(res)
+
+    results.sort(key=attrgetter("index"))
+    return [res.result for res in results], success
+
+
+def main(argv=None):
+    """
+    Entry point of the `pymoskito-run` command.
+    """
+    parser = argparse.ArgumentParser(
+        prog="pymoskito-run",
+        description="Simulate the regimes of PyMoskito regime files without "
+                    "the GUI.")
+    parser.add_argument("regime_files", nargs="+", metavar="REGIME_FILE",
+                        help="Regime file(s) (.sreg) to simulate.")
+    parser.add_argument("-o", "--output", default=os.curdir,
+                        help="Directory to store the results in.")
+    parser.add_argument("-m", "--module", action="append", default=[],
+                        help="Module to import before the simulation, use "
+                             "this to register custom simulation modules. "
+                             "Can be given multiple times.")
+    parser.add_argument("-r", "--regime", action="append", default=[],
+                        help="Only simulate the regime with this name. "
+                             "Can be given multiple times.")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="Number of regimes to simulate in parallel, "
+                             "use 0 for one per CPU.")
+    parser.add_argument("-c", "--chunk-size", type=int, default=None,
+                        help="Stream the results to disk in chunks of this "
+                             "many values while simulating. Keeps the memory "
+                             "usage constant for long simulations and "
+                             "preserves the results of aborted runs.")
+    parser.add_argument("-p", "--profile", action="store_true",
+                        help="Measure the wall time of all modules and log "
+                             "it after every simulation.")
+    parser.add_argument("-t", "--realtime", type=float, default=None,
+                        metavar="FACTOR",
+                        help="Pace the simulation to FACTOR simulated seconds "
+                             "per wall clock second and log the deadline "
+                             "statistics of all modules, use 1 to simulate "
+                             "in real time.")
+    args = parser.parse_args(argv)
+    logger = logging.getLogger(__name__)
+
+    sys.path.insert(0, os.path.abspath(os.curdir))
+    for mod in args.module:
+        importlib.import_module(mod)
+
+    regimes = []
+    for file_name in args.regime_files:
+        regimes += load_regimes(file_name)
+
+    names = None
+    if args.regime:
+        names = args.regime
+        if not any(reg["Name"] in names for reg in regimes):
+            logger.error("None of the given regimes found.")
+            return 1
+
+    def _progress(done, total):
+        logger.info("Batch progress: {}/{} regimes".format(done, total))
+
+    success = True
+    for res in execute_regimes(regimes, args.output, args.jobs or None,
+                               _progress, chunk_size=args.chunk_size,
+                               profile=args.profile,
+                               realtime_factor=args.realtime, names=names):
+        success &= res.finished
+
+    if not success:
+        logger.error("Batch simulation has been aborted")
+        return 1
+
+    logger.info("All Regimes have been simulated")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,377 @@
+# -*- coding: utf-8 -*-
+"""
+Automatic tuning of the solver settings against an accuracy budget.
+
+Step size, tolerances and integration method of a regime are usually chosen
+conservatively, which makes the simulations slower than necessary. The tuner
+simulates the regime once with tight tolerances as reference and searches the
+candidate settings for the fastest configuration whose recorded signals stay
+within the given tolerance of the reference.
+
+The winning settings are stored as complete regimes, holding all modules of
+the original regime together with the tuned solver, hence every tuned regime
+can be run on its own::
+
+    pymoskito-tune default.sreg -r "test" -t 1e-4 -o tuned.sreg
+"""
+import argparse
+import importlib
+import itertools
+import logging
+import os
+import sys
+import time
+from collections import OrderedDict
+
+import numpy as np
+import yaml
+
+from .simulation_core import (
+    Simulator, get_module_settings, setup_simulation_modules
+)
+from .simulation_modules import SimulationException
+from .simulation_runner import load_regimes
+
+__all__ = ["DEFAULT_CANDIDATES", "REFERENCE_SETTINGS", "signal_error",
+           "tune_solver", "create_overlay", "save_overlay"]
+
+DEFAULT_CANDIDATES = {
+    "ODEInt": OrderedDict([
+        ("Method", ["adams", "bdf"]),
+        ("step size", [1, 2, 5, 10]),
+        ("rTol", [1e-3, 1e-4, 1e-5, 1e-6, 1e-7, 1e-8]),
+    ]),
+    "SolveIVP": OrderedDict([
+        ("Method", ["RK45", "DOP853", "LSODA"]),
+        ("step size", [1, 2, 5, 10]),
+        ("rTol", [1e-3, 1e-4, 1e-5, 1e-6, 1e-7, 1e-8]),
+    ]),
+}
+"""
+Candidate settings per solver type. Step sizes are given as multiples of the
+step size of the regime, the relative tolerances are tried from the loosest
+to the tightest one.
+"""
+
+REFERENCE_SETTINGS = {"rTol": 1e-10, "aTol": 1e-12}
+""" Solver settings of the reference simulation. """
+
+
+def _simulate(module_settings, repeat=1):
+    """
+    Simulate the settings and measure the fastest of `repeat` runs.
+
+    Returns:
+        tuple: The results and the wall time in seconds.
+    """
+    wall_time = np.inf
+    for _ in range(repeat):
+        sim_settings, sim_modules = setup_simulation_modules(module_settings)
+        start = time.perf_counter()
+        results = Simulator(sim_settings, sim_modules).run()["results"]
+        wall_time = min(wall_time, time.perf_counter() - start)
+    return results, wall_time
+
+
+def signal_error(results, reference, signals=None):
+    """
+    Compute the deviation of the recorded signals from a reference.
+
+    The signals are interpolated onto the time grid of the reference, within
+    the time span covered by both, and the deviation of every signal is
+    scaled by its largest magnitude in the reference, as long as this exceeds
+    one. Since the measurement instants are accumulated step by step, the
+    last ones may differ by a step between both.
+
+    Args:
+        results(dict): Recorded results to check.
+        reference(dict): Recorded results of the reference.
+        signals(list): Names of the signals to compare, defaults to all
+            signals of the reference.
+
+    Returns:
+        float: The largest scaled deviation of all signals.
+    """
+    ref_time = reference["time"]
+    time_values = results["time"]
+    if signals is None:
+        signals = [key for key, val in reference.items()
+                   if key != "time" and isinstance(val, np.ndarray)
+                   and len(val) == len(ref_time)]
+
+    covered = ref_time <= time_values[-1]
+    ref_time = ref_time[covered]
+
+    error = 0
+    for key in signals:
+        ref_values = np.reshape(reference[key], (len(covered), -1))[covered]
+        values = np.reshape(results[key], (len(time_values), -1))
+        for col in range(ref_values.shape[1]):
+            deviation = np.max(np.abs(np.interp(ref_time, time_values,
+                                                values[:, col])
+                                      - ref_values[:, col]))
+            scale = max(1, np.max(np.abs(ref_values[:, col])))
+            error = max(error, deviation / scale)
+
+    return float(error)
+
+
+def _candidate_settings(solver_settings, candidates):
+    """
+    Create all candidate solver settings, grouped by everything but the
+    relative tolerance, which is varied from the loosest to the tightest one.
+    """
+    interval = 1 / solver_settings["measure rate"]
+    atol_ratio = solver_settings["aTol"] / solver_settings["rTol"]
+
+    names = [name for name in candidates if name != "rTol"]
+    groups = []
+    for values in itertools.product(*[candidates[name] for name in names]):
+        base = OrderedDict(zip(names, values))
+        if "step size" in base:
+            step_size = base["step size"] * solver_settings["step size"]
+            if step_size > interval * (1 + 1e-9):
+                # larger steps would skip measurements
+                continue
+            base["step size"] = float(step_size)
+
+        group = []
+        for rtol in candidates.get("rTol", [solver_settings["rTol"]]):
+            settings = OrderedDict(base)
+            settings["rTol"] = float(rtol)
+            settings["aTol"] = float(rtol * atol_ratio)
+            group.append(settings)
+        groups.append(group)
+
+    return groups
+
+
+def tune_solver(module_settings, tolerance, candidates=None, signals=None,
+                repeat=1, name=""):
+    """
+    Search the fastest solver settings that meet an accuracy budget.
+
+    First, the regime is simulated with the :py:data:`REFERENCE_SETTINGS` and
+    with its own settings. Then, for every combination of the candidate
+    settings, the relative tolerance is tightened until the error, see
+    :py:func:`signal_error` , is within `tolerance` . Tighter tolerances of
+    the same combination are not tried, since they only take longer.
+
+    Args:
+        module_settings(dict): Complete settings of all modules, see
+            :py:func:`.get_module_settings` .
+        tolerance(float): Accepted deviation of the recorded signals.
+        candidates(dict): Lists of values for the solver settings, the
+            entry `step size` holds multiples of the current step size.
+            Defaults to the :py:data:`DEFAULT_CANDIDATES` of the solver type.
+        signals(list): Names of the signals to compare, defaults to all.
+        repeat(int): Number of runs per configuration, the fastest one counts.
+        name(str): Name of the regime.
+
+    Returns:
+        OrderedDict: The result with the entries `regime`, the complete
+        `module settings` of the regime, the tuned `settings` of the solver,
+        their `error` and `wall time`, the `original wall time` and
+        `original error` of the given settings, the resulting `speedup` and
+        all `trials` .
+
+    Raises:
+        SimulationException: If no configuration is within `tolerance` .
+    """
+    logger = logging.getLogger(__name__)
+    solver_settings = module_settings["Solver"]
+    if candidates is None:
+        candidates = DEFAULT_CANDIDATES.get(solver_settings["type"])
+        if candidates is None:
+            raise SimulationException("No candidate settings known for the "
+                                      "solver '{}'."
+                                      "".format(solver_settings["type"]))
+
+    def _with_solver(settings):
+        new_settings = OrderedDict(module_settings)
+        new_settings["Solver"] = OrderedDict(solver_settings)
+        new_settings["Solver"].update(settings)
+        return new_settings
+
+    reference, _ = _simulate(_with_solver(REFERENCE_SETTINGS))
+    if not reference["finished"]:
+        raise SimulationException("The reference simulation failed.")
+
+    results, original_time = _simulate(module_settings, repeat)
+    original_error = (signal_error(results, reference, signals)
+                      if results["finished"] else np.inf)
+    logger.info("Original settings: error {:.3g}, {:.3f} s"
+                "".format(original_error, original_time))
+
+    trials = []
+    best = None
+    if original_error <= tolerance:
+        best = OrderedDict([("settings", OrderedDict()),
+                            ("error", original_error),
+                            ("wall time", original_time)])
+
+    for group in _candidate_settings(solver_settings, candidates):
+        for settings in group:
+            try:
+                results, wall_time = _simulate(_with_solver(settings), repeat)
+            except SimulationException as e:
+                logger.debug("Skipping {}: {}".format(dict(settings), e))
+                break
+
+            error = (signal_error(results, reference, signals)
+                     if results["finished"] else np.inf)
+            trials.append(OrderedDict([("settings", settings),
+                                       ("error", error),
+                                       ("wall time", wall_time)]))
+            logger.debug("{}: error {:.3g}, {:.3f} s"
+                         "".format(dict(settings), error, wall_time))
+            if error <= tolerance:
+                if best is None or wall_time < best["wall time"]:
+                    best = trials[-1]
+                break
+
+    if best is None:
+        raise SimulationException("No solver settings within a tolerance of "
+                                  "{}.".format(tolerance))
+
+    tuned = OrderedDict(solver_settings)
+    tuned.update(best["settings"])
+    return OrderedDict([
+        ("regime", name),
+        ("module settings", module_settings),
+        ("settings", tuned),
+        ("error", best["error"]),
+        ("wall time", best["wall time"]),
+        ("original error", original_error),
+        ("original wall time", original_time),
+        ("speedup", original_time / best["wall time"]),
+        ("trials", trials),
+    ])
+
+
+def _plain(value):
+    """
+    Convert numpy values into plain python types that yaml can represent.
+    """
+    if isinstance(value, dict):
+        return {key: _plain(val) for key, val in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(val) for val in value]
+    if isinstance(value, (np.generic, np.ndarray)):
+        return value.tolist()
+    return value
+
+
+def create_overlay(result, name=None):
+    """
+    Create a regime that applies the tuned solver settings.
+
+    The regime holds the settings of all modules of the tuned regime and
+    clears the previous settings, so it does not depend on the regime it
+    follows in a regime file.
+
+    Args:
+        result(dict): Result of :py:func:`tune_solver` .
+        name(str): Name of the regime, defaults to the regime name with the
+            suffix `(tuned)` .
+
+    Returns:
+        dict: Complete regime with the tuned solver settings.
+    """
+    if name is None:
+        name = "{} (tuned)".format(result["regime"]).strip()
+
+    regime = {"Name": name, "clear previous": True}
+    for module_name, settings in result["module settings"].items():
+        regime[module_name] = _plain(settings)
+    regime["Solver"] = _plain(result["settings"])
+    return regime
+
+
+def save_overlay(results, file_name):
+    """
+    Write the tuned regimes to a regime file.
+
+    The error and the measured speedup of every regime are noted as comment
+    above it.
+
+    Args:
+        results(list): Results of :py:func:`tune_solver` .
+        file_name(str): Path of the `.sreg` file to write.
+    """
+    with open(file_name, "w") as f:
+        for result in results:
+            f.write("# {}: error {:.3g}, speedup {:.2f}\n"
+                    "".format(result["regime"], result["error"],
+                              result["speedup"]))
+            yaml.dump([create_overlay(result)], f, default_flow_style=False,
+                      sort_keys=False)
+
+
+def main(argv=None):
+    """
+    Entry point of the `pymoskito-tune` command.
+    """
+    parser = argparse.ArgumentParser(
+        prog="pymoskito-tune",
+        description="Tune the solver settings of regimes to the fastest "
+                    "configuration within an accuracy budget.")
+    parser.add_argument("regime_file", metavar="REGIME_FILE",
+                        help="Regime file (.sreg) to tune.")
+    parser.add_argument("-t", "--tolerance", type=float, required=True,
+                        help="Accepted deviation of the recorded signals, "
+                             "relative to their magnitude if it exceeds one.")
+    parser.add_argument("-o", "--output", default="tuned.sreg",
+                        help="Regime file to write the tuned regimes to.")
+    parser.add_argument("-m", "--module", action="append", default=[],
+                        help="Module to import before the simulation, use "
+                             "this to register custom simulation modules. "
+                             "Can be given multiple times.")
+    parser.add_argument("-r", "--regime", action="append", default=[],
+                        help="Only tune the regime with this name. "
+                             "Can be given multiple times.")
+    parser.add_argument("-s", "--signal", action="append", default=None,
+                        help="Only compare this signal, e.g. 'Solver'. "
+                             "Can be given multiple times.")
+    parser.add_argument("-n", "--repeat", type=int, default=1,
+                        help="Number of runs per configuration, the fastest "
+                             "one is kept.")
+    args = parser.parse_args(argv)
+    logger = logging.getLogger(__name__)
+
+    sys.path.insert(0, os.path.abspath(os.curdir))
+    for mod in args.module:
+        importlib.import_module(mod)
+
+    results = []
+    previous = None
+    for regime in load_regimes(args.regime_file):
+        module_settings = get_module_settings(regime, previous)
+        previous = module_settings
+        if args.regime and regime["Name"] not in args.regime:
+            continue
+
+        try:
+            result = tune_solver(module_settings, args.tolerance,
+                                 signals=args.signal, repeat=args.repeat,
+                                 name=regime["Name"])
+        except SimulationException as e:
+            logger.error("Tuning of '{}' failed: {}".format(regime["Name"], e))
+            continue
+
+        logger.info("'{}': {:.2f}x faster with an error of {:.3g}"
+                    "".format(regime["Name"], result["speedup"],
+                              result["error"]))
+        results.append(result)
+
+    if not results:
+        logger.error("No regime has been tuned.")
+        return 1
+
+    save_overlay(results, args.output)
+    logger.info("Tuned regimes written to {}".format(args.output))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
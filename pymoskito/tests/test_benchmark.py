@@ -0,0 +1,82 @@
+"""
+test_benchmark
+----------------------------------
+
+Tests for the benchmark suite.
+"""
+
+import os
+import tempfile
+import unittest
+
+from pymoskito.benchmark import (
+    COMPILED_EXAMPLES, EXAMPLES, benchmark_examples, benchmark_state_functions, find_regressions,
+    format_benchmarks, format_state_functions, load_baseline, machine_tag,
+    measure_regime, measure_state_function, save_baseline
+)
+from pymoskito.simulation_core import get_module_settings
+
+# registers the first order model
+from pymoskito.tests.test_simulation_core import get_regime
+
+
+class TestBenchmark(unittest.TestCase):
+
+    def test_measure_regime(self):
+        record = measure_regime(get_module_settings(get_regime()), "free")
+        self.assertEqual(record["regime"], "free")
+        self.assertTrue(record["finished"])
+        self.assertEqual(record["steps"], 1000)
+        self.assertAlmostEqual(record["steps/s"],
+                               record["steps"] / record["wall time"])
+        self.assertGreater(record["result size"], 0)
+        if record["peak rss"] is not None:
+            self.assertGreater(record["peak rss"], 0)
+
+    def test_examples(self):
+        records = benchmark_examples(["car"])
+        self.assertEqual([(rec["example"], rec["regime"]) for rec in records],
+                         [("car", "test")])
+        self.assertTrue(records[0]["finished"])
+        self.assertIn("car/test", format_benchmarks(records))
+
+        # examples that build C++ modules are only run on request
+        self.assertFalse(set(COMPILED_EXAMPLES) & set(EXAMPLES))
+
+    def test_baseline(self):
+        record = measure_regime(get_module_settings(get_regime()), "free")
+        record["example"] = "tests"
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_name = os.path.join(tmp_dir, "baselines.json")
+            self.assertIsNone(load_baseline(file_name))
+
+            save_baseline([record], file_name, tag="other")
+            self.assertIsNone(load_baseline(file_name))
+            tag = save_baseline([record], file_name)
+            self.assertEqual(tag, machine_tag())
+            baseline = load_baseline(file_name)
+            self.assertIsNotNone(load_baseline(file_name, tag="other"))
+
+        self.assertEqual(machine_tag(baseline["machine"]), tag)
+        self.assertEqual(list(baseline["regimes"].keys()), ["tests/free"])
+        self.assertEqual(find_regressions([record], baseline), [])
+
+        slow = dict(record)
+        slow["steps/s"] = 0.5 * record["steps/s"]
+        self.assertEqual(find_regressions([slow], baseline),
+                         [("tests/free", record["steps/s"], slow["steps/s"])])
+        self.assertEqual(find_regressions([slow], baseline, tolerance=0.6),
+                         [])
+        self.assertIn("-50.0%", format_benchmarks([slow], baseline))
+
+    def test_state_functions(self):
+        record = measure_state_function(get_module_settings(get_regime()),
+                                        calls=100)
+        self.assertEqual(record["model"], "FirstOrderModel")
+        self.assertGreater(record["calls/s"], 0)
+
+        records = benchmark_state_functions(["ballbeam"], calls=100)
+        self.assertEqual([(rec["example"], rec["model"]) for rec in records],
+                         [("ballbeam", "BallBeamModel")])
+        self.assertIn("ballbeam/BallBeamModel",
+                      format_state_functions(records))
@@ -12,13 +12,17 @@ import unittest
 from collections import OrderedDict
 import pickle
 import os
+import tempfile
 
+from scipy import integrate, sparse
 import scipy.signal as sig
+import sympy as sp
 import numpy as np
 
 import pymoskito as pm
 from pymoskito.simulation_modules import (
-    SimulationModule, Model
+    SimulationModule, Model, SolverException, TrajectoryException,
+    ControllerException
 )
 
 
@@ -172,6 +176,112 @@ class TrajectoryTestCase(unittest.TestCase):
             out = tr.calc_output(dict(time=t))
             np.testing.assert_array_equal(out, ref_out)
 
+        # check the transition against the symbolic construction
+        tau, k = sp.symbols("tau, k")
+        gamma = self.d_order + 1
+        phi = (sp.factorial(2 * gamma + 1) / sp.factorial(gamma) ** 2
+               * sp.summation(sp.binomial(gamma, k) * (-1) ** k
+                              * tau ** (gamma + k + 1) / (gamma + k + 1),
+                              (k, 0, gamma)))
+        for t in np.linspace(10, 17, 15):
+            tau_val = sp.Rational(t - 10) / 7
+            ref_out = np.array([[float(sp.diff(phi, tau, order).subs(
+                tau, tau_val)) / 7 ** order for order in range(gamma)]])
+            ref_out = np.array([[-4], [10]]) * [[1] + [0] * self.d_order] \
+                + np.array([[13], [10]]) * ref_out
+            out = tr.calc_output(dict(time=t))
+            np.testing.assert_allclose(out, ref_out, rtol=1e-6, atol=1e-6)
+
+        # the polynomials are shared by all instances
+        self.assertIs(tr._coefficients,
+                      pm.SmoothTransition.transition_polynomials(self.d_order))
+        np.testing.assert_array_equal(
+            pm.SmoothTransition.transition_polynomials(0),
+            [[-2], [3], [0], [0]])
+
+    def test_batch(self):
+        times = np.linspace(0, 20, 101)
+        trajectories = [
+            pm.Setpoint(dict(pm.Setpoint.public_settings,
+                             Setpoint=[1, 4],
+                             differential_order=self.d_order)),
+            pm.SmoothTransition(dict(pm.SmoothTransition.public_settings,
+                                     states=[[-4, 9], [10, 20]],
+                                     differential_order=self.d_order)),
+            pm.HarmonicTrajectory(dict(pm.HarmonicTrajectory.public_settings,
+                                       differential_order=self.d_order)),
+        ]
+        for tr in trajectories:
+            values = tr.desired_values_batch(times)
+            self.assertEqual(values.shape[0], len(times))
+            for t, val in zip(times, values):
+                np.testing.assert_allclose(val, tr._desired_values(t),
+                                           rtol=1e-12, atol=1e-12)
+
+
+class TabulatedTrajectoryTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.file_name = os.path.join(self.tmp_dir.name, "reference.npy")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _create(self, times, order=1):
+        # two components, each with its value and first derivative
+        data = np.column_stack([times, np.sin(times), np.cos(times),
+                                times ** 2, 2 * times])
+        np.save(self.file_name, data)
+        settings = dict(pm.TabulatedTrajectory.public_settings,
+                        File=self.file_name, Outputs=2,
+                        differential_order=order)
+        return pm.TabulatedTrajectory(settings), data
+
+    def _check(self, tr, data, times):
+        for col in range(4):
+            ref = np.interp(times, data[:, 0], data[:, col + 1])
+            values = tr.desired_values_batch(times)
+            np.testing.assert_allclose(values[:, col // 2, col % 2], ref,
+                                       rtol=1e-12, atol=1e-12)
+            for t, val in zip(times, values):
+                np.testing.assert_allclose(tr._desired_values(t), val,
+                                           rtol=1e-12, atol=1e-12)
+
+    def test_uniform(self):
+        tr, data = self._create(np.linspace(1, 3, 201))
+        self.assertIsInstance(tr._data, np.memmap)
+        self.assertAlmostEqual(tr._step_size, 0.01)
+        self._check(tr, data, np.linspace(0, 4, 333))
+
+    def test_non_uniform(self):
+        tr, data = self._create(np.geomspace(1, 3, 201))
+        self.assertIsNone(tr._step_size)
+        self._check(tr, data, np.linspace(0, 4, 333))
+
+    def test_order(self):
+        tr, data = self._create(np.linspace(1, 3, 201), order=0)
+        self.assertEqual(tr._desired_values(2).shape, (2, 1))
+        self.assertEqual(tr.desired_values_batch([1, 2, 3]).shape, (3, 2, 1))
+
+        with self.assertRaises(TrajectoryException):
+            self._create(np.linspace(1, 3, 201), order=2)
+
+    def test_invalid(self):
+        with self.assertRaises(TrajectoryException):
+            self._create(np.r_[1, 3, 2])
+
+        np.save(self.file_name, np.zeros((10, 4)))
+        settings = dict(pm.TabulatedTrajectory.public_settings,
+                        File=self.file_name, Outputs=2,
+                        differential_order=0)
+        with self.assertRaises(TrajectoryException):
+            pm.TabulatedTrajectory(settings)
+
+        settings["File"] = os.path.join(self.tmp_dir.name, "missing.npy")
+        with self.assertRaises(TrajectoryException):
+            pm.TabulatedTrajectory(settings)
+
 
 class DummyModel(Model):
 
@@ -215,6 +325,420 @@ class TestModel(unittest.TestCase):
         self.assertEqual(m.initial_state, [1, 2, 3, 4])
 
 
+class DecayModel(Model):
+    """
+    Exponential decay with input, the state is reset to `reset` as soon as
+    it drops below `threshold` .
+    """
+    public_settings = OrderedDict([("initial state", [1]),
+                                   ("threshold", None),
+                                   ("reset", 1)])
+
+    def __init__(self, settings):
+        settings.update(state_count=1, input_count=1)
+        super().__init__(settings)
+
+    def state_function(self, t, x, args):
+        return -x + args[0]
+
+    def root_function(self, x):
+        threshold = self._settings["threshold"]
+        if threshold is not None and np.any(x < threshold):
+            return True, np.where(x < threshold, self._settings["reset"], x)
+        return False, x
+
+    def calc_output(self, input_vector):
+        return input_vector
+
+
+class ExplicitRungeKuttaTestCase(unittest.TestCase):
+
+    solvers = [(pm.Euler, 1), (pm.Heun, 2), (pm.RungeKutta4, 4),
+               (pm.DormandPrince, 5)]
+
+    def _integrate(self, solver_cls, step_size, settings=None,
+                   in_place_size=None):
+        model_settings = OrderedDict(DecayModel.public_settings)
+        model_settings.update(settings or {})
+        model = DecayModel(model_settings)
+        solver_settings = OrderedDict(solver_cls.public_settings)
+        solver_settings.update({"step size": step_size,
+                                "modules": {"Model": model}})
+        solver = solver_cls(solver_settings)
+        if in_place_size is not None:
+            solver.in_place_size = in_place_size
+        solver.set_input(np.zeros(1))
+        states = []
+        for _ in range(int(round(1 / step_size))):
+            # in-place results are only valid until the next step
+            states.append(np.copy(solver.integrate(solver.t)))
+        return solver, np.array(states)
+
+    def test_order(self):
+        for solver_cls, order in self.solvers:
+            errors = []
+            for step_size in [0.1, 0.05]:
+                solver, states = self._integrate(solver_cls, step_size)
+                self.assertAlmostEqual(solver.t, 1)
+                errors.append(abs(states[-1, 0] - np.exp(-1)))
+            self.assertAlmostEqual(np.log2(errors[0] / errors[1]), order,
+                                   delta=0.2)
+
+            stats = solver.get_statistics()
+            self.assertEqual(stats["steps"], 20)
+            self.assertEqual(stats["rhs evaluations"],
+                             20 * len(solver_cls.butcher_b))
+
+    def test_root_function(self):
+        for solver_cls, _ in self.solvers:
+            solver, states = self._integrate(solver_cls, 0.01,
+                                             {"threshold": 0.5})
+            # the reset state is used for the next step
+            self.assertLess(states[:, 0].min(), 0.5)
+            self.assertGreater(states[-1, 0], 0.5)
+            self.assertTrue(solver.successful)
+
+    def test_in_place(self):
+        for solver_cls, _ in self.solvers:
+            for settings in [None, {"threshold": 0.5}]:
+                _, states = self._integrate(solver_cls, 0.01, settings)
+                solver, in_place = self._integrate(solver_cls, 0.01,
+                                                   settings, in_place_size=0)
+                np.testing.assert_array_equal(in_place, states)
+
+            # the buffers are used in turns and handed out read-only
+            first = solver.integrate(solver.t)
+            second = solver.integrate(solver.t)
+            third = solver.integrate(solver.t)
+            self.assertFalse(first.flags.writeable)
+            self.assertFalse(np.shares_memory(first, second))
+            self.assertTrue(np.shares_memory(first, third))
+
+    def test_state(self):
+        solver, _ = self._integrate(pm.RungeKutta4, 0.1)
+        state = solver.get_state()
+        x = solver.integrate(solver.t)
+        solver.integrate(solver.t)
+        solver.set_state(state)
+        np.testing.assert_array_equal(solver.integrate(solver.t), x)
+
+    def test_unsuccessful(self):
+        solver, _ = self._integrate(pm.Euler, 0.1)
+        solver.set_input(np.array([np.inf]))
+        with self.assertRaises(SolverException):
+            solver.integrate(solver.t)
+
+
+class BouncingBallModel(Model):
+    """
+    Ball that is dropped from `height` and bounces off the floor, losing
+    the share `1 - restitution` of its speed.
+    """
+    public_settings = OrderedDict([("initial state", [1, 0]),
+                                   ("restitution", 0.5),
+                                   ("events", True)])
+    g = 9.81
+
+    def __init__(self, settings):
+        settings.update(state_count=2, input_count=1)
+        super().__init__(settings)
+
+    def state_function(self, t, x, args):
+        return np.array([x[1], -self.g])
+
+    def root_function(self, x):
+        if x[0] <= 0 and x[1] < 0:
+            return True, np.array([0, -self._settings["restitution"] * x[1]])
+        return False, x
+
+    def event_functions(self):
+        if not self._settings["events"]:
+            return []
+
+        def floor(t, x, args):
+            return x[0]
+        floor.direction = -1
+        return [floor]
+
+    def calc_output(self, input_vector):
+        return input_vector[0]
+
+
+class SolveIVPTestCase(unittest.TestCase):
+
+    def _simulate(self, events=True, method="RK45", step_size=1e-2):
+        model_settings = OrderedDict(BouncingBallModel.public_settings)
+        model_settings["events"] = events
+        model = BouncingBallModel(model_settings)
+        solver_settings = OrderedDict(pm.SolveIVP.public_settings)
+        solver_settings.update({"Method": method, "step size": step_size,
+                                "modules": {"Model": model}})
+        solver = pm.SolveIVP(solver_settings)
+        states = [np.array(model.initial_state, dtype=float)]
+        times = [solver.t]
+        while solver.t < 0.6 - step_size / 2:
+            solver.set_input(np.zeros(1))
+            states.append(solver.integrate(solver.t))
+            times.append(solver.t)
+        return solver, np.array(times), np.array(states)
+
+    def _reference(self, t):
+        # the first bounce happens at t_e, afterwards the ball rises again
+        g = BouncingBallModel.g
+        t_e = np.sqrt(2 / g)
+        v = 0.5 * g * t_e
+        return np.array([v * (t - t_e) - g / 2 * (t - t_e) ** 2,
+                         v - g * (t - t_e)])
+
+    def test_events(self):
+        for method in ["RK45", "DOP853", "Radau", "LSODA"]:
+            solver, times, states = self._simulate(method=method)
+            self.assertAlmostEqual(times[-1], 0.6)
+            self.assertEqual(solver.get_statistics()["events"], 1)
+            np.testing.assert_allclose(states[-1], self._reference(times[-1]),
+                                       atol=1e-5)
+
+        # without events, the bounce is only detected after the step
+        solver, times, states = self._simulate(events=False)
+        self.assertEqual(solver.get_statistics()["events"], 0)
+        self.assertGreater(np.abs(states[-1]
+                                  - self._reference(times[-1])).max(), 1e-3)
+
+    def test_history(self):
+        # the integrator is only restarted at the bounce
+        solver, _, _ = self._simulate()
+        integrator = solver._solver
+        for _ in range(5):
+            solver.set_input(np.zeros(1))
+            solver.integrate(solver.t)
+        self.assertIs(solver._solver, integrator)
+
+        # and whenever the input changes, keeping its step size
+        steps = solver.get_statistics()["steps"]
+        for value in range(1, 6):
+            solver.set_input(np.full(1, value))
+            solver.integrate(solver.t)
+            self.assertIsNot(solver._solver, integrator)
+            integrator = solver._solver
+        self.assertEqual(solver.get_statistics()["steps"], steps + 5)
+
+    def test_input_changes(self):
+        def simulate(method, r_tol, a_tol):
+            model = DecayModel(OrderedDict(DecayModel.public_settings))
+            settings = OrderedDict(pm.SolveIVP.public_settings)
+            settings.update({"Method": method, "step size": 1e-2,
+                             "rTol": r_tol, "aTol": a_tol,
+                             "modules": {"Model": model}})
+            solver = pm.SolveIVP(settings)
+            states = []
+            for k in range(500):
+                solver.set_input(np.array([np.sin(5e-2 * k)]))
+                states.append(solver.integrate(1e-2 * k))
+            return np.array(states)
+
+        reference = simulate("DOP853", 1e-12, 1e-14)
+        for method, tolerance in [("RK23", 1e-7), ("RK45", 1e-7),
+                                  ("DOP853", 1e-7), ("Radau", 1e-7),
+                                  ("BDF", 1e-4), ("LSODA", 1e-4)]:
+            error = np.abs(simulate(method, 1e-6, 1e-9) - reference).max()
+            self.assertLess(error, tolerance, method)
+
+    def test_state(self):
+        solver, _, _ = self._simulate()
+        state = solver.get_state()
+        solver.set_input(np.zeros(1))
+        x = solver.integrate(solver.t)
+        solver.integrate(solver.t)
+        solver.set_state(state)
+        solver.set_input(np.zeros(1))
+        np.testing.assert_allclose(solver.integrate(solver.t), x)
+
+    def test_invalid_method(self):
+        settings = OrderedDict(pm.SolveIVP.public_settings)
+        settings.update({"Method": "Euler", "modules": {
+            "Model": BouncingBallModel(OrderedDict(
+                BouncingBallModel.public_settings))}})
+        with self.assertRaises(SolverException):
+            pm.SolveIVP(settings)
+
+
+class DampedPendulumModel(pm.SymbolicModel):
+    """
+    Damped pendulum driven by a torque, the output is the horizontal
+    position of the mass.
+    """
+    public_settings = OrderedDict([("initial state", [1, 0]),
+                                   ("g", 9.81),
+                                   ("l", 0.5),
+                                   ("d", 0.2)])
+
+    def symbolic_system(self):
+        phi, omega, tau, g, l, d = sp.symbols("phi, omega, tau, g, l, d")
+        f = [omega, -g / l * sp.sin(phi) - d * omega + tau]
+        return [phi, omega], [tau], f, [l * sp.sin(phi)]
+
+
+class SymbolicModelTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.model = DampedPendulumModel(OrderedDict(
+            DampedPendulumModel.public_settings))
+
+    def test_init(self):
+        self.assertEqual(self.model.settings["state_count"], 2)
+        self.assertEqual(self.model.settings["input_count"], 1)
+
+        # the generated functions are shared by all instances
+        model = DampedPendulumModel(OrderedDict(
+            DampedPendulumModel.public_settings))
+        self.assertIs(model._f, self.model._f)
+
+        settings = OrderedDict(DampedPendulumModel.public_settings)
+        del settings["d"]
+        with self.assertRaises(ValueError):
+            DampedPendulumModel(settings)
+
+    def test_functions(self):
+        x = np.array([0.3, -1.])
+        u = np.array([2.])
+        np.testing.assert_allclose(
+            self.model.state_function(0, x, (u,)),
+            [-1, -9.81 / 0.5 * np.sin(0.3) + 0.2 + 2])
+        np.testing.assert_allclose(self.model.calc_output(x),
+                                   [0.5 * np.sin(0.3)])
+
+        # compare the jacobian with central differences
+        jac = self.model.jacobian(0, x, (u,))
+        self.assertEqual(jac.shape, (2, 2))
+        eps = 1e-6
+        for idx in range(2):
+            dx = np.zeros(2)
+            dx[idx] = eps
+            np.testing.assert_allclose(
+                jac[:, idx],
+                (self.model.state_function(0, x + dx, (u,))
+                 - self.model.state_function(0, x - dx, (u,))) / (2 * eps),
+                atol=1e-8)
+
+    def test_sparsity(self):
+        np.testing.assert_array_equal(
+            self.model.jacobian_sparsity().toarray(), [[0, 1], [1, 1]])
+
+    def test_solvers(self):
+        # the jacobian is passed to implicit solvers
+        for solver_cls, mode in [(pm.ODEInt, {"Method": "bdf"}),
+                                 (pm.SolveIVP, {"Method": "BDF"})]:
+            settings = OrderedDict(solver_cls.public_settings)
+            settings.update(mode)
+            settings["modules"] = {"Model": self.model}
+            solver = solver_cls(settings)
+            for _ in range(100):
+                solver.set_input(np.zeros(1))
+                solver.integrate(solver.t)
+            self.assertGreater(
+                solver.get_statistics()["jacobian evaluations"], 0)
+
+
+class HeatModel(Model):
+    """
+    Heat equation on a rod, discretized by finite differences, with the
+    input as temperature of the left end.
+    """
+    public_settings = OrderedDict([("initial state", np.zeros(50)),
+                                   ("diffusivity", 1e-2)])
+
+    def __init__(self, settings):
+        settings.update(state_count=len(settings["initial state"]),
+                        input_count=1)
+        super().__init__(settings)
+        n = settings["state_count"]
+        self.operator = self._settings["diffusivity"] * (n + 1) ** 2 * (
+            sparse.diags([np.ones(n - 1), -2 * np.ones(n), np.ones(n - 1)],
+                         [-1, 0, 1], format="csr"))
+        self.boundary = np.zeros(n)
+        self.boundary[0] = self._settings["diffusivity"] * (n + 1) ** 2
+
+    def state_function(self, t, x, args):
+        return self.operator @ x + self.boundary * args[0][0]
+
+    def jacobian_sparsity(self):
+        return self.operator
+
+    def calc_output(self, input_vector):
+        return input_vector[-1]
+
+
+class HeatModelWithJacobian(HeatModel):
+
+    def jacobian(self, t, x, args):
+        return self.operator
+
+
+class SparseJacobianTestCase(unittest.TestCase):
+
+    def _simulate(self, solver_cls, model_cls=HeatModel, **settings):
+        model = model_cls(OrderedDict(HeatModel.public_settings))
+        solver_settings = OrderedDict(solver_cls.public_settings)
+        solver_settings.update(settings)
+        solver_settings.update({"step size": 1e-1,
+                                "modules": {"Model": model}})
+        solver = solver_cls(solver_settings)
+        for _ in range(20):
+            solver.set_input(np.ones(1))
+            x = solver.integrate(solver.t)
+        return solver, x
+
+    def _reference(self):
+        model = HeatModel(OrderedDict(HeatModel.public_settings))
+        return integrate.solve_ivp(
+            lambda t, x: model.state_function(t, x, (np.ones(1),)), (0, 2),
+            model.initial_state, method="BDF", rtol=1e-10, atol=1e-12).y[:, -1]
+
+    def test_ode_int(self):
+        reference = self._reference()
+        for mode, method in [("vode", "bdf"), ("lsoda", "adams")]:
+            for model_cls in [HeatModel, HeatModelWithJacobian]:
+                solver, x = self._simulate(pm.ODEInt, model_cls, Mode=mode,
+                                           Method=method)
+                integrator = solver._solver._integrator
+                self.assertEqual((integrator.ml, integrator.mu), (1, 1))
+                np.testing.assert_allclose(x, reference, atol=1e-5)
+
+        # the band is only used by methods that need the jacobian
+        solver, _ = self._simulate(pm.ODEInt)
+        self.assertIsNone(solver._solver._integrator.ml)
+
+        with self.assertRaises(SolverException):
+            self._simulate(pm.ODEInt, Mode="dopri5", lband=1)
+
+    def test_solve_ivp(self):
+        reference = self._reference()
+        for method in ["BDF", "Radau", "LSODA"]:
+            for model_cls in [HeatModel, HeatModelWithJacobian]:
+                solver, x = self._simulate(pm.SolveIVP, model_cls,
+                                           Method=method)
+                np.testing.assert_allclose(x, reference, atol=1e-5)
+                if method == "LSODA":
+                    self.assertEqual(
+                        (solver._jacobian_options["lband"],
+                         solver._jacobian_options["uband"]), (1, 1))
+                elif model_cls is HeatModel:
+                    self.assertEqual(
+                        solver._jacobian_options["jac_sparsity"].nnz, 148)
+                else:
+                    self.assertTrue(sparse.issparse(solver._solver.J))
+
+    def test_ensemble(self):
+        model = HeatModel(OrderedDict(HeatModel.public_settings))
+        members = [DecayModel(OrderedDict(DecayModel.public_settings)),
+                   DecayModel(OrderedDict(DecayModel.public_settings))]
+        pattern = pm.EnsembleModel(members).jacobian_sparsity()
+        np.testing.assert_array_equal(pattern.toarray(), np.eye(2))
+        pattern = pm.EnsembleModel([model, model]).jacobian_sparsity()
+        self.assertEqual(pattern.shape, (100, 100))
+        self.assertEqual(pattern.nnz, 2 * 148)
+
+
 class StateSpaceModulesTest(unittest.TestCase):
 
     def setUp(self):
@@ -276,6 +800,135 @@ class StateSpaceModulesTest(unittest.TestCase):
         eig_vals = np.linalg.eigvals(c.ss.A - c.ss.B @ c.feedback)
         np.testing.assert_array_almost_equal(settings["poles"], eig_vals)
 
+    def test_exact_discretization(self):
+        settings = OrderedDict(pm.LinearStateSpaceModel.public_settings)
+        settings.update({"config file": self.config_path,
+                         "initial state": np.array([2.])})
+        model = pm.LinearStateSpaceModel(settings)
+        solver_settings = OrderedDict(pm.ExactDiscretization.public_settings)
+        solver_settings.update({"step size": 0.5,
+                                "modules": {"Model": model}})
+        solver = pm.ExactDiscretization(solver_settings)
+
+        u = 3
+        solver.set_input(np.array([u]))
+        for _ in range(10):
+            x = solver.integrate(solver.t)
+        self.assertAlmostEqual(solver.t, 5)
+        self.assertEqual(solver.get_statistics(), {"steps": 10})
+
+        # step response of the first order lag around the operating point
+        a, b = self.sys.A[0, 0], self.sys.B[0, 0]
+        x_end = np.exp(5 * a) * 2 + (np.exp(5 * a) - 1) / a * b * (u - 1)
+        np.testing.assert_allclose(x, [x_end], rtol=1e-12)
+
+        # models without exact discretization are refused
+        solver_settings["modules"] = {"Model": DecayModel(OrderedDict(
+            DecayModel.public_settings))}
+        with self.assertRaises(SolverException):
+            pm.ExactDiscretization(solver_settings)
+
+
+class PIDControllerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.settings = OrderedDict(pm.PIDController.public_settings)
+        self.settings.update(Kp=3, Ki=2, Kd=0.1, output_limits=[-5, 5],
+                             input_state=[0, 2])
+        rng = np.random.default_rng(0)
+        self.times = np.arange(200) * 0.01
+        self.trajectory = rng.normal(size=(200, 2, 1))
+        self.states = rng.normal(size=(200, 3))
+
+    def _run(self, pid, times, trajectory, states):
+        return np.array([pid._control(t, yd, None, x).copy()
+                         for t, yd, x in zip(times, trajectory, states)])
+
+    def _reference(self, settings, tustin=False):
+        # straight-forward loop over the channels
+        lower, upper = settings["output_limits"]
+        e_old = np.zeros(2)
+        integral = np.zeros(2)
+        output = np.zeros(2)
+        outputs = [output.copy()]
+        for t, dt, yd, x in zip(self.times[1:], np.diff(self.times),
+                                self.trajectory[1:], self.states[1:]):
+            for i, state in enumerate(settings["input_state"]):
+                e = yd[i, 0] - x[state]
+                if tustin:
+                    integral[i] += dt / 2 * (e + e_old[i])
+                else:
+                    integral[i] += dt * e
+                integral[i] = min(max(integral[i], lower), upper)
+                output[i] = min(max(settings["Kp"] * e
+                                    + settings["Ki"] * integral[i]
+                                    + settings["Kd"] * (e - e_old[i]) / dt,
+                                    lower), upper)
+                e_old[i] = e
+            outputs.append(output.copy())
+        return np.array(outputs)
+
+    def test_backward_euler(self):
+        pid = pm.PIDController(self.settings)
+        out = self._run(pid, self.times, self.trajectory, self.states)
+        np.testing.assert_allclose(out, self._reference(self.settings),
+                                   rtol=1e-9, atol=1e-12)
+
+    def test_tustin(self):
+        self.settings["discretization"] = "Tustin"
+        pid = pm.PIDController(self.settings)
+        out = self._run(pid, self.times, self.trajectory, self.states)
+        np.testing.assert_allclose(out, self._reference(self.settings,
+                                                        tustin=True),
+                                   rtol=1e-9, atol=1e-12)
+
+        self.settings["discretization"] = "forward Euler"
+        with self.assertRaises(ControllerException):
+            pm.PIDController(self.settings)
+
+    def test_instances(self):
+        first = pm.PIDController(self.settings)
+        self._run(first, self.times, self.trajectory, self.states)
+
+        # the time of the last call belongs to the instance
+        second = pm.PIDController(self.settings)
+        self.assertIsNone(second.last_time)
+        out = self._run(second, self.times, self.trajectory, self.states)
+        np.testing.assert_allclose(out, self._reference(self.settings),
+                                   rtol=1e-9, atol=1e-12)
+
+    def test_batch(self):
+        gains = [1, 3, 10]
+        settings = OrderedDict(self.settings, Kp=np.array(gains))
+        pid = pm.PIDController(settings)
+        self.assertEqual(pid.output.shape, (3, 2))
+
+        trajectory = np.repeat(self.trajectory[:, None], 3, axis=1)
+        states = self.states[:, None] + np.arange(3)[:, None]
+        out = self._run(pid, self.times, trajectory, states)
+        for idx, gain in enumerate(gains):
+            member = pm.PIDController(OrderedDict(self.settings, Kp=gain))
+            np.testing.assert_allclose(
+                out[:, idx],
+                self._run(member, self.times, self.trajectory, states[:, idx]),
+                rtol=1e-12, atol=1e-12)
+
+    def test_harmonic_trajectory(self):
+        # single output trajectories return a 1-D array of derivatives
+        settings = OrderedDict(pm.HarmonicTrajectory.public_settings)
+        settings.update(differential_order=0)
+        trajectory = pm.HarmonicTrajectory(settings)
+        values = [trajectory.calc_output({"time": t}) for t in self.times]
+        self.assertEqual(np.shape(values[0]), (1,))
+
+        self.settings.update(input_state=[0])
+        out = self._run(pm.PIDController(self.settings), self.times, values,
+                        self.states)
+        reference = self._run(pm.PIDController(self.settings), self.times,
+                              np.reshape(values, (-1, 1, 1)), self.states)
+        self.assertEqual(out.shape, (200, 1))
+        np.testing.assert_array_equal(out, reference)
+
 
 class ModelInputLimiterTestCase(unittest.TestCase):
 
@@ -0,0 +1,930 @@
+"""
+test_simulation_core
+----------------------------------
+
+Tests for the headless simulation core.
+"""
+
+import itertools
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+import unittest
+from collections import OrderedDict
+
+import numpy as np
+import yaml
+from scipy.integrate import ode
+
+import pymoskito as pm
+from pymoskito.simulation_core import (
+    RealTimePacer, Simulator, SignalBuffer, format_profile, format_realtime,
+    get_module_settings, setup_simulation_modules
+)
+from pymoskito.simulation_runner import main, simulate
+
+
+class FirstOrderModel(pm.Model):
+    """
+    Simple first order lag with time constant `T` .
+    """
+    public_settings = OrderedDict([("initial state", [1]),
+                                   ("T", 1)])
+
+    def __init__(self, settings):
+        settings.update(state_count=1)
+        settings.update(input_count=1)
+        pm.Model.__init__(self, settings)
+
+    def state_function(self, t, x, args):
+        return (-x + np.squeeze(args[0])) / self._settings["T"]
+
+    def calc_output(self, input_vector):
+        return input_vector[..., 0]
+
+
+class BatchFirstOrderModel(FirstOrderModel):
+    """
+    First order lag that evaluates whole ensembles at once.
+    """
+    supports_batch = True
+
+    def state_function(self, t, x, args):
+        u = np.reshape(args[0], np.shape(x))
+        return (-x + u) / np.expand_dims(self._settings["T"], -1)
+
+
+class VanDerPolModel(pm.Model):
+    """
+    Van der Pol oscillator with the input as additive force, which gets stiff
+    for large `mu` .
+    """
+    public_settings = OrderedDict([("initial state", [2, 0]),
+                                   ("mu", 1)])
+
+    def __init__(self, settings):
+        settings.update(state_count=2)
+        settings.update(input_count=1)
+        pm.Model.__init__(self, settings)
+
+    def state_function(self, t, x, args):
+        mu = self._settings["mu"]
+        return np.array([x[1],
+                         mu * (1 - x[0] ** 2) * x[1] - x[0]
+                         + np.squeeze(args[0])])
+
+    def calc_output(self, input_vector):
+        return input_vector[..., 0]
+
+
+pm.register_simulation_module(pm.Model, FirstOrderModel)
+pm.register_simulation_module(pm.Model, BatchFirstOrderModel)
+pm.register_simulation_module(pm.Model, VanDerPolModel)
+
+
+def _count_calls(func, calls):
+    def wrapper(*args, **kwargs):
+        calls.append(args)
+        return func(*args, **kwargs)
+    return wrapper
+
+
+class FakeClock(object):
+    """
+    Wall clock that only advances when sleeping.
+    """
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, duration):
+        self.now += duration
+
+
+def _delay(module, clock, costs):
+    """
+    Let the evaluations of `module` take the given durations on `clock` ,
+    one after another.
+    """
+    costs = itertools.cycle(costs)
+    calc_output = module.calc_output
+
+    def wrapper(input_vector):
+        clock.sleep(next(costs))
+        return calc_output(input_vector)
+
+    module.calc_output = wrapper
+
+
+def get_regime(name="free", clear=True):
+    return {
+        "Name": name,
+        "clear previous": clear,
+        "Model": {"type": "FirstOrderModel"},
+        "Solver": {"type": "ODEInt", "end time": 1},
+        "Trajectory": {"type": "Setpoint", "Setpoint": [0]},
+        "Feedforward": {"type": "Feedthrough"},
+    }
+
+
+class TestModuleSettings(unittest.TestCase):
+
+    def test_defaults(self):
+        settings = get_module_settings(get_regime())
+        self.assertEqual(list(settings.keys()),
+                         ["Model", "Solver", "Trajectory", "Feedforward"])
+        self.assertEqual(settings["Model"]["type"], "FirstOrderModel")
+        self.assertEqual(settings["Model"]["T"], 1)
+        self.assertEqual(settings["Solver"]["end time"], 1)
+        self.assertEqual(settings["Solver"]["step size"],
+                         pm.ODEInt.public_settings["step size"])
+
+    def test_defaults_unchanged(self):
+        settings = get_module_settings(get_regime())
+        settings["Model"]["initial state"][0] = 5
+        self.assertEqual(FirstOrderModel.public_settings["initial state"], [1])
+
+    def test_invalid(self):
+        reg = get_regime()
+        reg["Model"]["foo"] = 3
+        with self.assertRaises(pm.SimulationException):
+            get_module_settings(reg)
+
+        reg = get_regime()
+        reg["Model"]["type"] = "NoSuchModel"
+        with self.assertRaises(pm.SimulationException):
+            get_module_settings(reg)
+
+        reg = get_regime()
+        reg["Modell"] = reg.pop("Model")
+        with self.assertRaises(pm.SimulationException):
+            get_module_settings(reg)
+
+    def test_clear_previous(self):
+        first = get_module_settings(get_regime())
+        second = {"Name": "second",
+                  "clear previous": False,
+                  "Model": {"type": "FirstOrderModel", "T": 2}}
+        settings = get_module_settings(second, first)
+        self.assertEqual(settings["Model"]["T"], 2)
+        self.assertIn("Trajectory", settings)
+
+        second["clear previous"] = True
+        settings = get_module_settings(second, first)
+        self.assertNotIn("Trajectory", settings)
+
+    def test_setup(self):
+        sim_settings, modules = setup_simulation_modules(
+            get_module_settings(get_regime()))
+        self.assertEqual(sim_settings.end_time, 1)
+        self.assertIsInstance(modules["Model"], FirstOrderModel)
+        self.assertIsInstance(modules["Solver"], pm.ODEInt)
+
+        # Model and Solver are mandatory
+        settings = get_module_settings(get_regime())
+        del settings["Solver"]
+        with self.assertRaises(pm.SimulationException):
+            setup_simulation_modules(settings)
+
+
+class TestSignalBuffer(unittest.TestCase):
+
+    def test_append(self):
+        buf = SignalBuffer(3)
+        self.assertEqual(buf.data.shape, (0,))
+
+        values = [np.array([[i, 2 * i]]) for i in range(10)]
+        for val in values:
+            buf.append(val)
+        self.assertEqual(len(buf), 10)
+        np.testing.assert_array_equal(buf.data, np.array(values))
+
+        # data is a view and no copy
+        self.assertFalse(buf.data.flags.owndata)
+
+    def test_copy(self):
+        buf = SignalBuffer(3)
+        val = np.zeros(2)
+        buf.append(val)
+        val[0] = 1
+        buf.append(val)
+        np.testing.assert_array_equal(buf.data, [[0, 0], [1, 0]])
+
+    def test_promotion(self):
+        buf = SignalBuffer(3)
+        buf.append(1)
+        buf.append(2.5)
+        np.testing.assert_array_equal(buf.data, [1, 2.5])
+
+
+class TestSimulator(unittest.TestCase):
+
+    def test_run(self):
+        changes = []
+        sim_settings, modules = setup_simulation_modules(
+            get_module_settings(get_regime()))
+        sim = Simulator(sim_settings, modules, callback=changes.append)
+        data = sim.run()
+
+        self.assertTrue(data["results"]["finished"])
+        self.assertEqual(changes[0].type, "start")
+        self.assertEqual(changes[-1].type, "finish")
+        self.assertIs(changes[-1].data, data)
+
+        t = data["results"]["time"]
+        x = data["results"]["Solver"]
+        self.assertEqual(x.shape, (len(t), 1))
+        # preallocated storage should suffice
+        self.assertLessEqual(len(t), sim._storage_capacity)
+        self.assertIs(x.base, sim._storage["Solver"]._data)
+        np.testing.assert_allclose(x[:, 0], np.exp(-t), rtol=1e-4)
+
+    def test_trajectory_table(self):
+        regime = get_regime()
+        regime["Trajectory"] = {"type": "HarmonicTrajectory"}
+        results = []
+        call_counts = []
+        calls = []
+        for table_size in [0, Simulator.max_table_size]:
+            sim_settings, modules = setup_simulation_modules(
+                get_module_settings(regime))
+            trajectory = modules["Trajectory"]
+            trajectory.calc_output = _count_calls(trajectory.calc_output,
+                                                  calls)
+            sim = Simulator(sim_settings, modules)
+            sim.max_table_size = table_size
+            calls.clear()
+            results.append(sim.run()["results"])
+            call_counts.append(len(calls))
+
+        # the table is served without evaluating the trajectory again
+        self.assertGreater(call_counts[0], len(results[0]["time"]))
+        self.assertEqual(call_counts[1], 0)
+        for key in ["time", "Trajectory", "Solver"]:
+            np.testing.assert_array_equal(results[0][key], results[1][key])
+
+        # the table rows are handed out as new arrays, just like the values
+        # computed in every step
+        sim_settings, modules = setup_simulation_modules(
+            get_module_settings(regime))
+        lookup = Simulator(sim_settings, modules)._tabulate(
+            modules["Trajectory"])
+        first = lookup({"time": 0})
+        self.assertTrue(first.flags.writeable)
+        self.assertIsNot(lookup({"time": 0}), first)
+
+        # trajectories without batch evaluation are not tabulated
+        trajectory = modules["Trajectory"]
+        trajectory.desired_values_batch = \
+            pm.Trajectory.desired_values_batch.__get__(trajectory)
+        self.assertIsNone(Simulator(sim_settings, modules)._tabulate(
+            trajectory))
+
+    def test_profile(self):
+        data = pm.simulate_regime(get_regime())
+        self.assertNotIn("profile", data)
+
+        sim_settings, modules = setup_simulation_modules(
+            get_module_settings(get_regime()))
+        data = Simulator(sim_settings, modules, profile=True).run()
+        profile = data["profile"]
+        self.assertEqual(list(profile["modules"].keys()),
+                         ["Model", "Trajectory", "Feedforward", "Solver"])
+        steps = profile["modules"]["Model"]["count"]
+        self.assertGreaterEqual(steps, len(data["results"]["time"]))
+        for stats in profile["modules"].values():
+            self.assertEqual(stats["count"], steps)
+            self.assertAlmostEqual(stats["mean"], stats["total"] / steps)
+            self.assertLessEqual(stats["max"], stats["total"])
+        self.assertGreater(profile["wall time"],
+                           sum(stats["total"]
+                               for stats in profile["modules"].values()))
+
+        solver_stats = profile["solver"]
+        self.assertGreaterEqual(solver_stats["steps"], 1)
+        self.assertGreaterEqual(solver_stats["rhs evaluations"],
+                                solver_stats["steps"])
+        self.assertIn("rejected steps", solver_stats)
+
+        text = format_profile(profile)
+        for name in profile["modules"]:
+            self.assertIn(name, text)
+        self.assertIn("rhs evaluations", text)
+
+    def test_solver_statistics(self):
+        for mode in ["vode", "lsoda", "dopri5"]:
+            regime = get_regime()
+            regime["Solver"]["Mode"] = mode
+            sim_settings, modules = setup_simulation_modules(
+                get_module_settings(regime))
+            data = Simulator(sim_settings, modules, profile=True).run()
+            stats = data["profile"]["solver"]
+            self.assertGreater(stats["rhs evaluations"], 0)
+            self.assertGreaterEqual(stats["steps"], 1)
+
+    def test_solver_rejected_steps(self):
+        regime = get_regime()
+        regime["Model"] = {"type": "VanDerPolModel", "mu": 10}
+        regime["Solver"].update({"Method": "bdf", "step size": 1,
+                                 "end time": 50})
+        sim_settings, modules = setup_simulation_modules(
+            get_module_settings(regime))
+        solver = modules["Solver"]
+        args = (np.zeros(1),)
+        solver.set_input(*args)
+
+        reference = ode(modules["Model"].state_function)
+        reference.set_integrator("vode", method="bdf", rtol=1e-6, atol=1e-9,
+                                 max_step=1)
+        reference.set_initial_value([2, 0], 0)
+        reference.set_f_params(args)
+
+        for t in range(50):
+            solver.integrate(t)
+            reference.integrate(t + 1)
+
+        # convergence failures (NCFN) and error test failures (NETF) of VODE
+        iwork = reference._integrator.iwork
+        stats = solver.get_statistics()
+        self.assertEqual(stats["steps"], iwork[10])
+        self.assertEqual(stats["rejected steps"], iwork[20] + iwork[21])
+        self.assertGreater(iwork[20], 0)
+        self.assertGreater(iwork[21], 0)
+
+    def test_tick_divider(self):
+        regime = get_regime()
+        regime["Feedforward"]["tick divider"] = 5
+        sim_settings, modules = setup_simulation_modules(
+            get_module_settings(regime))
+        sim = Simulator(sim_settings, modules, profile=True)
+        data = sim.run()
+        counts = {name: stats["count"]
+                  for name, stats in data["profile"]["modules"].items()}
+        self.assertEqual(counts["Feedforward"],
+                         int(np.ceil(counts["Solver"] / 5)))
+        self.assertEqual([step[0] for step in sim._plan],
+                         ["Trajectory", "Feedforward", "Solver"])
+        self.assertEqual(sim._model_input_source, "Feedforward")
+
+    def test_missing_model_input(self):
+        regime = get_regime()
+        del regime["Feedforward"]
+        changes = []
+        sim_settings, modules = setup_simulation_modules(
+            get_module_settings(regime))
+        data = Simulator(sim_settings, modules,
+                         callback=changes.append).run()
+        self.assertFalse(data["results"]["finished"])
+        self.assertEqual(changes[-1].type, "abort")
+        self.assertEqual(str(changes[-1].info[1]), "No model input given.")
+
+    def test_dense_output(self):
+        regime = get_regime()
+        regime["Solver"]["end time"] = 2
+        reference = pm.simulate_regime(regime)
+
+        results = {}
+        for step_size in [1e-3, 0.1]:
+            regime["Solver"].update({"type": "SolveIVP", "rTol": 1e-8,
+                                     "step size": step_size})
+            sim_settings, modules = setup_simulation_modules(
+                get_module_settings(regime))
+            data = Simulator(sim_settings, modules, profile=True).run()
+            self.assertTrue(data["results"]["finished"])
+
+            # values are recorded at the exact instants of the measure rate
+            t = data["results"]["time"]
+            np.testing.assert_allclose(t, np.arange(len(t)) / 500)
+            self.assertAlmostEqual(t[-1], 2)
+            np.testing.assert_allclose(data["results"]["Solver"][:, 0],
+                                       np.exp(-t), rtol=1e-7)
+            np.testing.assert_array_equal(data["results"]["Model"],
+                                          data["results"]["Solver"])
+
+            # the model output is computed in every step and for every
+            # recorded instant
+            counts = {name: stats["count"]
+                      for name, stats in data["profile"]["modules"].items()}
+            self.assertEqual(counts["Model"], counts["Solver"] + len(t))
+            results[step_size] = data
+
+        # the solver takes far less steps than the simulation records, as
+        # long as the input does not change, independent of the step size
+        for data in results.values():
+            self.assertLess(data["profile"]["solver"]["rhs evaluations"],
+                            len(reference["results"]["time"]))
+
+    def test_stop(self):
+        changes = []
+
+        def _callback(change):
+            changes.append(change)
+            if change.type == "start":
+                sim.stop()
+
+        sim_settings, modules = setup_simulation_modules(
+            get_module_settings(get_regime()))
+        sim = Simulator(sim_settings, modules, callback=_callback)
+        data = sim.run()
+        self.assertFalse(data["results"]["finished"])
+        self.assertEqual(changes[-1].type, "abort")
+        self.assertEqual(changes[-1].info, "Simulation aborted by user")
+
+    def _paced_run(self, factor, divider, costs):
+        regime = get_regime()
+        regime["Solver"]["end time"] = 0.1
+        regime["Feedforward"]["tick divider"] = divider
+        sim_settings, modules = setup_simulation_modules(
+            get_module_settings(regime))
+        clock = FakeClock()
+        _delay(modules["Feedforward"], clock, costs)
+        pacer = RealTimePacer(factor, sim_settings.step_size, clock,
+                              clock.sleep)
+        data = Simulator(sim_settings, modules, pacer=pacer).run()
+        self.assertTrue(data["results"]["finished"])
+        return data["realtime"], clock
+
+    def test_realtime(self):
+        # every other evaluation of the feedforward takes 0.2 ms
+        realtime, clock = self._paced_run(2, 1, [0, 2e-4])
+        self.assertEqual(realtime["factor"], 2)
+        self.assertEqual(realtime["late steps"], 0)
+        self.assertEqual(list(realtime["modules"].keys()),
+                         ["Trajectory", "Feedforward", "Solver"])
+        # 101 steps, released every 0.5 ms
+        self.assertAlmostEqual(clock.now, 100 * 5e-4)
+
+        for name, lateness in [("Trajectory", -5e-4),
+                               ("Feedforward", -3e-4),
+                               ("Solver", -3e-4)]:
+            stats = realtime["modules"][name]
+            self.assertEqual(stats["ticks"], 101)
+            self.assertAlmostEqual(stats["period"], 5e-4)
+            self.assertEqual(stats["missed deadlines"], 0)
+            self.assertAlmostEqual(stats["max lateness"], lateness)
+
+        for name in ["Trajectory", "Feedforward"]:
+            stats = realtime["modules"][name]
+            self.assertEqual(stats["mean latency"], 0)
+            self.assertEqual(stats["max latency"], 0)
+            self.assertEqual(stats["jitter"], 0)
+
+        # the solver waits for the feedforward in 50 of 101 steps
+        stats = realtime["modules"]["Solver"]
+        share = 50 / 101
+        self.assertAlmostEqual(stats["mean latency"], share * 2e-4)
+        self.assertAlmostEqual(stats["max latency"], 2e-4)
+        self.assertAlmostEqual(stats["jitter"],
+                               np.sqrt(share * (1 - share)) * 2e-4)
+
+        text = format_realtime(realtime)
+        for name in realtime["modules"]:
+            self.assertIn(name, text)
+
+        regime = get_regime()
+        sim_settings, modules = setup_simulation_modules(
+            get_module_settings(regime))
+        with self.assertRaises(ValueError):
+            Simulator(sim_settings, modules, realtime_factor=0)
+
+    def test_realtime_deadlines(self):
+        # the feedforward takes 1.5 ms, longer than a single step
+        realtime, clock = self._paced_run(1, 1, [1.5e-3])
+        self.assertAlmostEqual(clock.now, 101 * 1.5e-3)
+        # the simulation falls behind from the second step on
+        self.assertEqual(realtime["late steps"], 100)
+        stats = realtime["modules"]["Feedforward"]
+        self.assertAlmostEqual(stats["period"], 1e-3)
+        self.assertEqual(stats["missed deadlines"], 101)
+        self.assertAlmostEqual(stats["max lateness"], 101 * 5e-4)
+        self.assertAlmostEqual(stats["max latency"], 100 * 5e-4)
+        # the trajectory is on time until the backlog exceeds a step
+        stats = realtime["modules"]["Trajectory"]
+        self.assertEqual(stats["missed deadlines"], 98)
+        self.assertAlmostEqual(stats["max lateness"], 100 * 5e-4 - 1e-3)
+
+        # evaluated every 20 steps, the feedforward meets its deadline
+        realtime, clock = self._paced_run(1, 20, [1.5e-3])
+        self.assertAlmostEqual(clock.now, 0.1 + 1.5e-3)
+        stats = realtime["modules"]["Feedforward"]
+        self.assertEqual(stats["ticks"], 6)
+        self.assertAlmostEqual(stats["period"], 20e-3)
+        self.assertEqual(stats["missed deadlines"], 0)
+        self.assertAlmostEqual(stats["max lateness"], 1.5e-3 - 20e-3)
+        self.assertEqual(stats["max latency"], 0)
+        # but the solver misses its deadline in these steps and the step
+        # after them is released late, except for the last one
+        stats = realtime["modules"]["Solver"]
+        self.assertEqual(stats["missed deadlines"], 6)
+        self.assertAlmostEqual(stats["max lateness"], 5e-4)
+        self.assertAlmostEqual(stats["max latency"], 1.5e-3)
+        self.assertEqual(realtime["late steps"], 5)
+
+
+class TestResultStream(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.out_dir = self.tmp_dir.name
+        self.reference = pm.simulate_regime(get_regime())
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _simulator(self, regime, callback=None):
+        sim_settings, modules = setup_simulation_modules(
+            get_module_settings(regime))
+        stream = pm.open_result_stream(self.out_dir, regime["Name"], 100)
+        return Simulator(sim_settings, modules, callback=callback,
+                         stream=stream)
+
+    def test_stream(self):
+        sim = self._simulator(get_regime())
+        data = sim.run()
+        self.assertTrue(data["results"]["finished"])
+        self.assertNotIn("Solver", data["results"])
+
+        # memory is limited to a single chunk
+        self.assertEqual(sim._storage["Solver"]._data.shape[0], 100)
+
+        streamed = pm.load_result(data["result file"])
+        self.assertEqual(streamed["regime name"], "free")
+        self.assertTrue(streamed["results"]["finished"])
+        self.assertEqual(streamed["modules"]["Model"]["T"], 1)
+        for key in ["time", "Model", "Solver", "Trajectory"]:
+            np.testing.assert_array_equal(streamed["results"][key],
+                                          self.reference["results"][key])
+
+    def test_abort(self):
+        def _callback(change):
+            if change.type == "time":
+                sim.stop()
+
+        regime = get_regime()
+        regime["Solver"]["end time"] = 3
+        sim = self._simulator(regime, _callback)
+        data = sim.run()
+        self.assertFalse(data["results"]["finished"])
+
+        streamed = pm.load_result(data["result file"])
+        self.assertFalse(streamed["results"]["finished"])
+        t = streamed["results"]["time"]
+        self.assertGreater(t[-1], 1)
+        self.assertEqual(streamed["simulation"]["end time"], t[-1])
+        np.testing.assert_array_equal(streamed["results"]["Solver"],
+                                      self.reference["results"]["Solver"]
+                                      [:len(t)])
+
+    def test_truncated(self):
+        data = self._simulator(get_regime()).run()
+        with open(data["result file"], "rb") as f:
+            content = f.read()
+
+        # simulate a crash while the last chunk was written
+        file_name = os.path.join(self.out_dir, "crashed.pmr")
+        with open(file_name, "wb") as f:
+            f.write(content[:-1000])
+
+        streamed = pm.load_result(file_name)
+        self.assertFalse(streamed["results"]["finished"])
+        self.assertEqual(len(streamed["results"]["time"]) % 100, 0)
+        np.testing.assert_array_equal(
+            streamed["results"]["time"],
+            self.reference["results"]["time"][
+                :len(streamed["results"]["time"])])
+
+    def test_batch(self):
+        files, success = pm.run_regimes([get_regime("a"), get_regime("b")],
+                                        self.out_dir, chunk_size=100)
+        self.assertTrue(success)
+        for file_name, name in zip(files, ["a", "b"]):
+            data = pm.load_result(file_name)
+            self.assertEqual(data["regime name"], name)
+            np.testing.assert_array_equal(data["results"]["Solver"],
+                                          self.reference["results"]["Solver"])
+
+        with self.assertRaises(ValueError):
+            pm.run_regimes([get_regime()], chunk_size=100)
+
+        # regular result files are supported as well
+        file_name = pm.save_result(self.reference, self.out_dir)
+        self.assertTrue(pm.load_result(file_name)["results"]["finished"])
+
+
+class TestSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.out_dir = self.tmp_dir.name
+        self.regime = get_regime()
+        self.regime["Solver"]["end time"] = 3
+        self.reference = pm.simulate_regime(self.regime)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _interrupted_run(self, stream=None):
+        def _callback(change):
+            if change.type == "time":
+                sim.stop()
+
+        sim_settings, modules = setup_simulation_modules(
+            get_module_settings(self.regime))
+        sim = Simulator(sim_settings, modules, callback=_callback,
+                        stream=stream)
+        data = sim.run()
+        self.assertFalse(data["results"]["finished"])
+        return sim
+
+    def _compare(self, data):
+        self.assertTrue(data["results"]["finished"])
+        np.testing.assert_array_equal(data["results"]["time"],
+                                      self.reference["results"]["time"])
+        # the integrator restarts at the restored state
+        np.testing.assert_allclose(data["results"]["Solver"],
+                                   self.reference["results"]["Solver"],
+                                   rtol=1e-5)
+
+    def test_resume(self):
+        file_name = os.path.join(self.out_dir, "snapshot.pms")
+        snapshot = self._interrupted_run().snapshot(file_name)
+        self.assertEqual(snapshot["simulation"]["end time"], 3)
+        self.assertGreater(len(snapshot["storage"]["time"]), 0)
+
+        data = Simulator.restore(file_name).run()
+        self._compare(data)
+
+        data = pm.resume_simulation(file_name, "resumed")
+        self.assertEqual(data["regime name"], "resumed")
+        self._compare(data)
+
+    def test_resume_dense(self):
+        self.regime["Solver"].update({"type": "SolveIVP", "step size": 0.01})
+        self.reference = pm.simulate_regime(self.regime)
+        snapshot = self._interrupted_run().snapshot()
+        self.assertGreater(snapshot["record_index"], 0)
+        self._compare(Simulator.restore(snapshot).run())
+
+    def test_resume_stream(self):
+        stream = pm.open_result_stream(self.out_dir, "streamed", 100)
+        snapshot = self._interrupted_run(stream).snapshot()
+        self.assertEqual(snapshot["storage"], {})
+
+        data = pm.resume_simulation(snapshot)
+        self.assertEqual(data["result file"], stream.name)
+        self._compare(pm.load_result(stream.name))
+
+    def test_branch(self):
+        snapshot = self._interrupted_run().snapshot()
+        t_branch = snapshot["current_outputs"]["time"]
+
+        settings = get_module_settings(self.regime)
+        settings["Trajectory"]["Setpoint"] = [1]
+        _, modules = setup_simulation_modules(settings)
+        data = Simulator.restore(snapshot, modules=modules).run()
+
+        t = data["results"]["time"]
+        x = data["results"]["Solver"]
+        x_ref = self.reference["results"]["Solver"]
+        np.testing.assert_array_equal(x[t <= t_branch], x_ref[t <= t_branch])
+        self.assertGreater(x[-1, 0], 0.5)
+
+    def test_module_states(self):
+        pid = pm.PIDController(OrderedDict(pm.PIDController.public_settings))
+        pid.integral_old[0] = 3
+        pid.last_time = 1.5
+        state = pid.get_state()
+        pid.integral_old[0] = 0
+
+        other = pm.PIDController(
+            OrderedDict(pm.PIDController.public_settings))
+        other.set_state(pickle.loads(pickle.dumps(state)))
+        self.assertEqual(other.integral_old[0], 3)
+        self.assertEqual(other.last_time, 1.5)
+
+        settings = OrderedDict(pm.DeadTimeSensor.public_settings)
+        settings["delay"] = 3
+        sensor = pm.DeadTimeSensor(settings)
+        for val in range(4):
+            sensor._measure(np.array([val], dtype=float))
+        state = sensor.get_state()
+
+        other = pm.DeadTimeSensor(settings)
+        other.set_state(state)
+        np.testing.assert_array_equal(other._measure(np.array([4.])), [1])
+        np.testing.assert_array_equal(sensor._measure(np.array([4.])), [1])
+
+
+class TestEnsemble(unittest.TestCase):
+
+    def setUp(self):
+        self.ensemble = {"Model": {"T": [1, 2, 4]}}
+
+    def test_invalid(self):
+        settings = get_module_settings(get_regime())
+        for ensemble in [{"Model": {"T": [1, 2], "initial state": [[1]]}},
+                         {"Model": {"foo": [1, 2]}},
+                         {"Controller": {"poles": [[-1], [-2]]}},
+                         {"Solver": {"step size": [1e-3, 1e-2]}},
+                         {"Model": {"T": []}}]:
+            with self.assertRaises(pm.SimulationException):
+                pm.get_ensemble_settings(settings, ensemble)
+
+    def _simulate(self, model_type):
+        regime = get_regime()
+        regime["Model"]["type"] = model_type
+        regime["ensemble"] = self.ensemble
+        return pm.simulate_regime(regime)
+
+    def test_member_loop(self):
+        outputs = self._simulate("FirstOrderModel")
+        self.assertEqual(len(outputs), 3)
+        for idx, (out, T) in enumerate(zip(outputs, [1, 2, 4])):
+            self.assertEqual(out["regime name"], "free_{}".format(idx))
+            self.assertEqual(out["modules"]["Model"]["T"], T)
+            self.assertTrue(out["results"]["finished"])
+
+            t = out["results"]["time"]
+            x = out["results"]["Solver"]
+            self.assertEqual(x.shape, (len(t), 1))
+            np.testing.assert_allclose(x[:, 0], np.exp(-t / T), rtol=1e-4)
+
+    def test_batch(self):
+        settings, modules = pm.setup_ensemble_modules(
+            get_module_settings(get_regime("batch")), self.ensemble)
+        self.assertIsNone(modules["Model"].batch_module)
+
+        regime = get_regime()
+        regime["Model"]["type"] = "BatchFirstOrderModel"
+        settings, modules = pm.setup_ensemble_modules(
+            get_module_settings(regime), self.ensemble)
+        batch_model = modules["Model"].batch_module
+        np.testing.assert_array_equal(batch_model.settings["T"], [1, 2, 4])
+
+        loop_outputs = self._simulate("FirstOrderModel")
+        batch_outputs = self._simulate("BatchFirstOrderModel")
+        for loop, batch in zip(loop_outputs, batch_outputs):
+            self.assertEqual(loop["modules"]["Model"]["T"],
+                             batch["modules"]["Model"]["T"])
+            np.testing.assert_allclose(loop["results"]["Solver"],
+                                       batch["results"]["Solver"])
+
+    def test_batch_run(self):
+        regimes = [get_regime("single"), get_regime("sweep")]
+        regimes[1]["ensemble"] = self.ensemble
+        results, success = pm.run_regimes(regimes)
+        self.assertTrue(success)
+        self.assertEqual([res["regime name"] for res in results],
+                         ["single", "sweep_0", "sweep_1", "sweep_2"])
+        np.testing.assert_allclose(results[0]["results"]["Solver"],
+                                   results[1]["results"]["Solver"])
+
+    def test_fixed_step(self):
+        # without step size control the members are integrated exactly as in
+        # separate runs
+        for model_type in ["FirstOrderModel", "BatchFirstOrderModel"]:
+            regime = get_regime("sweep")
+            regime["Model"]["type"] = model_type
+            regime["Solver"]["type"] = "RungeKutta4"
+            outputs = pm.simulate_ensemble(get_module_settings(regime),
+                                           self.ensemble, "sweep")
+            for idx, T in enumerate(self.ensemble["Model"]["T"]):
+                single = get_regime("single")
+                single["Model"]["T"] = T
+                single["Solver"]["type"] = "RungeKutta4"
+                data = pm.simulate_regime(single)
+                np.testing.assert_allclose(outputs[idx]["results"]["Solver"],
+                                           data["results"]["Solver"],
+                                           rtol=1e-14)
+
+
+class TestSimulationRunner(unittest.TestCase):
+
+    def test_headless_import(self):
+        # the runner must not load the graphical dependencies
+        code = ("import sys\n"
+                "import pymoskito.simulation_runner\n"
+                "print(sorted(name for name in ('PyQt5', 'matplotlib', "
+                "'pyqtgraph') if name in sys.modules))")
+        output = subprocess.run([sys.executable, "-c", code],
+                                capture_output=True, text=True, check=True)
+        self.assertEqual(output.stdout.strip().splitlines()[-1], "[]")
+
+    def test_simulate_regime(self):
+        data = pm.simulate_regime(get_regime())
+        self.assertEqual(data["regime name"], "free")
+        self.assertTrue(data["results"]["finished"])
+        self.assertEqual(data["modules"]["Model"]["type"], "FirstOrderModel")
+
+    def test_run_regimes(self):
+        regimes = [get_regime("a"), get_regime("b")]
+        regimes[1]["Model"]["T"] = 2
+
+        results, success = pm.run_regimes(regimes)
+        self.assertTrue(success)
+        self.assertEqual([res["regime name"] for res in results], ["a", "b"])
+
+        with tempfile.TemporaryDirectory() as out_dir:
+            files, success = pm.run_regimes(regimes, out_dir)
+            self.assertTrue(success)
+            self.assertEqual(len(files), 2)
+            with open(files[1], "rb") as f:
+                data = pickle.load(f)
+            self.assertEqual(data["regime name"], "b")
+            np.testing.assert_array_equal(data["results"]["Solver"],
+                                          results[1]["results"]["Solver"])
+
+    def test_main_regime_filter(self):
+        regimes = [get_regime("a"),
+                   {"Name": "b", "clear previous": False,
+                    "Trajectory": {"type": "Setpoint", "Setpoint": [1]}}]
+        regimes[0]["Model"]["T"] = 2
+        with tempfile.TemporaryDirectory() as out_dir:
+            file_name = os.path.join(out_dir, "regimes.sreg")
+            with open(file_name, "w") as f:
+                yaml.dump(regimes, f)
+            self.assertEqual(main([file_name, "-r", "b", "-o", out_dir]), 0)
+            files = [name for name in os.listdir(out_dir)
+                     if name.endswith(".pmr")]
+            self.assertEqual(len(files), 1)
+            data = pm.load_result(os.path.join(out_dir, files[0]))
+
+        # the selected regime keeps the settings of the one before
+        self.assertEqual(data["regime name"], "b")
+        self.assertEqual(data["modules"]["Model"]["T"], 2)
+        self.assertEqual(data["modules"]["Trajectory"]["Setpoint"], [1])
+
+    def test_parallel(self):
+        regimes = [get_regime(str(idx)) for idx in range(4)]
+        for idx, reg in enumerate(regimes):
+            reg["Model"]["T"] = idx + 1
+        regimes[2]["Model"]["foo"] = 12
+
+        progress = []
+        results = list(pm.execute_regimes(
+            regimes, workers=2,
+            progress=lambda done, total: progress.append((done, total))))
+
+        self.assertEqual(progress[-1], (4, 4))
+        self.assertEqual(sorted(res.index for res in results), [0, 1, 2, 3])
+        for res in results:
+            if res.index == 2:
+                self.assertIsNone(res.result)
+                self.assertFalse(res.finished)
+            else:
+                self.assertTrue(res.finished)
+                self.assertEqual(res.result["regime name"], res.name)
+                self.assertEqual(res.result["modules"]["Model"]["T"],
+                                 res.index + 1)
+
+        # parallel and sequential runs have to yield the same results
+        seq_results, success = pm.run_regimes(regimes[:2])
+        par_results, success = pm.run_regimes(regimes[:2], workers=2)
+        for seq, par in zip(seq_results, par_results):
+            np.testing.assert_array_equal(seq["results"]["Solver"],
+                                          par["results"]["Solver"])
+
+    def test_failing_regime(self):
+        regimes = [get_regime("a"), get_regime("b")]
+        regimes[0]["Model"]["foo"] = 12
+        results, success = pm.run_regimes(regimes)
+        self.assertFalse(success)
+        self.assertEqual(len(results), 1)
+
+
+class TestParareal(unittest.TestCase):
+
+    def setUp(self):
+        regime = get_regime()
+        regime["Solver"].update({"type": "SolveIVP", "end time": 4,
+                                 "measure rate": 100})
+        regime["Trajectory"] = {"type": "HarmonicTrajectory"}
+        self.settings = get_module_settings(regime)
+
+    def test_open_loop(self):
+        seq = simulate(self.settings)["results"]
+        data = pm.simulate_parareal(self.settings, slices=4, workers=2)
+        self.assertTrue(data["parareal"]["converged"])
+        self.assertEqual(data["parareal"]["slices"], 4)
+        self.assertLessEqual(data["parareal"]["iterations"], 4)
+
+        par = data["results"]
+        self.assertTrue(par["finished"])
+        np.testing.assert_allclose(par["time"], seq["time"], atol=1e-9)
+        for key in ["Model", "Solver", "Trajectory", "Feedforward"]:
+            np.testing.assert_allclose(par[key], seq[key], atol=1e-8)
+
+    def test_closed_loop(self):
+        settings = get_module_settings(get_regime())
+        settings["Controller"] = {"type": "PIDController"}
+        with self.assertRaises(pm.SimulationException):
+            pm.simulate_parareal(settings, slices=2, workers=1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+"""
+test_solver_tuning
+----------------------------------
+
+Tests for the tuning of the solver settings.
+"""
+
+import os
+import tempfile
+import unittest
+from collections import OrderedDict
+
+import numpy as np
+
+import pymoskito as pm
+from pymoskito.simulation_core import get_module_settings
+from pymoskito.simulation_runner import load_regimes
+from pymoskito.solver_tuning import (
+    create_overlay, save_overlay, signal_error, tune_solver
+)
+
+# registers the first order model
+from pymoskito.tests.test_simulation_core import get_regime
+
+
+class TestSolverTuning(unittest.TestCase):
+
+    def setUp(self):
+        regime = get_regime()
+        regime["Trajectory"] = {"type": "HarmonicTrajectory"}
+        regime["Solver"]["measure rate"] = 100
+        self.settings = get_module_settings(regime)
+        self.candidates = OrderedDict([("Method", ["adams"]),
+                                       ("step size", [1, 5]),
+                                       ("rTol", [1e-2, 1e-4, 1e-8])])
+
+    def test_signal_error(self):
+        t = np.linspace(0, 1, 11)
+        b = 10 * np.ones((11, 2))
+        reference = {"time": t, "a": np.sin(t), "b": b, "finished": True}
+        self.assertEqual(signal_error(reference, reference), 0)
+
+        results = dict(reference, time=t[::2], a=np.sin(t[::2]) + 1e-3,
+                       b=10.1 * np.ones((6, 2)))
+        # linear interpolation between the coarse samples
+        self.assertAlmostEqual(signal_error(results, reference, ["b"]), 1e-2)
+        self.assertGreater(signal_error(results, reference, ["a"]), 1e-3)
+        self.assertLess(signal_error(results, reference, ["a"]), 1e-3 + 5e-3)
+
+        # only the common time span is compared
+        results = dict(reference, time=t[:6], a=np.sin(t[:6]), b=b[:6])
+        self.assertEqual(signal_error(results, reference), 0)
+
+    def test_tune(self):
+        result = tune_solver(self.settings, 1e-3, self.candidates,
+                             name="free")
+        self.assertEqual(result["regime"], "free")
+        self.assertLessEqual(result["error"], 1e-3)
+        self.assertAlmostEqual(result["speedup"],
+                               result["original wall time"]
+                               / result["wall time"])
+        self.assertGreaterEqual(result["settings"]["rTol"], 1e-4)
+        self.assertAlmostEqual(result["settings"]["aTol"],
+                               result["settings"]["rTol"] * 1e-3)
+        self.assertEqual(result["settings"]["end time"], 1)
+
+        # every combination stops at its first accepted tolerance
+        tried = [(trial["settings"]["step size"], trial["settings"]["rTol"])
+                 for trial in result["trials"]]
+        self.assertEqual(len(tried), len(set(tried)))
+        for trial in result["trials"]:
+            if trial["settings"]["rTol"] == 1e-8:
+                self.assertLessEqual(trial["error"], 1e-3)
+
+        with self.assertRaises(pm.SimulationException):
+            tune_solver(self.settings, 1e-12, self.candidates)
+
+    def test_overlay(self):
+        result = tune_solver(self.settings, 1e-3, self.candidates,
+                             name="free")
+        overlay = create_overlay(result)
+        self.assertEqual(overlay["Name"], "free (tuned)")
+        self.assertTrue(overlay["clear previous"])
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_name = os.path.join(tmp_dir, "tuned.sreg")
+            save_overlay([result], file_name)
+            with open(file_name) as f:
+                self.assertIn("speedup", f.readline())
+            regimes = load_regimes(file_name)
+
+        self.assertEqual(regimes, [overlay])
+        tuned = get_module_settings(regimes[0])
+        self.assertEqual(tuned["Solver"], result["settings"])
+        self.assertEqual(tuned["Model"], self.settings["Model"])
+        self.assertEqual(tuned["Trajectory"], self.settings["Trajectory"])
+
+    def test_overlay_models(self):
+        regimes = [get_regime("first")]
+        regimes[0]["Trajectory"] = {"type": "HarmonicTrajectory"}
+        regimes[0]["Solver"]["measure rate"] = 100
+        regimes.append({"Name": "second",
+                        "clear previous": False,
+                        "Model": {"type": "BatchFirstOrderModel", "T": 2}})
+
+        results = []
+        originals = []
+        previous = None
+        for regime in regimes:
+            previous = get_module_settings(regime, previous)
+            originals.append(previous)
+            results.append(tune_solver(previous, 1e-3, self.candidates,
+                                       name=regime["Name"]))
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_name = os.path.join(tmp_dir, "tuned.sreg")
+            save_overlay(results, file_name)
+            tuned_regimes = load_regimes(file_name)
+
+        # every tuned regime resolves to its own modules, whatever precedes it
+        previous = originals[-1]
+        for regime, original, result in zip(tuned_regimes, originals,
+                                            results):
+            previous = get_module_settings(regime, previous)
+            expected = OrderedDict(original)
+            expected["Solver"] = result["settings"]
+            self.assertEqual(previous, expected)
+
+        self.assertEqual(tuned_regimes[0]["Model"]["type"], "FirstOrderModel")
+        self.assertEqual(tuned_regimes[1]["Model"]["type"],
+                         "BatchFirstOrderModel")
+        self.assertEqual(tuned_regimes[1]["Model"]["T"], 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -8,6 +8,7 @@ Tests for several tools and functions
 """
 
 import unittest
+import unittest.mock
 import numpy as np
 import sympy as sp
 
@@ -112,6 +113,11 @@ class TestControlTools(unittest.TestCase):
         self.assertTrue(np.allclose(co, self.coefficients))
         self.assertEqual(co.size, self.coefficients.size)
 
+        # poles that are not conjugated yield complex coefficients
+        with self.assertWarns(UserWarning):
+            co = pm.char_coefficients([1j, -1])
+        np.testing.assert_array_equal(co, [0, 1])
+
     def test_place_siso(self):
         """
         test for pole placement
@@ -136,6 +142,31 @@ class TestControlTools(unittest.TestCase):
         self.assertTrue(np.allclose(test_K, self.K))
         self.assertTrue(np.allclose(test_L, self.L))
 
+    def test_place_many(self):
+        """
+        test for the batched pole placement
+        """
+        pole_sets = [self.poles, [-1, -2, -3], [-10, -5 + 2j, -5 - 2j]]
+        gains = pm.place_many(self.A, self.B, pole_sets)
+        self.assertEqual(gains.shape, (3, 1, self.n))
+        for poles, k in zip(pole_sets, gains):
+            np.testing.assert_allclose(k, pm.place_siso(self.A, self.B, poles))
+            np.testing.assert_allclose(np.poly(self.A - self.B @ k),
+                                       np.real(np.poly(poles)), atol=1e-9)
+
+        # the system dependent part is computed only once
+        rows = pm.controltools._ackermann_rows(self.A.astype(float),
+                                               self.B.astype(float))
+        self.assertIs(pm.controltools._ackermann_rows(self.A.astype(float),
+                                                      self.B.astype(float)),
+                      rows)
+
+        with self.assertRaises(ValueError):
+            pm.place_many(self.A, self.B, [[-1, -2]])
+        with self.assertRaises(ValueError):
+            pm.place_many(np.array([[0, 0], [0, 0]]), np.array([[0], [0]]),
+                          [[-1, -2]])
+
     def test_prefilter(self):
         """
         check function, which calculates the prefilter matrix
@@ -206,3 +237,28 @@ class TestLieMath(unittest.TestCase):
 
 if __name__ == '__main__':
     unittest.main()
+
+
+class TestJit(unittest.TestCase):
+
+    @staticmethod
+    def _dynamics(x, k):
+        dx = np.empty(2)
+        dx[0] = x[1]
+        dx[1] = -k * np.sin(x[0])
+        return dx
+
+    def test_jit(self):
+        x = np.array([0.5, 1.])
+        for function in [pm.jit(self._dynamics),
+                         pm.jit(cache=False)(self._dynamics)]:
+            np.testing.assert_allclose(function(x, 2.),
+                                       self._dynamics(x, 2.))
+            if not pm.jit_available():
+                self.assertIs(function, self._dynamics)
+
+    def test_disabled(self):
+        with unittest.mock.patch.dict("os.environ",
+                                      {"PYMOSKITO_DISABLE_JIT": "1"}):
+            self.assertFalse(pm.jit_available())
+            self.assertIs(pm.jit(self._dynamics), self._dynamics)
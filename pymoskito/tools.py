@@ -3,21 +3,21 @@
 Tools, functions and other funny things
 """
 import copy
+import functools
+import importlib.util
 import logging
 import os
 import re
 
-import matplotlib.gridspec as gridspec
-import matplotlib.pyplot as plt
-import pandas as pd
-from PyQt5.QtGui import QColor
-from PyQt5.QtWidgets import QPushButton
-
 import numpy as np
 
 logger = logging.getLogger(__name__)
 
-__all__ = ["rotation_matrix_xyz", "get_resource", "sort_tree"]
+__all__ = ["rotation_matrix_xyz", "get_resource", "sort_tree", "jit",
+           "jit_available"]
+
+DISABLE_JIT = "PYMOSKITO_DISABLE_JIT"
+""" Environment variable that disables :py:func:`jit` if set to `1` . """
 
 
 def sort_lists(a, b):
@@ -181,6 +181,62 @@ def rotation_matrix_xyz(axis, angle, angle_dim):
     return rotation_matrix
 
 
+def jit_available():
+    """
+    Check whether functions decorated with :py:func:`jit` get compiled.
+
+    Return:
+        bool: `True` if numba is installed and the compilation has not been
+        disabled via the environment variable `PYMOSKITO_DISABLE_JIT` .
+    """
+    if os.environ.get(DISABLE_JIT, "0") == "1":
+        return False
+    return importlib.util.find_spec("numba") is not None
+
+
+def jit(function=None, **options):
+    """
+    Compile a function to machine code with numba, if it is installed.
+
+    Without numba, the function is returned unchanged, hence models can use
+    this decorator without depending on numba. Since numba cannot compile
+    methods, the numerical core of a :py:meth:`.Model.state_function` or
+    `jacobian` has to be moved into a plain function of arrays and numbers,
+    which is then called with the model parameters::
+
+        @pm.jit
+        def _dynamics(x, u, k):
+            dx = np.empty(2)
+            dx[0] = x[1]
+            dx[1] = -k * np.sin(x[0]) + u
+            return dx
+
+        class MyModel(pm.Model):
+            ...
+            def state_function(self, t, x, args):
+                return _dynamics(x, float(args[0][0]), self.k)
+
+    The compiled functions are cached on disk, so the compilation only
+    happens on the first call in a fresh installation.
+
+    Args:
+        function(callable): Function to compile.
+        options: Further options for :py:func:`numba.njit` .
+
+    Return:
+        The compiled function or `function` itself.
+    """
+    if function is None:
+        return functools.partial(jit, **options)
+
+    if not jit_available():
+        return function
+
+    import numba
+    options.setdefault("cache", True)
+    return numba.njit(**options)(function)
+
+
 class PlainTextLogger(logging.Handler):
     """
     Logging handler hat formats log data for line display
@@ -205,6 +261,8 @@ class PlainTextLogger(logging.Handler):
         self.cb = cb
 
     def emit(self, record):
+        from PyQt5.QtGui import QColor
+
         msg = self.format(record)
         if self.cb:
             clr = QColor(self.settings.value("log_colors/" + record.levelname,
@@ -274,12 +332,16 @@ class Exporter:
             raise Exception("Given data points are None!")
 
         # build pandas data frame
+        import pandas as pd
         self.df = pd.DataFrame.from_dict(data_points)
 
         if 'time' in self.df.columns:
             self.df.set_index('time', inplace=True)
 
     def export_png(self, file_name):
+        import matplotlib.gridspec as gridspec
+        import matplotlib.pyplot as plt
+
         fig = plt.figure(figsize=(10, 6))
         gs = gridspec.GridSpec(1, 1, hspace=0.1)
         axes = plt.Subplot(fig, gs[0])
@@ -306,6 +368,8 @@ def create_button_from_action(action):
     """
     QPushButton that is generated from a QAction
     """
+    from PyQt5.QtWidgets import QPushButton
+
     btn = QPushButton()
     btn.setIcon(action.icon())
     btn.setToolTip(action.toolTip())